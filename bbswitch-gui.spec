@@ -10,6 +10,7 @@ Source0:        https://github.com/polter-rnd/bbswitch-gui/archive/%{version}/bb
 BuildArch:      noarch
 
 BuildRequires:  meson
+BuildRequires:  glib2-devel
 BuildRequires:  python3-devel
 BuildRequires:  python3-gobject
 BuildRequires:  python3-py3nvml
@@ -19,7 +20,6 @@ Requires:       gtk3
 Requires:       libappindicator-gtk3
 Requires:       python3-gobject
 Requires:       python3-py3nvml
-Requires:       psmisc
 Requires:       hwdata
 
 
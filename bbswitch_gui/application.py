@@ -4,34 +4,92 @@ import time
 import logging
 import signal
 
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-import gi
-gi.require_version('Gtk', '3.0')
-from gi.repository import GLib, Gio, Gtk  # pyright: ignore
+from .profiler import Profiler, ProfilerException
 
-from .pciutil import PCIUtil, PCIUtilException
-from .bbswitch import BBswitchClient, BBswitchClientException
-from .bbswitch import BBswitchMonitor, BBswitchMonitorException
-from .nvidia import NVidiaGpuInfo, NvidiaMonitor, NvidiaMonitorException
-from .window import MainWindow
-from .indicator import Indicator
+with Profiler.span('import.gtk'):
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import GLib, Gio, Gtk  # pyright: ignore
+
+with Profiler.span('import.modules'):
+    from .pciutil import PCIUtil, PCIUtilException
+    from .bbswitch import BBswitchClient
+    from .bbswitch import BBswitchMonitor, BBswitchMonitorException
+    from .indicator import Indicator
+    from .resources import Resources
+    from .history import HistoryStore
+
+if TYPE_CHECKING:
+    from .exporter import MetricsExporter
+    from .nvidia import NVidiaGpuInfo, NvidiaMonitor
+    from .window import MainWindow
 
 # Setup logger
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s %(name)s \033[1m%(levelname)s\033[0m %(message)s')
 logger = logging.getLogger(__name__)
 
-REFRESH_TIMEOUT = 1      # How often to refresh nvidia monitor data, in seconds
-MODULE_LOAD_TIMEOUT = 5  # How long to wait until nvidia module become accessible, in seconds
+MODULE_LOAD_TIMEOUT = 5   # How long to wait for nvidia module after GPU is on, in seconds
+
+
+class _Ping():
+    """Request to bbswitchd sent on startup, so it loads bbswitch module."""
+
+    def __init__(self) -> None:
+        self.started = False
+        self.finished = False
+        self.monitor_pending = False  # Start bbswitch monitor once finished
+
+
+class _Telemetry():
+    """Consumers of GPU states and samples besides the UI: history, exporter and profiler."""
+
+    def __init__(self) -> None:
+        # Fixed-size history of GPU metrics, drawn as graphs in the window
+        self.history = HistoryStore()
+        self.exporter: Optional['MetricsExporter'] = None
+        self.profile_trace: Optional[str] = None  # Where to write Chrome trace on exit
+
+    def update_states(self, states: List[Tuple[str, bool]]) -> None:
+        """Account power states of GPUs from bbswitch."""
+        if self.exporter is not None:
+            self.exporter.update_states(states)
 
+    def update_gpus(self, gpus_info: Optional[Dict[str, 'NVidiaGpuInfo']]) -> None:
+        """Account sampled GPU information, `None` if GPUs are not sampled."""
+        if gpus_info is not None:
+            self.history.add(gpus_info)
+        if self.exporter is not None:
+            self.exporter.update_gpus(gpus_info)
 
-class Application(Gtk.Application):
+    def record_switch(self, state: bool, duration: float, success: bool) -> None:
+        """Account finished request for switching GPU power state."""
+        if self.exporter is not None:
+            self.exporter.record_switch(state, duration, success)
+
+    def close(self) -> None:
+        """Report profiling results if enabled, stop serving metrics."""
+        if Profiler.enabled:
+            logger.info('Profiling summary (ms):\n%s', Profiler.summary())
+            if self.profile_trace:
+                try:
+                    Profiler.export(self.profile_trace)
+                    logger.info('Trace written to "%s"', self.profile_trace)
+                except ProfilerException as err:
+                    logger.error(err)
+
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+# Application is shared state of all GTK callbacks, related parts are grouped in helpers
+class Application(Gtk.Application):  # pylint: disable=too-many-instance-attributes
     """Main application class allowing only one running instance."""
 
     bbswitch = BBswitchMonitor()
     client = BBswitchClient()
-    nvidia = NvidiaMonitor(timeout=REFRESH_TIMEOUT)
 
     def __init__(self, *args, **kwargs) -> None:
         """Initialize application instance, setup command line handler."""
@@ -50,6 +108,30 @@ class Application(Gtk.Application):
             'Enable debug logging',
             None,
         )
+        self.add_main_option(
+            'profile',
+            ord('p'),
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            'Measure time spent on startup and updates, print summary on exit',
+            None,
+        )
+        self.add_main_option(
+            'profile-trace',
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.STRING,
+            'Also write Chrome trace of measured spans to FILE on exit',
+            'FILE',
+        )
+        self.add_main_option(
+            'metrics',
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.STRING,
+            'Serve GPU metrics in OpenMetrics format on ADDRESS (PORT, HOST:PORT or unix:PATH)',
+            'ADDRESS',
+        )
         self.add_main_option(
             'minimize',
             ord('m'),
@@ -61,94 +143,168 @@ class Application(Gtk.Application):
 
         self._enabled_gpu: Optional[str] = None
         self._switch_time: Optional[float] = None
+        self._switch_pending = False  # Switching off waits for GPU to be checked
         self._bg_notification_shown = False
+        self._ping = _Ping()
+
+        self._udev_client = None
+        self._nvidia: Optional['NvidiaMonitor'] = None
+
+        # Power states of GPUs controlled by bbswitch
+        self._bbswitch_states: Dict[str, bool] = {}
 
-        self.gpu_info: Optional[NVidiaGpuInfo] = None
-        self.window: Optional[MainWindow] = None
+        self.gpus_info: Optional[Dict[str, 'NVidiaGpuInfo']] = None
+        self.gpu_info: Optional['NVidiaGpuInfo'] = None
+        self.window: Optional['MainWindow'] = None
         self.indicator: Optional[Indicator] = None
+        self._telemetry = _Telemetry()
+
+    @property
+    def nvidia(self) -> 'NvidiaMonitor':
+        """Monitor of NVIDIA GPU, NVML is loaded on first access when GPU is turned on."""
+        if self._nvidia is None:
+            # NVML bindings are imported only when GPU is monitored
+            with Profiler.span('import.nvidia'):
+                from .nvidia import NvidiaMonitor  # pylint: disable=import-outside-toplevel
+            self._nvidia = NvidiaMonitor()
+        return self._nvidia
 
     def update_bbswitch(self) -> None:
         """Update GPU state from `bbswitch` module."""
+        with Profiler.span('update_bbswitch'):
+            self._update_bbswitch()
+
+    def _update_bbswitch(self):
         logging.debug('Got update from bbswitch')
 
-        bus_id, enabled, device, vendor = '', False, '', ''
         try:
-            bus_id, enabled = self.bbswitch.get_gpu_state()
-            vendor, device = PCIUtil.get_device_info(PCIUtil.get_vendor_id(bus_id),
-                                                     PCIUtil.get_device_id(bus_id))
+            states = self.bbswitch.get_gpu_states()
         except BBswitchMonitorException as err:
-            message = str(err)
-            logger.error(message)
-            self.nvidia.monitor_stop()
-            if self.indicator:
-                self.indicator.reset()
-            if self.window:
-                self.window.reset()
-                self.window.show_error(message)
-            if not self.window or not self.window.is_visible():
-                self._notify_error('BBswitch monitor error', message)
+            self._show_bbswitch_error(str(err))
             return
-        except PCIUtilException as err:
-            logger.warning(err)
+        self._bbswitch_states = dict(states)
+        self._telemetry.update_states(states)
+
+        # Only the first GPU could be switched by bbswitchd
+        bus_id, enabled = states[0]
 
         # If state is the same - skip it
         if self._switch_time and bool(self._enabled_gpu) == enabled:
+            self._update_indicator_gpus()
             return
 
         if self.indicator:
             self.indicator.set_state(enabled)
 
         if self.window:
-            self.window.update_header(bus_id, enabled, vendor, device)
+            self._update_window_header()
 
         if enabled:
             logger.debug('Adapter %s is ON', bus_id)
             self._enabled_gpu = bus_id
-            if self.window and self.window.is_visible():
-                self.nvidia.monitor_start(self.update_nvidia, bus_id, self._switch_time)
+            if self._nvidia_monitor_needed():
+                self.nvidia.monitor_start(self._on_nvidia_update, self._switch_time)
         else:
             self._enabled_gpu = None
             logger.debug('Adapter %s is OFF', bus_id)
-            self.nvidia.monitor_stop()
+            self._cancel_switch_check()
+            self._nvidia_monitor_stop()
+            self.gpus_info = self.gpu_info = None
+            self._telemetry.update_gpus(None)
 
-    def update_nvidia(self, bus_id: str, enabled_ts: float) -> None:
-        """Update GPU info from `nvidia` module.
+        self._update_indicator_gpus()
 
-        :param bus_id: PCI bus ID of NVIDIA GPU
-        """
+    def _update_window_header(self):
+        # Header shows the first GPU, which is the one controlled by bbswitchd
+        if self.window is None or not self._bbswitch_states:
+            return
+        bus_id, enabled = next(iter(self._bbswitch_states.items()))
+        device: Optional[str] = None
+        vendor: Optional[str] = None
+        try:
+            with Profiler.span('update_bbswitch.pci'):
+                pci_device = PCIUtil.get_device(bus_id)
+            vendor, device = pci_device['vendor'], pci_device['device']
+        except PCIUtilException as err:
+            logger.warning(err)
+        self.window.update_header(bus_id, enabled, vendor, device)
+
+    def _show_bbswitch_error(self, message):
+        logger.error(message)
+        self._bbswitch_states = {}
+        self.gpus_info = self.gpu_info = None
+        self._cancel_switch_check()
+        self._nvidia_monitor_stop()
+        self._telemetry.update_states([])
+        self._telemetry.update_gpus(None)
+        if self.indicator:
+            self.indicator.reset()
+        if self.window:
+            self.window.reset()
+            self.window.show_error(message)
+        if not self.window or not self.window.is_visible():
+            self._notify_error('BBswitch monitor error', message)
+
+    def _on_nvidia_update(self, gpus_info, error, enabled_ts):
+        with Profiler.span('update_nvidia'):
+            self._update_nvidia(gpus_info, error, enabled_ts)
+
+    def _update_nvidia(self, gpus_info, error, enabled_ts):
         logging.debug('Got update from nvidia-smi')
 
-        timeout_expired = time.monotonic() - enabled_ts > MODULE_LOAD_TIMEOUT \
-            if enabled_ts else True
-        message = None
-        try:
-            self.gpu_info = self.nvidia.gpu_info(bus_id)
+        message = str(error) if error is not None else self._store_gpus_info(gpus_info)
+        if message is None:
+            return
+
+        if enabled_ts and time.monotonic() - enabled_ts < MODULE_LOAD_TIMEOUT:
+            # It's normal, loading modules takes some time and triggers refresh when done,
+            # NVML and device nodes can still be unavailable right after that
             if self.window:
-                if self.gpu_info is None:
-                    # None return value means no kernel modules available
-                    message = 'GPU is turned on, but NVIDIA kernel modules are not loaded'
-                else:
-                    self.window.update_monitor(self.gpu_info)
-        except NvidiaMonitorException as err:
-            message = str(err)
-
-        if message is not None:
-            if timeout_expired:
-                # If it took really long time, display warning
-                logger.warning(message)
-                if self.window:
-                    self.window.show_warning(message)
-                if not self.window or not self.window.is_visible():
-                    self._notify_error('NVIDIA monitor error', message)
-                self.nvidia.monitor_stop()
-            elif self.window:
-                # Otherwise it's normal, loading modules can take some time
                 self.window.show_info('Loading NVIDIA kernel modules...')
+            return
+
+        logger.warning(message)
+        if self.window:
+            self.window.show_warning(message)
+        if not self.window or not self.window.is_visible():
+            self._notify_error('NVIDIA monitor error', message)
+        self.nvidia.monitor_stop()
+
+    def _store_gpus_info(self, gpus_info):
+        # Returns message to display if sampled information is not usable
+        message = None
+        self.gpus_info = gpus_info
+        self.gpu_info = None
+        self._telemetry.update_gpus(gpus_info)
+        if gpus_info is not None and self._enabled_gpu:
+            self.gpu_info = gpus_info.get(self._enabled_gpu)
+            if self.gpu_info is None:
+                message = f'GPU {self._enabled_gpu} not found in nvidia-smi'
+        if self.window:
+            if gpus_info is None:
+                # None return value means no kernel modules available
+                message = 'GPU is turned on, but NVIDIA kernel modules are not loaded'
+            else:
+                self.window.update_monitor(gpus_info)
+        self._update_indicator_gpus()
+        return message
 
     def do_startup(self, *args, **kwargs) -> None:
         """Handle application startup."""
+        with Profiler.span('do_startup'):
+            self._startup()
+
+    def do_shutdown(self, *args, **kwargs) -> None:
+        """Handle application shutdown, report profiling results if enabled."""
+        self._telemetry.close()
+        Gtk.Application.do_shutdown(self)
+
+    def _startup(self):
         Gtk.Application.do_startup(self)
 
+        # Icons used by indicator menu and window are bundled with UI files
+        Resources.register()
+
         action = Gio.SimpleAction.new('activate', None)
         action.connect('activate', self._on_activate)  # type: ignore
         self.add_action(action)  # type: ignore
@@ -159,43 +315,37 @@ class Application(Gtk.Application):
 
         GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGINT, self._on_quit)
 
+        # Track PCI hotplug to refresh cached device identity
+        try:
+            gi.require_version('GUdev', '1.0')
+            # Optional dependency
+            # pylint: disable-next=import-outside-toplevel
+            from gi.repository import GUdev  # pyright: ignore
+            self._udev_client = GUdev.Client(subsystems=['pci'])
+            self._udev_client.connect('uevent', self._on_pci_uevent)
+        except (ValueError, ImportError):
+            logger.debug('GUdev is not available, PCI hotplug will not be tracked')
+
     def do_activate(self, *args, **kwargs) -> None:
         """Initialize GUI.
 
         We only allow a single window and raise any existing ones
         """
-        if not self.window:
-            self.window = MainWindow(self)
-            self.window.connect('power-state-switch-requested', self._on_state_switch)
-            self.window.connect('delete-event', self._on_window_close)
-            self.window.connect('show', self._on_window_show)
-            self.window.connect('hide', self._on_window_hide)
+        with Profiler.span('do_activate'):
+            self._activate()
 
-            # Ping server so it will load bbswitch module
-            try:
-                self.client.send_command('status')
-            except BBswitchClientException as err:
-                message = str(err)
-                logging.error(message)
-                self.window.error_dialog(
-                    'BBswitch client error',
-                    message + '\n\n'
-                    + 'If this happened right after installation, check the following:\n'
-                    + ' • Service "bbswitchd" is enabled and running\n'
-                    + ' • Active user is in effective group "bbswitchd"\n'
-                    + ' • You have rebooted or restarted loginctl session')
+    def _activate(self):
+        self._init_background()
+
+        if not self.window:
+            self._init_window()
+            self.window.show()  # type: ignore
         else:
             self.window.set_keep_above(True)
             self.window.deiconify()
             self.window.present_with_time(int(time.time()))
             self.window.set_keep_above(False)
 
-        if not self.indicator:
-            self.indicator = Indicator()
-            self.indicator.connect('open-requested', self._on_activate)
-            self.indicator.connect('exit-requested', self._on_quit)
-            self.indicator.connect('power-state-switch-requested', self._on_state_switch)
-
     def do_command_line(self, *args: Gio.ApplicationCommandLine, **kwargs) -> int:
         """Handle command line arguments.
 
@@ -211,40 +361,138 @@ class Application(Gtk.Application):
             logging.getLogger().setLevel(logging.DEBUG)
             logger.debug('Verbose output enabled')
 
-        # Is GUI initialized
-        initialized = self.window is not None
-
-        self.activate()
+        if 'profile' in options or 'profile-trace' in options:
+            self._telemetry.profile_trace = options.get('profile-trace')
+            if not Profiler.enabled:
+                logger.info('Profiling enabled')
+                Profiler.enable()
+        elif Profiler.enabled is None:
+            # Drop spans recorded during startup
+            Profiler.disable()
+
+        if 'metrics' in options and self._telemetry.exporter is None:
+            # Exporter is imported only if requested
+            from .exporter import (  # pylint: disable=import-outside-toplevel
+                MetricsExporter, MetricsExporterException)
+            try:
+                self._telemetry.exporter = MetricsExporter(options['metrics'])
+            except MetricsExporterException as err:
+                logger.error(err)
+                return 1
 
-        if self.window:
-            # Utility function for starting bbswitch monitor
-            def bbswitch_monitor_start(window=None, is_active=None):
-                if window:
-                    window.disconnect(connection)
-                    if not is_active or not window.get_property(is_active.name):
-                        return
-                self.bbswitch.monitor_start(self.update_bbswitch)
-
-            if 'minimize' in options:
-                if not initialized:
-                    # Start bbswitch monitor right now
-                    bbswitch_monitor_start()
-                self._bg_notification_shown = True
+        # Is GUI initialized
+        initialized = self.indicator is not None
+
+        if 'minimize' in options:
+            # Window will be created on first activation
+            self._init_background()
+            if not initialized:
+                # Start bbswitch monitor right now
+                self._bbswitch_monitor_start()
+            self._bg_notification_shown = True
+            if self.window:
                 self.window.hide()
-            else:
-                if not initialized:
-                    # Start bbswitch monitor after window was activated
-                    connection = self.window.connect('notify::is-active', bbswitch_monitor_start)
-                self.window.show()
+        else:
+            self.activate()
+            if not initialized and self.window:
+                # Start bbswitch monitor after window was activated
+                def bbswitch_monitor_start(window, is_active):
+                    window.disconnect(connection)
+                    if window.get_property(is_active.name):
+                        self._bbswitch_monitor_start()
+
+                connection = self.window.connect('notify::is-active', bbswitch_monitor_start)
 
         return 0
 
+    def _init_background(self):
+        if not self.indicator:
+            self.indicator = Indicator()
+            self.indicator.connect('open-requested', self._on_activate)
+            self.indicator.connect('exit-requested', self._on_quit)
+            self.indicator.connect('power-state-switch-requested', self._on_state_switch)
+
+        if not self._ping.started:
+            # Ping server so it will load bbswitch module,
+            # don't wait for response to not delay the window
+            self._ping.started = True
+            self.client.send_command_async('status', self._on_ping_finished)
+
+    def _init_window(self):
+        # Window is imported on first activation, not to delay startup in background
+        with Profiler.span('import.window'):
+            from .window import MainWindow  # pylint: disable=import-outside-toplevel
+
+        self.window = MainWindow(self, self._telemetry.history)
+        self.window.connect('power-state-switch-requested', self._on_state_switch)
+        self.window.connect('delete-event', self._on_window_close)
+        self.window.connect('show', self._on_window_show)
+        self.window.connect('hide', self._on_window_hide)
+
+        # Monitor could have been started before the window was created
+        self._update_window_header()
+
+    def _update_indicator_gpus(self):
+        if not self.indicator:
+            return
+
+        states = {bus_id: 'On' if enabled else 'Off'
+                  for bus_id, enabled in self._bbswitch_states.items()}
+        for bus_id, gpu_info in (self.gpus_info or {}).items():
+            count = len(gpu_info['processes'])
+            states[bus_id] = f'On, {count} process{"es" if count != 1 else ""}'
+        self.indicator.set_gpus(states)
+
+    def _nvidia_monitor_needed(self):
+        # Exported metrics should be fresh even when nobody looks at the window,
+        # and GPU should be checked before switching off even from the tray
+        return self._telemetry.exporter is not None or self._switch_pending \
+            or (self.window and self.window.is_visible())
+
+    def _nvidia_monitor_stop(self):
+        # Nothing to stop if NVIDIA monitor has never been used
+        if self._nvidia is not None:
+            self._nvidia.monitor_stop()
+
+    def _bbswitch_monitor_start(self):
+        # bbswitchd loads bbswitch module on first request, so wait for it
+        if self._ping.finished:
+            self.bbswitch.monitor_start(self.update_bbswitch)
+        else:
+            self._ping.monitor_pending = True
+
+    def _on_ping_finished(self, response, error):
+        del response  # unused argument
+        self._ping.finished = True
+        if self._ping.monitor_pending:
+            self._ping.monitor_pending = False
+            self.bbswitch.monitor_start(self.update_bbswitch)
+
+        if error is not None:
+            message = str(error)
+            logging.error(message)
+            if self.window:
+                self.window.error_dialog(
+                    'BBswitch client error',
+                    message + '\n\n'
+                    + 'If this happened right after installation, check the following:\n'
+                    + ' • Service "bbswitchd" is enabled and running\n'
+                    + ' • Active user is in effective group "bbswitchd"\n'
+                    + ' • You have rebooted or restarted loginctl session')
+            else:
+                self._notify_error('BBswitch client error', message)
+
     def _on_activate(self, widget=None, data=None):
         del widget, data  # unused arguments
-        if self.window:
-            self.activate()
+        self.activate()
         return GLib.SOURCE_CONTINUE
 
+    def _on_pci_uevent(self, client, action, device):
+        del client  # unused argument
+        if action in ['add', 'remove']:
+            logger.debug('PCI device %s: %s', device.get_name(), action)
+            PCIUtil.invalidate(device.get_name())
+
     def _on_quit(self, widget=None, data=None):
         del widget, data  # unused arguments
         self.withdraw_notification('error')
@@ -252,13 +500,16 @@ class Application(Gtk.Application):
         self.quit()
         return GLib.SOURCE_REMOVE
 
-    def _on_state_switch_finish(self, error):
+    def _on_state_switch_finish(self, error, state):
+        if self._switch_time:
+            self._telemetry.record_switch(state, time.monotonic() - self._switch_time,
+                                          error is None)
         if error is not None:
             logger.error(str(error))
             self.update_bbswitch()
-            self.nvidia.monitor_stop()
-            if self.window and self._enabled_gpu:
-                self.update_nvidia(self._enabled_gpu, 0)
+            self._nvidia_monitor_stop()
+            if self._enabled_gpu and self._nvidia_monitor_needed():
+                self.nvidia.monitor_start(self._on_nvidia_update, self._switch_time)
             self._notify_error('Failed to switch power state', str(error))
         if self.window:
             self.window.set_cursor_arrow()
@@ -268,19 +519,67 @@ class Application(Gtk.Application):
         if self.client.in_progress():
             self.client.cancel()
             return
+        if self._switch_pending:
+            self._cancel_switch_check()
+            if not self._nvidia_monitor_needed():
+                self._nvidia_monitor_stop()
+            return
 
         self._switch_time = time.monotonic()
         if not state and self._enabled_gpu:
-            # Update GPU info
-            self.update_nvidia(self._enabled_gpu, 0)
-            if self.gpu_info and len(self.gpu_info['processes']) > 0:
-                self._notify_error('NVIDIA GPU is in use',
-                                   'Please stop processes using it first')
-                return
-            self.nvidia.monitor_stop()
+            # Check on fresh GPU info that GPU is not in use, rescanning all processes
+            # to not miss any. Sample is taken on monitor thread, switch happens after it
+            self._switch_pending = True
+            self.nvidia.reset_processes()
+            self.nvidia.refresh(self._on_switch_check, self._switch_time)
+            if not self.nvidia.running:
+                # GPU has been on for a while, so errors are not expected
+                self.nvidia.monitor_start(self._on_nvidia_update, 0)
+            if self.window:
+                self.window.set_cursor_busy()
+            return
+
+        self._set_gpu_state(state)
+
+    def _on_switch_check(self, gpus_info, error, switch_time):
+        # Switching could have been cancelled or requested again meanwhile
+        if not self._switch_pending or switch_time != self._switch_time:
+            return
+        self._cancel_switch_check()
+
+        gpu_info = gpus_info.get(self._enabled_gpu) if gpus_info else None
+        if error is not None:
+            # Stale GPU info could miss processes, so don't risk it
+            self._notify_error('Failed to switch power state',
+                               f'Could not check if NVIDIA GPU is in use: {error}')
+        elif gpu_info and len(gpu_info['processes']) > 0:
+            self._notify_error('NVIDIA GPU is in use',
+                               'Please stop processes using it first')
+        # NVML session should be closed before turning GPU off,
+        # sample has just finished, so the session is not in use
+        elif self.nvidia.monitor_stop():
+            self._set_gpu_state(False)
+            return
+        else:
+            self._notify_error('Failed to switch power state',
+                               'NVIDIA monitor is busy, please try again')
+            if self._nvidia_monitor_needed():
+                self.nvidia.monitor_start(self._on_nvidia_update, self._switch_time)
+            return
 
+        # Monitor could have been started only for the check
+        if not self._nvidia_monitor_needed():
+            self._nvidia_monitor_stop()
+
+    def _cancel_switch_check(self):
+        if self._switch_pending:
+            self._switch_pending = False
+            if self.window:
+                self.window.set_cursor_arrow()
+
+    def _set_gpu_state(self, state):
         # Switch to opposite state
-        self.client.set_gpu_state(state, self._on_state_switch_finish)
+        self.client.set_gpu_state(state, lambda error: self._on_state_switch_finish(error, state))
         if self.window:
             self.window.set_cursor_busy()
 
@@ -299,13 +598,12 @@ class Application(Gtk.Application):
         del window  # unused argument
         self.withdraw_notification('running_in_bg')
         if self._enabled_gpu:
-            self.nvidia.monitor_start(self.update_nvidia,
-                                      self._enabled_gpu,
-                                      self._switch_time)
+            self.nvidia.monitor_start(self._on_nvidia_update, self._switch_time)
 
     def _on_window_hide(self, window):
         del window  # unused argument
-        self.nvidia.monitor_stop()
+        if not self._nvidia_monitor_needed():
+            self._nvidia_monitor_stop()
 
     def _on_window_close(self, window, event):
         del event  # unused argument
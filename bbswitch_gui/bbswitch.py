@@ -1,22 +1,149 @@
 """Module containing utilities for monitoring bbswitch states."""
 
-from typing import Any, Callable, Optional, Tuple
+import time
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional, Tuple, Union
 from gi.repository import Gio, GLib  # pyright: ignore
 
 BBSWITCH_PATH = '/proc/acpi/bbswitch'       # Path to bbswitch control file
 BBSWITCHD_SOCK = '/var/run/bbswitchd.sock'  # Path to bbswitchd socket
 
+RECONNECT_TIMEOUT_MIN = 0.5   # Initial delay before reconnecting to bbswitchd, in seconds
+RECONNECT_TIMEOUT_MAX = 5     # Maximum delay before reconnecting to bbswitchd, in seconds
+REQUEST_TIMEOUT = 5           # How long to wait for bbswitchd response, in seconds
+SWITCH_TIMEOUT = 60           # How long to wait for GPU power state switch, in seconds
+DEBOUNCE_TIMEOUT = 0.1        # How long to wait for more bbswitch events to coalesce, in seconds
+RESUBSCRIBE_TIMEOUT_MIN = 1   # Initial delay before subscribing to bbswitchd again, in seconds
+RESUBSCRIBE_TIMEOUT_MAX = 60  # Maximum delay before subscribing to bbswitchd again, in seconds
+
+logger = logging.getLogger(__name__)
+
 
 class BBswitchClientException(Exception):
     """Exception thrown by :class:`BBswitchClient` class methods."""
 
 
+class _Request():
+    """Request waiting for response from bbswitchd."""
+
+    def __init__(self, request_id: int, data: bytes, callback: Optional[Callable]) -> None:
+        self.request_id = request_id
+        self.data = data
+        self.callback = callback
+        self.retried = False    # Already written again after reconnecting
+        self.cancelled = False  # Should not be written anymore
+        self.timer: Optional[int] = None
+        self.cancellable: Optional[Gio.Cancellable] = None
+        self.cancel_handler: Optional[int] = None
+
+    def cancel(self) -> None:
+        """Finish with error on the next main loop iteration."""
+        self.cancelled = True
+        GLib.idle_add(self.finish, None, BBswitchClientException('Operation was cancelled'))
+
+    def finish(self, data: Optional[bytes], error: Optional[BBswitchClientException]) -> None:
+        """Call the callback once and release timer and cancellable."""
+        if self.timer is not None:
+            GLib.source_remove(self.timer)
+            self.timer = None
+        if self.cancel_handler is not None and self.cancellable is not None:
+            self.cancellable.disconnect(self.cancel_handler)
+            self.cancel_handler = None
+        callback, self.callback = self.callback, None
+        if callback is not None:
+            callback(data, error)
+
+
+class _RequestQueue():
+    """Requests to bbswitchd, waiting to be written or for responses in order of sending."""
+
+    def __init__(self, max_pending: int) -> None:
+        self.max_pending = max_pending
+        self.reading = False  # Only one read at a time
+        self.writing = False  # Only one write at a time, to keep order
+        self._outgoing: Deque[_Request] = deque()
+        self._pending: Deque[_Request] = deque()
+        self._last_id = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def is_full(self) -> bool:
+        """Check if no more requests could be sent."""
+        return len(self._outgoing) + len(self._pending) >= self.max_pending
+
+    def add(self, data: bytes, callback: Optional[Callable]) -> _Request:
+        """Add request to be written to bbswitchd."""
+        self._last_id += 1
+        request = _Request(self._last_id, data, callback)
+        self._outgoing.append(request)
+        return request
+
+    def next_outgoing(self) -> Optional[_Request]:
+        """Take the oldest request to be written, which will get the next unmatched response."""
+        while self._outgoing:
+            request = self._outgoing.popleft()
+            # Requests cancelled before writing are never sent
+            if not request.cancelled and request.callback is not None:
+                self._pending.append(request)
+                return request
+        return None
+
+    def requeue(self, request: _Request) -> None:
+        """Put request which failed to be written back to be written first."""
+        self._pending.remove(request)
+        self._outgoing.appendleft(request)
+
+    def pop(self) -> _Request:
+        """Remove the oldest request, which is matched to the response received."""
+        return self._pending.popleft()
+
+    def fail_sent(self, error: BBswitchClientException) -> None:
+        """Finish sent requests with error, as their responses will never come."""
+        pending, self._pending = self._pending, deque()
+        self.reading = self.writing = False
+        for request in pending:
+            request.finish(None, error)
+
+    def fail(self, error: BBswitchClientException) -> None:
+        """Finish all requests with error, including not written yet."""
+        outgoing, self._outgoing = self._outgoing, deque()
+        self.fail_sent(error)
+        for request in outgoing:
+            request.finish(None, error)
+
+
 class BBswitchClient():
-    """Communicates with bbswitchd to change GPU state."""
+    """Communicates with bbswitchd to change GPU state.
 
-    def __init__(self) -> None:
-        """Initialize client for bbswitchd."""
+    Keeps a single connection to bbswitchd, which is reestablished on failure.
+    bbswitchd handles requests one by one, so several requests may be sent
+    without waiting for the previous ones and responses are matched in order.
+    All operations are asynchronous.
+    """
+
+    def __init__(self, max_pending: int = 16) -> None:
+        """Initialize client for bbswitchd.
+
+        :param max_pending: Maximum number of requests waiting for response
+        """
+        self._queue = _RequestQueue(max_pending)
+        self._connection: Optional[Gio.SocketConnection] = None
         self._cancellable: Optional[Gio.Cancellable] = None
+        self._switch_cancellable: Optional[Gio.Cancellable] = None
+        self._on_push: Optional[Callable] = None
+        self._retry_time = 0.0
+        self._retry_timeout = RECONNECT_TIMEOUT_MIN
+
+    @property
+    def max_pending(self) -> int:
+        """Maximum number of requests waiting for response."""
+        return self._queue.max_pending
+
+    @max_pending.setter
+    def max_pending(self, value: int) -> None:
+        self._queue.max_pending = value
 
     def _socket_init(self) -> Gio.SocketClient:
         client = Gio.SocketClient()
@@ -27,157 +154,544 @@ class BBswitchClient():
         ))
         return client
 
+    def _connect(self) -> None:
+        # Connect asynchronously, requests are written when done
+        if self._connection is not None or self._cancellable is not None:
+            return
+
+        self._cancellable = Gio.Cancellable()
+        self._socket_init().connect_async(Gio.UnixSocketAddress.new(BBSWITCHD_SOCK),
+                                          self._cancellable, self._on_connect_finished,
+                                          self._cancellable)
+
+    def _on_connect_finished(self, client, result, cancellable):
+        if cancellable is not self._cancellable:
+            # Connection has been closed meanwhile
+            return
+
+        try:
+            self._connection = client.connect_finish(result)
+        except GLib.GError as err:  # type: ignore
+            self._retry_time = time.monotonic() + self._retry_timeout
+            self._retry_timeout = min(self._retry_timeout * 2, RECONNECT_TIMEOUT_MAX)
+            self._disconnect(BBswitchClientException(err.message))  # type: ignore
+            return
+
+        self._retry_timeout = RECONNECT_TIMEOUT_MIN
+        self._write_next()
+
+    def _close_connection(self) -> None:
+        if self._cancellable:
+            self._cancellable.cancel()
+            self._cancellable = None
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    def _disconnect(self, error: BBswitchClientException) -> None:
+        self._close_connection()
+
+        # Responses for pending requests will never come
+        self._queue.fail(error)
+
+        # As well as pushed states
+        if self._on_push is not None:
+            on_push, self._on_push = self._on_push, None
+            on_push(None, error)
+
+    def close(self) -> None:
+        """Close connection to bbswitchd, also cancelling subscription."""
+        self._on_push = None
+        self._disconnect(BBswitchClientException('Connection closed'))
+
     def in_progress(self) -> bool:
         """Check if there is operating penging.
 
         :return: `True` if in progress, `False` otherwise
         """
-        return self._cancellable is not None
+        return self._switch_cancellable is not None
 
     def cancel(self) -> None:
         """Cancel pending operation if any."""
-        if self._cancellable:
-            self._cancellable.cancel()
-            self._cancellable = None
-
-    def send_command(self, command: str) -> Optional[str]:
+        if self._switch_cancellable:
+            self._switch_cancellable.cancel()
+            self._switch_cancellable = None
+
+    def request(self, command: str,
+                on_response: Callable[[Optional[bytes], Optional[BBswitchClientException]],
+                                      None],
+                timeout: Optional[float] = REQUEST_TIMEOUT,
+                cancellable: Optional[Gio.Cancellable] = None) -> int:
+        """Send arbitary command to bbswitchd without waiting for response.
+
+        Callback is called exactly once, unless this method raises.
+        Connecting and writing are asynchronous as well, their errors are passed to callback.
+
+        :param command: Command to send (e.g. `status`)
+        :param on_response: Callback to be called with raw response
+                            (or `None`) and :class:`BBswitchClientException`
+                            (or `None`) as positional arguments
+        :param timeout: How long to wait for response, in seconds (`None` means forever)
+        :param cancellable: Optional cancellable to stop waiting for response
+        :raises: :class:`BBswitchClientException` if request could not be queued
+        :return: Request ID
+        """
+        if cancellable is not None and cancellable.is_cancelled():
+            raise BBswitchClientException('Operation was cancelled')
+        if self._queue.is_full():
+            raise BBswitchClientException('Too many pending requests to bbswitchd')
+
+        # Do not hammer the socket if bbswitchd has just failed
+        now = time.monotonic()
+        if self._cancellable is None and now < self._retry_time:
+            raise BBswitchClientException(
+                'bbswitchd is not available, next connection attempt allowed in '
+                f'{self._retry_time - now:.1f} s')
+
+        request = self._queue.add(command.encode('ascii') + b'\0', on_response)
+        if timeout is not None:
+            request.timer = GLib.timeout_add(int(timeout * 1000),
+                                             self._on_request_timeout, request)
+        if cancellable is not None:
+            # Response is still expected after cancel if request has been written,
+            # so request stays in queue
+            request.cancellable = cancellable
+            request.cancel_handler = cancellable.connect(lambda *_: request.cancel())
+
+        self._connect()
+        self._write_next()
+        return request.request_id
+
+    def send_command_async(self, command: str,
+                           on_finished: Callable[[Optional[str],
+                                                  Optional[BBswitchClientException]], None],
+                           timeout: Optional[float] = REQUEST_TIMEOUT,
+                           cancellable: Optional[Gio.Cancellable] = None) -> None:
         """Send arbitary command to bbswitchd.
 
-        Call is synchronous.
+        Call is asynchronous, use ``on_finished`` callback to handle result.
 
-        :raises: :class:`BBswitchClientException` on failure
-        :return: Response from server
+        :param command: Command to send (e.g. `status`)
+        :param on_finished: Callback to be called with response from server
+                            (or `None`) and :class:`BBswitchClientException`
+                            (or `None`) as positional arguments
+        :param timeout: How long to wait for response, in seconds (`None` means forever)
+        :param cancellable: Optional cancellable to stop waiting for response
         """
-        client = self._socket_init()
+        def on_response(data, error):
+            on_finished(data.decode() if data else None, error)
+
         try:
-            conn = client.connect(Gio.UnixSocketAddress.new(BBSWITCHD_SOCK))
-            conn.get_output_stream().write_bytes(
-                GLib.Bytes.new(command.encode('ascii') + b'\0'))
-            gdata = conn.get_input_stream().read_bytes(1024)
-            data = gdata.get_data() if gdata else None
-        except GLib.GError as err:  # type: ignore
-            raise BBswitchClientException(err.message) from err  # type: ignore
-        return data.decode() if data else None
+            self.request(command, on_response, timeout, cancellable)
+        except BBswitchClientException as err:
+            # Report result asynchronously anyway
+            GLib.idle_add(on_finished, None, err)
 
     def set_gpu_state(self, state: bool,
-                      on_finished: Callable[[Optional[BBswitchClientException]], None]) -> None:
+                      on_finished: Callable[[Optional[BBswitchClientException]], None],
+                      timeout: Optional[float] = SWITCH_TIMEOUT) -> None:
         """Set GPU enabled state (`True` or `False`).
 
         Call is asynchronous, use ``on_finished`` callback to handle result.
+        Could be cancelled with :meth:`cancel`.
 
         :param state: `True` means GPU will be enabled, `False` - disabled.
         :param on_finished: Callback to be called after switch change finish.
                             In case of error :class:`BBswitchClientException`
                             will be passed as first positional argument, `None` otherwise.
+        :param timeout: How long to wait for switch, in seconds (`None` means forever)
         """
-        self._cancellable = Gio.Cancellable()
+        cancellable = Gio.Cancellable()
+
+        def on_response(data, error):
+            if self._switch_cancellable is cancellable:
+                self._switch_cancellable = None
+            if error is None and data and data != b'\0':
+                error = BBswitchClientException(data.decode())
+            on_finished(error)
 
-        client = self._socket_init()
-        client.connect_async(
-            Gio.UnixSocketAddress.new(BBSWITCHD_SOCK),
+        try:
+            self.request('on' if state else 'off', on_response, timeout, cancellable)
+            self._switch_cancellable = cancellable
+        except BBswitchClientException as err:
+            # Report result asynchronously anyway
+            GLib.idle_add(on_finished, err)
+
+    def subscribe(self, on_push: Callable[[Optional[bytes], Optional[BBswitchClientException]],
+                                          None],
+                  on_finished: Callable[[Optional[BBswitchClientException]], None],
+                  timeout: Optional[float] = REQUEST_TIMEOUT) -> None:
+        """Subscribe to GPU state changes pushed by bbswitchd.
+
+        Call is asynchronous, use ``on_finished`` callback to handle result.
+        After successful subscription server sends a datagram with new state
+        on each change, so the client should not be used for other requests.
+
+        :param on_push: Callback to be called with pushed state (e.g. `0000:01:00.0 ON`),
+                        or with `None` and :class:`BBswitchClientException`
+                        when subscription is lost
+        :param on_finished: Callback to be called after subscription finish.
+                            In case of error :class:`BBswitchClientException`
+                            will be passed as first positional argument, `None` otherwise.
+        :param timeout: How long to wait for response, in seconds (`None` means forever)
+        """
+        def on_response(data, error):
+            if error is None and data and data != b'\0':
+                error = BBswitchClientException(data.decode())
+            if error is None:
+                self._on_push = on_push
+                self._read_next()
+            on_finished(error)
+
+        try:
+            self.request('subscribe', on_response, timeout)
+        except BBswitchClientException as err:
+            # Report result asynchronously anyway
+            GLib.idle_add(on_finished, err)
+
+    def _on_request_timeout(self, request):
+        request.timer = None
+        # Server has lost the request or hung, so following responses
+        # could not be matched anymore: start over with a new connection
+        self._disconnect(BBswitchClientException('Timed out waiting for bbswitchd response'))
+        return GLib.SOURCE_REMOVE
+
+    def _write_next(self):
+        # Only one write at a time, it's restarted while something is to be written
+        if self._connection is None or self._queue.writing:
+            return
+        request = self._queue.next_outgoing()
+        if request is None:
+            return
+        self._queue.writing = True
+        self._connection.get_output_stream().write_bytes_async(
+            GLib.Bytes.new(request.data),
+            GLib.PRIORITY_DEFAULT,
             self._cancellable,
-            self._on_connect_finished,
-            state, on_finished)
+            self._on_write_finished,
+            (self._connection, request))
+        self._read_next()
 
-    def _on_connect_finished(self, client, result, state, on_finished):
+    def _on_write_finished(self, stream, result, user_data):
+        connection, request = user_data
+        if connection is not self._connection:
+            # Connection has been closed meanwhile
+            return
+
+        self._queue.writing = False
         try:
-            conn = client.connect_finish(result)
-            conn.get_output_stream().write_bytes_async(
-                GLib.Bytes.new(b'on\0' if state else b'off\0'),
-                GLib.PRIORITY_LOW,
-                self._cancellable,
-                None)
-            conn.get_input_stream().read_bytes_async(
+            stream.write_bytes_finish(result)
+        except GLib.GError as err:  # type: ignore
+            error = BBswitchClientException(err.message)  # type: ignore
+            if request.retried or self._on_push is not None:
+                self._disconnect(error)
+                return
+            # Server could have been restarted, reconnect once
+            request.retried = True
+            self._queue.requeue(request)
+            self._close_connection()
+            self._queue.fail_sent(error)
+            self._connect()
+            return
+
+        self._write_next()
+
+    def _read_next(self):
+        # Only one read at a time, it's restarted while something is expected
+        if self._connection is not None and not self._queue.reading \
+                and (self._queue or self._on_push is not None):
+            self._queue.reading = True
+            self._connection.get_input_stream().read_bytes_async(
                 1024,
-                GLib.PRIORITY_LOW,
+                GLib.PRIORITY_DEFAULT,
                 self._cancellable,
                 self._on_read_finished,
-                on_finished)
-        except GLib.GError as err:  # type: ignore
-            self._cancellable = None
-            on_finished(BBswitchClientException(err.message))  # type: ignore
+                self._connection)
 
-    def _on_read_finished(self, stream, result, on_finished):
-        error = None
+    def _on_read_finished(self, stream, result, connection):
+        if connection is not self._connection:
+            # Connection has been closed meanwhile
+            return
+
+        self._queue.reading = False
         try:
             gdata = stream.read_bytes_finish(result)
-            data = gdata.get_data() if gdata else None
-            if data and data != b'\0':
-                error = BBswitchClientException(data.decode())
         except GLib.GError as err:  # type: ignore
-            error = BBswitchClientException(err.message)  # type: ignore
+            self._disconnect(BBswitchClientException(err.message))  # type: ignore
+            return
 
-        self._cancellable = None
-        on_finished(error)
+        data = gdata.get_data() if gdata else None
+        if self._queue:
+            self._queue.pop().finish(data, None)
+        elif self._on_push is not None:
+            self._on_push(data, None)
+        self._read_next()
 
 
 class BBswitchMonitorException(Exception):
     """Exception thrown by :class:`BBswitchMonitor` class methods."""
 
 
-class BBswitchMonitor:
-    """Wrapper for monitoring bbswitch module status."""
+class _Subscription():
+    """Subscription to bbswitchd state changes, renewed when lost."""
 
     def __init__(self) -> None:
-        """Initialize file monitoring for BBSWITCH_PATH."""
+        self.client = BBswitchClient()
+        self.timer: Optional[int] = None
+        self.timeout: Optional[int] = None  # Delay of the next attempt, if subscription was lost
+        self.state: Optional[List[Tuple[str, bool]]] = None  # Last pushed state
+
+    def cancel(self) -> None:
+        """Close connection and stop renewing subscription."""
+        self.client.close()
+        if self.timer is not None:
+            GLib.source_remove(self.timer)
+            self.timer = None
+        self.timeout = None
+        self.state = None
+
+
+class _Updates():
+    """Debounced updates of GPU states, which are reported only when changed."""
+
+    def __init__(self, debounce: float) -> None:
+        self.debounce = debounce
+        self.timer: Optional[int] = None
+        # Reported last time, returned to the callback while it's being called
+        self.result: Optional[Union[List[Tuple[str, bool]], BBswitchMonitorException]] = None
+        self.dispatching = False
+
+    def schedule(self, callback: Callable) -> None:
+        """Call the callback after debounce timeout, unless scheduled again meanwhile."""
+        # Restart the timer on each event, so a burst produces a single update
+        self.cancel()
+        self.timer = GLib.timeout_add(int(self.debounce * 1000), callback)
+
+    def cancel(self) -> None:
+        """Forget scheduled update."""
+        if self.timer is not None:
+            GLib.source_remove(self.timer)
+            self.timer = None
+
+
+class BBswitchMonitor:
+    """Wrapper for monitoring bbswitch module status.
+
+    Subscribes to state changes pushed by bbswitchd when it is supported,
+    otherwise falls back to monitoring of BBSWITCH_PATH. If subscription is lost,
+    BBSWITCH_PATH is monitored until subscribing again succeeds.
+
+    Events arriving within ``debounce`` seconds are coalesced, and the callback
+    is called only if GPU state (or error) differs from the one reported last time.
+    """
+
+    def __init__(self, subscribe: bool = True, debounce: float = DEBOUNCE_TIMEOUT) -> None:
+        """Initialize file monitoring for BBSWITCH_PATH.
+
+        :param subscribe: Try to subscribe to state changes from bbswitchd
+        :param debounce: How long to wait for more events before reading state, in seconds
+        """
         self.file = Gio.File.new_for_path(BBSWITCH_PATH)
         self.monitor = self.file.monitor_file(Gio.FileMonitorFlags.NONE, None)
+        self._subscription = _Subscription() if subscribe else None
         self.connection: Optional[int] = None
         self.callback: Optional[Callable] = None
         self.callback_args: Tuple[Any, ...] = ()
+        self._updates = _Updates(debounce)
+
+    @property
+    def running(self) -> bool:
+        """Whether monitor has been started."""
+        return self.callback is not None
+
+    @property
+    def debounce(self) -> float:
+        """How long to wait for more events before reading state, in seconds."""
+        return self._updates.debounce
+
+    @debounce.setter
+    def debounce(self, value: float) -> None:
+        self._updates.debounce = value
 
     def get_gpu_state(self) -> Tuple[str, bool]:
         """Return a tuple with PCI bus ID and it's enabled state (`True` or `False`).
 
+        Only the first GPU is returned, use :meth:`get_gpu_states` for all of them.
+
         :raises: :class:`BBswitchMonitorException` on failure
         :return: Tuple with GPU id and state (e.g. `( "0000:01:00.0", True )`)
         """
+        return self.get_gpu_states()[0]
+
+    def get_gpu_states(self) -> List[Tuple[str, bool]]:
+        """Return a list of tuples with PCI bus ID and enabled state of each GPU.
+
+        If subscribed to bbswitchd, returns the last pushed state without reading file.
+        When called from the monitor callback, returns the state which triggered it.
+
+        :raises: :class:`BBswitchMonitorException` on failure
+        :return: List of GPU ids and states (e.g. `[ ( "0000:01:00.0", True ) ]`)
+        """
+        if self._updates.dispatching and self._updates.result is not None:
+            if isinstance(self._updates.result, BBswitchMonitorException):
+                raise self._updates.result
+            return self._updates.result
+
+        if self._subscription is not None and self._subscription.state is not None:
+            return self._subscription.state
+
         try:
             _, contents, _ = self.file.load_contents()
         except GLib.GError as err:  # type: ignore
             raise BBswitchMonitorException(err.message) from err  # type: ignore
 
-        for line in contents.decode().splitlines():
-            space = line.find(' ')
-            if space == -1:
-                raise BBswitchMonitorException(f'Failed to parse "{self.file.get_path()}"')
-
-            bus_id = line[:space]
-            state = line[space + 1:]
-            if state not in ['ON', 'OFF']:
-                raise BBswitchMonitorException(f'Unknown bbswitch state "{state}"')
-
-            return (bus_id, state == 'ON')
-
-        raise BBswitchMonitorException(f'Looks like "{self.file.get_path()}" is empty')
+        return self._parse_states(contents.decode())
 
     def monitor_start(self, on_change: Callable, *on_change_args: Any) -> None:
         """Start monitoring changes of GPU states.
 
-        Calls the callback with optional arguments on each state change.
+        Calls the callback with optional arguments once on start and then on each state change.
         If monitor was already started, only callback with arguments will be updated.
 
         :param on_change: Callback to be called on GPU state change
         :param on_change_args: Optional arguments to on_change()
         """
+        running = self.running
         self.callback = on_change
         self.callback_args = on_change_args
-        if self.connection is None:
-            self.callback(*self.callback_args)
-            self.connection = self.monitor.connect('changed', self._on_monitor_event_changed)
+        if not running:
+            self._update_state(force=True)
+            # Monitor file until subscription is confirmed
+            self._file_monitor_start()
+            self._subscribe()
 
     def monitor_stop(self) -> None:
         """Stop monitoring changes of GPU states."""
+        if self.running:
+            self._file_monitor_stop()
+            if self._subscription is not None:
+                self._subscription.cancel()
+            self._updates.cancel()
+            self._updates.result = None
+            self.callback = None
+            self.callback_args = ()
+
+    def _parse_states(self, contents):
+        states = []
+        for line in contents.splitlines():
+            if not line:
+                continue
+
+            space = line.find(' ')
+            if space == -1:
+                raise BBswitchMonitorException(f'Failed to parse "{self.file.get_path()}"')
+
+            bus_id = line[:space]
+            state = line[space + 1:]
+            if state not in ['ON', 'OFF']:
+                raise BBswitchMonitorException(f'Unknown bbswitch state "{state}"')
+
+            states.append((bus_id, state == 'ON'))
+
+        if not states:
+            raise BBswitchMonitorException(f'Looks like "{self.file.get_path()}" is empty')
+        return states
+
+    def _file_monitor_start(self):
+        if self.connection is None:
+            self.connection = self.monitor.connect('changed', self._on_monitor_event_changed)
+
+    def _file_monitor_stop(self):
         if self.connection is not None:
             self.monitor.disconnect(self.connection)
             self.connection = None
-            self.callback = None
-            self.callback_args = ()
+
+    def _subscribe(self):
+        if self._subscription is not None:
+            self._subscription.timer = None
+            self._subscription.client.subscribe(self._on_state_pushed,
+                                                self._on_subscribe_finished)
+        return GLib.SOURCE_REMOVE
+
+    def _schedule_resubscribe(self, subscription):
+        # bbswitchd could be restarting, do not retry too often if it is gone for long
+        timeout = subscription.timeout or RESUBSCRIBE_TIMEOUT_MIN
+        logger.debug('Subscribing to bbswitchd again in %d s', timeout)
+        subscription.timer = GLib.timeout_add_seconds(timeout, self._subscribe)
+        subscription.timeout = min(timeout * 2, RESUBSCRIBE_TIMEOUT_MAX)
+
+    def _on_subscribe_finished(self, error):
+        if not self.running:
+            return
+        if error is not None:
+            logger.debug('Could not subscribe to bbswitchd (%s), monitoring "%s"',
+                         error, self.file.get_path())
+            # Subscribing initially fails if bbswitchd does not support it,
+            # no reason to retry unless it has been working before
+            if self._subscription is not None and self._subscription.timeout is not None:
+                self._schedule_resubscribe(self._subscription)
+            return
+        logger.debug('Subscribed to bbswitchd state changes')
+        if self._subscription is not None:
+            self._subscription.timeout = None
+        self._file_monitor_stop()
+
+    def _on_state_pushed(self, data, error):
+        if not self.running:
+            return
+
+        if error is not None:
+            logger.warning('Subscription to bbswitchd lost: %s', error)
+            if self._subscription is not None:
+                self._subscription.state = None
+                self._schedule_resubscribe(self._subscription)
+            self._file_monitor_start()
+        elif self._subscription is not None:
+            try:
+                self._subscription.state = self._parse_states(
+                    data.decode().rstrip('\0') if data else '')
+            except BBswitchMonitorException as err:
+                logger.warning('Unexpected state from bbswitchd: %s', err)
+                self._subscription.state = None
+
+        # State could have been changed
+        self._updates.schedule(self._on_debounce_timeout)
 
     def _on_monitor_event_changed(self, monitor, file, other_file, event_type):
         del monitor, file, other_file  # unused arguments
         if event_type == Gio.FileMonitorEvent.CHANGED:
-            # Do not call a callback if monitor has been stopped
-            if self.callback is not None:
-                self.callback(*self.callback_args)
+            self._updates.schedule(self._on_debounce_timeout)
         return GLib.SOURCE_CONTINUE
+
+    def _on_debounce_timeout(self):
+        self._updates.timer = None
+        self._update_state()
+        return GLib.SOURCE_REMOVE
+
+    def _update_state(self, force=False):
+        # Do not call a callback if monitor has been stopped
+        if self.callback is None:
+            return
+
+        result: Union[List[Tuple[str, bool]], BBswitchMonitorException]
+        try:
+            result = self.get_gpu_states()
+        except BBswitchMonitorException as err:
+            result = err
+
+        if not force and self._is_same_result(result, self._updates.result):
+            logger.debug('bbswitch state has not changed, skipping update')
+            return
+
+        self._updates.result = result
+        self._updates.dispatching = True
+        try:
+            self.callback(*self.callback_args)
+        finally:
+            self._updates.dispatching = False
+
+    @staticmethod
+    def _is_same_result(first, second):
+        if isinstance(first, BBswitchMonitorException):
+            return isinstance(second, BBswitchMonitorException) and str(first) == str(second)
+        return first == second
@@ -0,0 +1,289 @@
+"""Module containing exporter of GPU metrics in OpenMetrics format."""
+
+import os
+import time
+import logging
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from gi.repository import GLib, Gio  # pyright: ignore
+
+from .sockutil import SockUtil, SockUtilException
+
+if TYPE_CHECKING:
+    from .nvidia import NVidiaGpuInfo
+
+logger = logging.getLogger(__name__)
+
+SWITCH_BUCKETS = [0.5, 1, 2, 5, 10, 30, 60]  # Upper bounds of switch duration buckets, seconds
+REQUEST_TIMEOUT = 5        # How long to wait for scrape request, in seconds
+REQUEST_MAX_SIZE = 8192    # Maximum size of scrape request headers, in bytes
+SERVER_THREADS = 4         # Maximum number of scrapes served at once
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Metric name, key of `NVidiaGpuInfo`, scale to base unit, help text and unit of GPU metrics
+GPU_METRICS = [
+    ('nvidia_gpu_temperature_celsius', 'gpu_temp', 1, 'GPU temperature.', 'celsius'),
+    ('nvidia_gpu_power_draw_watts', 'power_draw', 1, 'GPU power usage.', 'watts'),
+    ('nvidia_gpu_memory_used_bytes', 'mem_used', 1 << 20, 'GPU memory used.', 'bytes'),
+    ('nvidia_gpu_memory_total_bytes', 'mem_total', 1 << 20, 'Total GPU memory.', 'bytes'),
+    ('nvidia_gpu_utilization_ratio', 'gpu_util', 0.01, 'GPU utilization.', 'ratio'),
+]
+
+
+class MetricsExporterException(Exception):
+    """Exception thrown by :class:`MetricsExporter` class methods."""
+
+
+class _SwitchStats():
+    """Power states of GPUs and statistics of switching them."""
+
+    def __init__(self) -> None:
+        self.states: Dict[str, bool] = {}
+        self.transitions: Dict[Tuple[str, bool], int] = {}
+        self.requests: Dict[Tuple[bool, bool], int] = {}
+        self.durations: Dict[bool, List[int]] = {
+            state: [0] * (len(SWITCH_BUCKETS) + 1) for state in [True, False]}
+        self.duration_sums: Dict[bool, float] = {True: 0.0, False: 0.0}
+
+    def update_states(self, states: List[Tuple[str, bool]]) -> None:
+        """Update power states of GPUs, counting transitions."""
+        states_dict = dict(states)
+        for bus_id, enabled in states_dict.items():
+            if bus_id in self.states and self.states[bus_id] != enabled:
+                key = (bus_id, enabled)
+                self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.states = states_dict
+
+    def record_switch(self, state: bool, duration: float, success: bool) -> None:
+        """Account finished request for switching GPU power state."""
+        key = (state, success)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        if success:
+            buckets = self.durations[state]
+            for i, bound in enumerate(SWITCH_BUCKETS + [float('inf')]):
+                if duration <= bound:
+                    buckets[i] += 1
+            self.duration_sums[state] += duration
+
+
+class MetricsExporter:
+    """HTTP endpoint serving the latest GPU metrics in OpenMetrics text format.
+
+    Metrics are rendered once on each update from monitors, scrapes are served
+    from the rendered snapshot on worker threads, so they never cause NVML calls
+    and don't depend on the main loop being idle.
+
+    Listens either on TCP address (`HOST:PORT` or just `PORT` on loopback)
+    or on Unix socket (`unix:PATH`), e.g. for `curl --unix-socket PATH http://localhost/metrics`.
+    """
+
+    def __init__(self, address: str) -> None:
+        """Start serving metrics.
+
+        :param address: Address to listen on
+        :raises: :class:`MetricsExporterException` on failure
+        """
+        self._path: Optional[str] = None
+        self._switches = _SwitchStats()
+        self._gpus_info: Dict[str, 'NVidiaGpuInfo'] = {}
+        self._sample_time: Optional[float] = None
+        self._lock = threading.Lock()
+        self._snapshot = b''
+        self._render()
+
+        self.service = Gio.ThreadedSocketService.new(SERVER_THREADS)
+        if address.startswith('unix:'):
+            self._path = address[len('unix:'):]
+            try:
+                SockUtil.bind_unix_socket(self.service, self._path)
+            except SockUtilException as err:
+                raise MetricsExporterException(err) from err
+        else:
+            try:
+                self.service.add_address(self._parse_address(address), Gio.SocketType.STREAM,
+                                         Gio.SocketProtocol.DEFAULT, None)
+            except GLib.GError as err:  # type: ignore
+                raise MetricsExporterException(
+                    f'Failed to listen on "{address}": {err.message}') from err  # type: ignore
+        self.service.connect('run', self._on_run)
+        self.service.start()
+        logger.info('Serving metrics on %s', address)
+
+    def close(self) -> None:
+        """Stop serving metrics."""
+        SockUtil.close_unix_socket(self.service, self._path)
+
+    def update_states(self, states: List[Tuple[str, bool]]) -> None:
+        """Update power states of GPUs from bbswitch, counting transitions.
+
+        :param states: List of GPU ids and states (e.g. `[ ( "0000:01:00.0", True ) ]`)
+        """
+        self._switches.update_states(states)
+        self._render()
+
+    def update_gpus(self, gpus_info: Optional[Dict[str, 'NVidiaGpuInfo']]) -> None:
+        """Update GPU information sampled by NVIDIA monitor.
+
+        :param gpus_info: GPU information by PCI bus ID, `None` if GPUs are not sampled
+        """
+        self._gpus_info = gpus_info or {}
+        self._sample_time = time.time() if gpus_info is not None else None
+        self._render()
+
+    def record_switch(self, state: bool, duration: float, success: bool) -> None:
+        """Record finished request for switching GPU power state.
+
+        :param state: Requested state (`True` or `False`)
+        :param duration: Time from request until response, in seconds
+        :param success: Whether request succeeded
+        """
+        self._switches.record_switch(state, duration, success)
+        self._render()
+
+    @staticmethod
+    def _parse_address(address):
+        host, _, port = address.rpartition(':')
+        if not port.isdigit() or int(port) > 65535:
+            raise MetricsExporterException(f'Invalid port in metrics address "{address}"')
+        if host in ['', 'localhost']:
+            inet_address = Gio.InetAddress.new_loopback(Gio.SocketFamily.IPV4)
+        else:
+            inet_address = Gio.InetAddress.new_from_string(host.strip('[]'))
+            if inet_address is None:
+                raise MetricsExporterException(f'Invalid host in metrics address "{address}"')
+        return Gio.InetSocketAddress.new(inet_address, int(port))
+
+    def _render(self):
+        lines: List[str] = []
+        self._render_states(lines)
+        self._render_switches(lines)
+        self._render_gpus(lines)
+        lines.append('# EOF\n')
+        snapshot = '\n'.join(lines).encode()
+        with self._lock:
+            self._snapshot = snapshot
+
+    def _render_states(self, lines):
+        switches = self._switches
+        self._family(lines, 'bbswitch_gpu_enabled', 'gauge', 'Whether GPU is powered on.')
+        for bus_id, enabled in sorted(switches.states.items()):
+            self._sample(lines, 'bbswitch_gpu_enabled', {'bus_id': bus_id}, int(enabled))
+
+        self._family(lines, 'bbswitch_gpu_power_transitions', 'counter',
+                     'Number of observed GPU power state changes.')
+        for bus_id in sorted(switches.states):
+            for state in [True, False]:
+                self._sample(lines, 'bbswitch_gpu_power_transitions_total',
+                             {'bus_id': bus_id, 'state': self._state_name(state)},
+                             switches.transitions.get((bus_id, state), 0))
+
+    def _render_switches(self, lines):
+        switches = self._switches
+        self._family(lines, 'bbswitch_switch_requests', 'counter',
+                     'Number of finished requests for switching GPU power state.')
+        for state in [True, False]:
+            for success in [True, False]:
+                self._sample(lines, 'bbswitch_switch_requests_total',
+                             {'state': self._state_name(state),
+                              'result': 'success' if success else 'error'},
+                             switches.requests.get((state, success), 0))
+
+        self._family(lines, 'bbswitch_switch_duration_seconds', 'histogram',
+                     'Time of successful requests for switching GPU power state.', 'seconds')
+        for state in [True, False]:
+            name = self._state_name(state)
+            buckets = switches.durations[state]
+            for bound, count in zip([str(float(b)) for b in SWITCH_BUCKETS] + ['+Inf'], buckets):
+                self._sample(lines, 'bbswitch_switch_duration_seconds_bucket',
+                             {'state': name, 'le': bound}, count)
+            self._sample(lines, 'bbswitch_switch_duration_seconds_count', {'state': name},
+                         buckets[-1])
+            self._sample(lines, 'bbswitch_switch_duration_seconds_sum', {'state': name},
+                         switches.duration_sums[state])
+
+    def _render_gpus(self, lines):
+        gpus = sorted(self._gpus_info.items())
+        self._family(lines, 'nvidia_gpu_sample_timestamp_seconds', 'gauge',
+                     'Time when GPU information was sampled.', 'seconds')
+        if self._sample_time is not None:
+            self._sample(lines, 'nvidia_gpu_sample_timestamp_seconds', {}, self._sample_time)
+
+        for name, key, scale, help_text, unit in GPU_METRICS:
+            self._family(lines, name, 'gauge', help_text, unit)
+            for bus_id, gpu_info in gpus:
+                value = gpu_info[key]  # type: ignore
+                # Parameters not supported by GPU are reported as -1
+                if value != -1:
+                    self._sample(lines, name, {'bus_id': bus_id}, value * scale)
+
+        self._family(lines, 'nvidia_gpu_process_memory_used_bytes', 'gauge',
+                     'GPU memory used by process.', 'bytes')
+        for bus_id, gpu_info in gpus:
+            for process in gpu_info['processes']:
+                if process['mem_used'] != -1:
+                    command = os.path.basename(process['cmdline'].split(' ', 1)[0])
+                    self._sample(lines, 'nvidia_gpu_process_memory_used_bytes',
+                                 {'bus_id': bus_id, 'pid': process['pid'], 'command': command},
+                                 process['mem_used'] << 20)
+
+    def _on_run(self, service, connection, source_object):
+        del service, source_object  # unused arguments
+        # Called on worker thread, only reads the rendered snapshot
+        with self._lock:
+            snapshot = self._snapshot
+
+        try:
+            connection.get_socket().set_timeout(REQUEST_TIMEOUT)
+            request = b''
+            stream = connection.get_input_stream()
+            while b'\r\n\r\n' not in request and len(request) < REQUEST_MAX_SIZE:
+                data = stream.read_bytes(REQUEST_MAX_SIZE, None).get_data()
+                if not data:
+                    break
+                request += data
+
+            method, path = (request.split(b'\r\n', 1)[0].split(b' ') + [b'', b''])[:2]
+            if method not in [b'GET', b'HEAD']:
+                response = self._response('405 Method Not Allowed', b'', 'text/plain')
+            elif path.split(b'?', 1)[0] not in [b'/', b'/metrics']:
+                response = self._response('404 Not Found', b'', 'text/plain')
+            else:
+                response = self._response('200 OK', snapshot if method == b'GET' else b'',
+                                          CONTENT_TYPE, len(snapshot))
+            connection.get_output_stream().write_all(response, None)
+            connection.close(None)
+        except GLib.GError as err:  # type: ignore
+            logger.debug('Failed to serve metrics: %s', err.message)  # type: ignore
+        return True
+
+    @staticmethod
+    def _response(status, body, content_type, length=None):
+        headers = (f'HTTP/1.1 {status}\r\n'
+                   f'Content-Type: {content_type}\r\n'
+                   f'Content-Length: {len(body) if length is None else length}\r\n'
+                   'Connection: close\r\n\r\n')
+        return headers.encode() + body
+
+    @staticmethod
+    def _family(lines, name, metric_type, help_text, unit=None):
+        lines.append(f'# TYPE {name} {metric_type}')
+        if unit is not None:
+            lines.append(f'# UNIT {name} {unit}')
+        lines.append(f'# HELP {name} {help_text}')
+
+    @staticmethod
+    def _sample(lines, name, labels, value):
+        label_str = ','.join(f'{key}="{MetricsExporter._escape(str(val))}"'
+                             for key, val in labels.items())
+        value = repr(round(value, 6)) if isinstance(value, float) else str(value)
+        lines.append(f'{name}{{{label_str}}} {value}' if label_str else f'{name} {value}')
+
+    @staticmethod
+    def _state_name(state):
+        return 'on' if state else 'off'
+
+    @staticmethod
+    def _escape(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
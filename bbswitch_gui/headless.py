@@ -0,0 +1,325 @@
+"""Module containing monitoring without user interface.
+
+GPU states and samples are streamed as newline-delimited JSON. Only GLib and Gio
+are imported, so it can run on machines without a display or GTK installed.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from gi.repository import GLib, Gio  # pyright: ignore
+
+from .bbswitch import BBswitchClient, BBswitchMonitor, BBswitchMonitorException
+from .exporter import MetricsExporter, MetricsExporterException
+from .nvidia import NvidiaMonitor
+from .pciutil import PCIUtil, PCIUtilException
+from .profiler import Profiler
+from .sockutil import SockUtil, SockUtilException
+
+logger = logging.getLogger(__name__)
+
+CLIENT_BACKLOG = 1 << 20   # Unsent bytes after which a slow socket client is dropped
+
+
+class HeadlessException(Exception):
+    """Exception thrown by :class:`StreamServer` class methods."""
+
+
+class _Client():
+    """Connection of a stream reader with queue of unsent records."""
+
+    def __init__(self, connection: Gio.SocketConnection) -> None:
+        self.connection = connection
+        self.stream = connection.get_output_stream()
+        self.queue: Deque[bytes] = deque()
+        self.queued = 0
+        self.writing = False
+
+
+class StreamServer:
+    """Unix socket server sending each record to all connected clients.
+
+    Clients only read, anything they send is ignored. Writes are asynchronous,
+    so a slow client does not block monitoring; it is disconnected when
+    more than :data:`CLIENT_BACKLOG` bytes are waiting for it.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Start listening on Unix socket.
+
+        :param path: Path to socket file, stale socket is replaced
+        :raises: :class:`HeadlessException` on failure
+        """
+        self.path = path
+        self._clients: List[_Client] = []
+        self.service = Gio.SocketService()
+        try:
+            SockUtil.bind_unix_socket(self.service, path)
+        except SockUtilException as err:
+            raise HeadlessException(err) from err
+        self.service.connect('incoming', self._on_incoming)
+        self.service.start()
+
+    def close(self) -> None:
+        """Disconnect all clients and remove socket file."""
+        SockUtil.close_unix_socket(self.service, self.path)
+        for client in list(self._clients):
+            self._drop(client)
+
+    def send(self, data: bytes) -> None:
+        """Queue data for sending to all connected clients.
+
+        :param data: Bytes to send
+        """
+        for client in list(self._clients):
+            if client.queued + len(data) > CLIENT_BACKLOG:
+                logger.warning('Stream client is too slow, disconnecting')
+                self._drop(client)
+                continue
+            client.queue.append(data)
+            client.queued += len(data)
+            self._write_next(client)
+
+    def _on_incoming(self, service, connection, source_object):
+        del service, source_object  # unused arguments
+        logger.debug('Stream client connected')
+        self._clients.append(_Client(connection))
+        return True
+
+    def _write_next(self, client):
+        if client.writing or not client.queue:
+            return
+        client.writing = True
+        client.stream.write_bytes_async(GLib.Bytes.new(client.queue[0]), GLib.PRIORITY_DEFAULT,
+                                        None, self._on_write_finished, client)
+
+    def _on_write_finished(self, stream, result, client):
+        client.writing = False
+        try:
+            written = stream.write_bytes_finish(result)
+        except GLib.GError as err:  # type: ignore
+            logger.debug('Stream client disconnected: %s', err.message)  # type: ignore
+            self._drop(client)
+            return
+        if client not in self._clients:
+            return
+
+        # Write could be partial, keep the rest for the next one
+        data = client.queue.popleft()
+        client.queued -= written
+        if written < len(data):
+            client.queue.appendleft(data[written:])
+        self._write_next(client)
+
+    def _drop(self, client):
+        if client in self._clients:
+            self._clients.remove(client)
+            client.connection.close(None)
+
+
+class _RecordWriter():
+    """Destination of records: clients of socket server, stdout or nowhere."""
+
+    def __init__(self, server: Optional[StreamServer], stream: bool) -> None:
+        self.server = server
+        self.stream = stream
+
+    def write(self, data: bytes) -> bool:
+        """Write record, return `False` if reader of stdout has gone away."""
+        if self.server is not None:
+            self.server.send(data)
+            return True
+        if not self.stream:
+            return True
+        try:
+            sys.stdout.buffer.write(data)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # stdout is redirected to /dev/null so that flushing it on exit does not fail again
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return False
+        return True
+
+    def close(self) -> None:
+        """Stop socket server if any."""
+        if self.server is not None:
+            self.server.close()
+
+
+class HeadlessMonitor:
+    """Monitor of GPU states and NVIDIA GPU information writing JSON records.
+
+    Each record is a JSON object on a separate line with `type` and `time`
+    (seconds since the epoch) fields:
+
+    * `state` with `gpus` list of GPUs with PCI bus ID, power state and names,
+      written on start and on each bbswitch state change;
+    * `sample` with `gpus` object of NVIDIA GPU information by PCI bus ID,
+      written while at least one GPU is turned on;
+    * `error` with `source` (`bbswitch` or `nvidia`) and `message`,
+      written once until the error changes or goes away.
+    """
+
+    def __init__(self, server: Optional[StreamServer] = None,
+                 exporter: Optional[MetricsExporter] = None, stream: bool = True) -> None:
+        """Initialize monitors.
+
+        :param server: Socket server to send records to, `None` to write them to stdout
+        :param exporter: Exporter to update with GPU states and information
+        :param stream: Write records to stdout if there is no socket server
+        """
+        self.writer = _RecordWriter(server, stream)
+        self.exporter = exporter
+        self.loop = GLib.MainLoop()
+        self.bbswitch = BBswitchMonitor()
+        self.nvidia = NvidiaMonitor()
+        self._enabled = False
+        self._errors: Dict[str, str] = {}
+
+    def run(self) -> int:
+        """Run monitoring until interrupted by SIGINT or SIGTERM.
+
+        :return: Exit status
+        """
+        for signum in [signal.SIGINT, signal.SIGTERM]:
+            GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signum, self._on_signal)
+
+        # bbswitchd loads bbswitch module on first request, so wait for it
+        client = BBswitchClient()
+        client.send_command_async(
+            'status', lambda response, error: self._on_ping_finished(client, error))
+        try:
+            self.loop.run()
+        finally:
+            self.nvidia.monitor_stop()
+            self.bbswitch.monitor_stop()
+            self.writer.close()
+            if self.exporter is not None:
+                self.exporter.close()
+        return 0
+
+    def _on_ping_finished(self, client, error):
+        # Connection is not needed anymore, monitor has its own one
+        client.close()
+        if error is not None:
+            logger.debug('Failed to ping bbswitchd: %s', error)
+        self.bbswitch.monitor_start(self._on_bbswitch_update)
+
+    def _write(self, record_type, **fields):
+        record = {'type': record_type, 'time': time.time(), **fields}
+        data = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        if not self.writer.write(data):
+            # Reader has gone away, nobody to monitor for
+            self.loop.quit()
+
+    def _write_error(self, source, error):
+        # Do not repeat the same error on each update
+        message = str(error) if error is not None else None
+        if message is None:
+            self._errors.pop(source, None)
+        elif self._errors.get(source) != message:
+            self._errors[source] = message
+            logger.warning(message)
+            self._write('error', source=source, message=message)
+
+    def _on_bbswitch_update(self):
+        try:
+            states = self.bbswitch.get_gpu_states()
+        except BBswitchMonitorException as err:
+            self._write_error('bbswitch', err)
+            self._enabled = False
+            self.nvidia.monitor_stop()
+            if self.exporter is not None:
+                self.exporter.update_states([])
+                self.exporter.update_gpus(None)
+            return
+        self._write_error('bbswitch', None)
+        if self.exporter is not None:
+            self.exporter.update_states(states)
+
+        gpus: List[Dict[str, Any]] = []
+        for bus_id, enabled in states:
+            vendor: Optional[str] = None
+            device: Optional[str] = None
+            try:
+                pci_device = PCIUtil.get_device(bus_id)
+                vendor, device = pci_device['vendor'], pci_device['device']
+            except PCIUtilException as err:
+                logger.debug(err)
+            gpus.append({'bus_id': bus_id, 'enabled': enabled,
+                         'vendor': vendor, 'device': device})
+        self._write('state', gpus=gpus)
+
+        enabled = any(enabled for _, enabled in states)
+        if enabled and not self._enabled:
+            self.nvidia.monitor_start(self._on_nvidia_update)
+        elif not enabled and self._enabled:
+            self.nvidia.monitor_stop()
+            self._write_error('nvidia', None)
+            if self.exporter is not None:
+                self.exporter.update_gpus(None)
+        self._enabled = enabled
+
+    def _on_nvidia_update(self, gpus_info, error):
+        if error is None and gpus_info is None:
+            # Modules are usually still loading right after GPU is turned on
+            error = 'GPU is turned on, but NVIDIA kernel modules are not loaded'
+        self._write_error('nvidia', error)
+        if error is None:
+            self._write('sample', gpus=gpus_info)
+            if self.exporter is not None:
+                self.exporter.update_gpus(gpus_info)
+
+    def _on_signal(self):
+        self.loop.quit()
+        return GLib.SOURCE_REMOVE
+
+
+def main(argv: List[str]) -> int:
+    """Run headless monitoring with command line arguments.
+
+    :param argv: Command line arguments, including program name and `--headless`
+    :return: Exit status
+    """
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description='Stream GPU states and NVIDIA GPU information as JSON lines.')
+    parser.add_argument('--headless', action='store_true', required=True,
+                        help='run without user interface')
+    parser.add_argument('-s', '--socket', metavar='PATH',
+                        help='serve records on Unix socket instead of writing to stdout')
+    parser.add_argument('--metrics', metavar='ADDRESS',
+                        help='serve GPU metrics in OpenMetrics format on ADDRESS '
+                        '(PORT, HOST:PORT or unix:PATH)')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='do not write records to stdout, e.g. when only serving metrics')
+    parser.add_argument('-v', '--verbose', action='store_true', help='enable debug logging')
+    args = parser.parse_args(argv[1:])
+
+    # Records go to stdout, so keep logs on stderr
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s %(name)s %(levelname)s %(message)s',
+                        stream=sys.stderr)
+    # Spans are never reported here, don't accumulate them
+    Profiler.disable()
+
+    server = None
+    exporter = None
+    try:
+        if args.socket:
+            server = StreamServer(args.socket)
+        if args.metrics:
+            exporter = MetricsExporter(args.metrics)
+    except (HeadlessException, MetricsExporterException) as err:
+        logger.error(err)
+        if server is not None:
+            server.close()
+        return 1
+    return HeadlessMonitor(server, exporter, stream=not args.quiet).run()
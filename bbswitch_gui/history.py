@@ -0,0 +1,185 @@
+"""Module containing fixed-size history of GPU metrics."""
+
+import math
+import time
+from array import array
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .nvidia import NVidiaGpuInfo
+
+# Resolution (in seconds) and number of points of each history tier, sized to graphs
+# in the window (60 pixels with a point each 2 pixels): 30 seconds, 5 minutes, 30 minutes
+HISTORY_TIERS = ((1, 31), (10, 31), (60, 31))
+
+# Metrics of `NVidiaGpuInfo` to keep history for
+HISTORY_METRICS = ['gpu_temp', 'power_draw', 'mem_used', 'gpu_util']
+
+MAX_GAP = 30  # Longest gap between samples filled with the last value, in seconds
+
+
+class RingBuffer:
+    """Preallocated circular buffer of floating point numbers."""
+
+    def __init__(self, capacity: int) -> None:
+        """Initialize buffer filled with NaN.
+
+        :param capacity: Maximum number of values, older ones are overwritten
+        """
+        self.capacity = capacity
+        self.appended = 0  # Total number of values ever appended
+        self.revision = 0  # Incremented on each change, to detect it cheaply
+        self._data = array('d', [math.nan]) * capacity
+
+    def __len__(self) -> int:
+        """Return number of values stored."""
+        return min(self.appended, self.capacity)
+
+    def append(self, value: float) -> None:
+        """Append value, overwriting the oldest one if buffer is full.
+
+        :param value: Value to append
+        """
+        self._data[self.appended % self.capacity] = value
+        self.appended += 1
+        self.revision += 1
+
+    def set_last(self, value: float) -> None:
+        """Replace the last appended value.
+
+        :param value: New value
+        """
+        if self.appended > 0:
+            self._data[(self.appended - 1) % self.capacity] = value
+            self.revision += 1
+
+    def last(self) -> float:
+        """Return the last appended value, NaN if buffer is empty."""
+        return self._data[(self.appended - 1) % self.capacity] if self.appended > 0 else math.nan
+
+    def values(self, count: Optional[int] = None) -> List[float]:
+        """Return the latest values in chronological order.
+
+        :param count: Number of values, NaN is prepended if there are fewer of them stored,
+                      `None` means all stored values
+        :return: List of values
+        """
+        if count is None:
+            count = len(self)
+        stored = min(count, len(self))
+        end = self.appended % self.capacity
+        if stored <= end:
+            res = self._data[end - stored:end].tolist()
+        else:
+            res = self._data[end - stored:].tolist() + self._data[:end].tolist()
+        return [math.nan] * (count - stored) + res
+
+
+class _Tier():
+    """Metrics downsampled to a fixed resolution."""
+
+    def __init__(self, resolution: float, capacity: int) -> None:
+        self.resolution = resolution
+        self.buffers = {metric: RingBuffer(capacity) for metric in HISTORY_METRICS}
+        self.bucket: Optional[int] = None
+        self.count = 0
+        self.sums = dict.fromkeys(HISTORY_METRICS, 0.0)
+
+
+class MetricsHistory:
+    """History of GPU metrics with several downsampled tiers.
+
+    Each tier keeps the mean of samples within its resolution, so memory usage
+    does not depend on how long the application runs. Short gaps between samples
+    (polling slows down while metrics are stable) are filled with the last value,
+    longer ones with NaN.
+    """
+
+    def __init__(self, tiers: Sequence[Tuple[float, int]] = HISTORY_TIERS) -> None:
+        """Initialize history.
+
+        :param tiers: Resolution (in seconds) and number of points of each tier
+        """
+        self._tiers = [_Tier(resolution, capacity) for resolution, capacity in tiers]
+
+    @property
+    def tiers(self) -> List[Tuple[float, int]]:
+        """Resolution (in seconds) and number of points of each tier."""
+        return [(tier.resolution, tier.buffers[HISTORY_METRICS[0]].capacity)
+                for tier in self._tiers]
+
+    def add(self, gpu_info: 'NVidiaGpuInfo', timestamp: Optional[float] = None) -> None:
+        """Add GPU information sample to all tiers.
+
+        :param gpu_info: GPU information (see :class:`NVidiaGpuInfo`)
+        :param timestamp: Time of sample from :func:`time.monotonic`, current time by default
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        for tier in self._tiers:
+            bucket = int(timestamp // tier.resolution)
+            if tier.bucket is not None and bucket <= tier.bucket:
+                # Same point, update the mean
+                tier.count += 1
+                for metric, buffer in tier.buffers.items():
+                    tier.sums[metric] += gpu_info[metric]  # type: ignore
+                    buffer.set_last(tier.sums[metric] / tier.count)
+                continue
+
+            gap = bucket - tier.bucket - 1 if tier.bucket is not None else 0
+            for metric, buffer in tier.buffers.items():
+                fill = buffer.last() if gap * tier.resolution <= MAX_GAP else math.nan
+                for _ in range(min(gap, buffer.capacity)):
+                    buffer.append(fill)
+                buffer.append(gpu_info[metric])  # type: ignore
+                tier.sums[metric] = gpu_info[metric]  # type: ignore
+            tier.bucket = bucket
+            tier.count = 1
+
+    def get(self, metric: str, tier: int = 0) -> RingBuffer:
+        """Return buffer with values of a metric.
+
+        :param metric: One of :data:`HISTORY_METRICS`
+        :param tier: Index of tier (see :data:`HISTORY_TIERS`)
+        :return: Ring buffer, should not be modified by caller
+        """
+        return self._tiers[tier].buffers[metric]
+
+    def clear(self) -> None:
+        """Forget all samples."""
+        self._tiers = [_Tier(resolution, capacity) for resolution, capacity in self.tiers]
+
+
+class HistoryStore:
+    """Metrics history of several GPUs by PCI bus ID."""
+
+    def __init__(self, tiers: Sequence[Tuple[float, int]] = HISTORY_TIERS) -> None:
+        """Initialize empty store.
+
+        :param tiers: Resolution (in seconds) and number of points of each tier
+        """
+        self.tiers = tiers
+        self._histories: Dict[str, MetricsHistory] = {}
+
+    def add(self, gpus_info: Dict[str, 'NVidiaGpuInfo'],
+            timestamp: Optional[float] = None) -> None:
+        """Add samples of several GPUs taken at the same time.
+
+        :param gpus_info: GPU information by PCI bus ID
+        :param timestamp: Time of sample from :func:`time.monotonic`, current time by default
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        for bus_id, gpu_info in gpus_info.items():
+            if bus_id not in self._histories:
+                self._histories[bus_id] = MetricsHistory(self.tiers)
+            self._histories[bus_id].add(gpu_info, timestamp)
+
+    def get(self, bus_id: str) -> Optional[MetricsHistory]:
+        """Return history of a GPU.
+
+        :param bus_id: PCI bus ID
+        :return: History, `None` if there were no samples for this GPU
+        """
+        return self._histories.get(bus_id)
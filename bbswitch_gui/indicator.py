@@ -1,5 +1,7 @@
 """Module containing tray indicator."""
 
+from typing import Dict
+
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('AppIndicator3', '0.1')
@@ -27,39 +29,82 @@ class Indicator(GObject.GObject):
             'customtray', 'bbswitch-tray-symbolic',
             AppIndicator3.IndicatorCategory.HARDWARE)
         self._app_indicator.set_status(AppIndicator3.IndicatorStatus.ACTIVE)
+        # Initial state matches the default one, since updates are made only on change
+        self._app_indicator.set_title('Discrete GPU: Off')
         self._enabled = False
         self._sensitive = False
 
+        # Menu is built only once, then updated in place
+        self._switch_image = Gtk.Image.new_from_icon_name(
+            'bbswitch-off-symbolic', Gtk.IconSize.MENU)  # type: ignore
+        self._switch_item = Gtk.ImageMenuItem()
+        # Items with state of each GPU, shown only if there are several GPUs
+        self._gpu_items: Dict[str, Gtk.MenuItem] = {}
+        self._gpu_separator = Gtk.SeparatorMenuItem()
+        self._app_indicator.set_menu(self._menu())
+
     def reset(self) -> None:
         """Reset indicator to default state."""
         self.set_state(False, False)
+        self.set_gpus({})
 
     def set_state(self, enabled: bool, sensitive: bool = True) -> None:
         """Set power state of dedicated GPU."""
-        self._enabled = enabled
-        self._sensitive = sensitive
-        self._app_indicator.set_icon('bbswitch-tray-active-symbolic' if enabled else
-                                     'bbswitch-tray-symbolic')
-        self._app_indicator.set_title('Discrete GPU: On' if enabled else
-                                      'Discrete GPU: Off')
-        self._app_indicator.set_menu(self._menu())
+        if enabled != self._enabled:
+            self._enabled = enabled
+            self._app_indicator.set_icon('bbswitch-tray-active-symbolic' if enabled else
+                                         'bbswitch-tray-symbolic')
+            self._app_indicator.set_title('Discrete GPU: On' if enabled else
+                                          'Discrete GPU: Off')
+            self._switch_item.set_label('Turn GPU Off' if enabled else
+                                        'Turn GPU On')
+            self._switch_image.set_from_icon_name('bbswitch-on-symbolic' if enabled else
+                                                  'bbswitch-off-symbolic',
+                                                  Gtk.IconSize.MENU)  # type: ignore
+
+        if sensitive != self._sensitive:
+            self._sensitive = sensitive
+            self._switch_item.set_sensitive(sensitive)
+
+    def set_gpus(self, states: Dict[str, str]) -> None:
+        """Set state of each GPU, displayed in menu if there are several of them.
+
+        :param states: Short state description by PCI bus ID (e.g. `{'0000:01:00.0': 'On'}`)
+        """
+        if len(states) < 2:
+            states = {}
+
+        menu = self._app_indicator.get_menu()
+        for bus_id in [bus_id for bus_id in self._gpu_items if bus_id not in states]:
+            menu.remove(self._gpu_items.pop(bus_id))
+
+        for position, (bus_id, state) in enumerate(sorted(states.items())):
+            label = f'GPU {bus_id}: {state}'
+            item = self._gpu_items.get(bus_id)
+            if item is None:
+                item = Gtk.MenuItem(label)
+                item.set_sensitive(False)
+                # Items of preceding GPUs are already in menu, so it's kept sorted
+                menu.insert(item, position)
+                item.show()
+                self._gpu_items[bus_id] = item
+            elif item.get_label() != label:
+                item.set_label(label)
+
+        self._gpu_separator.set_visible(len(self._gpu_items) > 0)
 
     def _menu(self):
         menu = Gtk.Menu()
 
-        switch_item = Gtk.ImageMenuItem()
-        switch_item.set_always_show_image(True)  # type: ignore
-        switch_item.connect('activate', self._request_power_state_switch)
+        menu.append(self._gpu_separator)
 
-        switch_item.set_label('Turn GPU Off' if self._enabled else
-                              'Turn GPU On')
-        switch_item.set_image(Gtk.Image.new_from_icon_name(
-            'bbswitch-on-symbolic' if self._enabled else
-            'bbswitch-off-symbolic',
-            Gtk.IconSize.MENU))  # type: ignore
-        switch_item.set_sensitive(self._sensitive)
+        self._switch_item.set_always_show_image(True)  # type: ignore
+        self._switch_item.connect('activate', self._request_power_state_switch)
+        self._switch_item.set_label('Turn GPU On')
+        self._switch_item.set_image(self._switch_image)
+        self._switch_item.set_sensitive(False)
 
-        menu.append(switch_item)
+        menu.append(self._switch_item)
 
         menu.append(Gtk.SeparatorMenuItem())
 
@@ -72,6 +117,7 @@ class Indicator(GObject.GObject):
         menu.append(close_item)
 
         menu.show_all()
+        self._gpu_separator.hide()
         return menu
 
     def _request_open(self, menuitem):
@@ -1,17 +1,31 @@
 """Module containing utilities for monitoring NVIDIA GPUs."""
 
+import os
+import time
+import queue
 import logging
-from typing import Any, Callable, List, TypedDict, Optional, Tuple
-from gi.repository import GLib, GObject  # pyright: ignore
+import threading
+from typing import Any, Callable, Dict, List, TypedDict, Optional, Tuple
+from gi.repository import GLib  # pyright: ignore
 
 try:
     import pynvml  # pyright: ignore
 except ImportError:
     from py3nvml import py3nvml as pynvml  # pyright: ignore
 
-from .psutil import PSUtil, PSUtilException
+from .profiler import Profiler
+from .psutil import PSUtilException, FileUsageTracker, ProcessCache
 
-NVIDIA_DEV = '/dev/nvidia0'  # Path to NVIDIA device
+NVIDIA_DEV = '/dev/nvidia{minor}'     # Path to NVIDIA device by its minor number
+MODULES_PATH = '/proc/modules'         # Path to list of loaded kernel modules
+SYSFS_MODULE_PATH = '/sys/module'      # Path to kernel modules in sysfs
+
+REFRESH_TIMEOUT = 1        # How often to refresh nvidia monitor data, in seconds
+REFRESH_TIMEOUT_MAX = 10   # How often to refresh stable nvidia monitor data, in seconds
+REFRESH_BACKOFF = 2        # How fast to slow down refreshing of stable nvidia monitor data
+
+# Modules whose presence in sysfs is checked on each update
+WATCHED_MODULES = ['nvidia', 'nvidia_modeset', 'nvidia_drm', 'nvidia_uvm', 'nouveau']
 
 logger = logging.getLogger(__name__)
 
@@ -58,38 +72,328 @@ class NvidiaMonitorException(Exception):
     """Exception thrown by :class:`NvidiaMonitor` class methods."""
 
 
-class NvidiaMonitor():
-    """Wrapper for executing nvidia-smi and parsing output."""
+class _KernelModules():
+    """Cached list of loaded NVIDIA kernel modules, reporting their changes."""
 
-    def __init__(self, timeout: int = 1) -> None:
-        """Initialize monitoring for `nvidia-smi` output.
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.callback: Optional[Callable] = None
+        self.modules: List[str] = []
+        self.signature: Optional[Tuple[bool, ...]] = None
+        self.time = 0.0
 
-        :param timeout: How often to check for GPU information, in seconds
+    def get(self) -> List[str]:
+        """Return names of loaded NVIDIA kernel modules.
+
+        :raises: :class:`NvidiaMonitorException` on failure
         """
-        self.timeout: int = timeout
-        self.timer: Optional[int] = None
-        self.callback: Optional[Callable] = None
-        self.callback_args: Tuple[Any, ...] = ()
+        # Checking presence of well-known modules is much cheaper than reading
+        # /proc/modules, so reread it only if they changed or cache became too old
+        signature = tuple(os.path.isdir(f'{SYSFS_MODULE_PATH}/{module}')
+                          for module in WATCHED_MODULES)
+        now = time.monotonic()
+        if signature == self.signature and now - self.time < self.interval:
+            return self.modules.copy()
+
+        modules = self._read()
+        loaded = [m for m in modules if m not in self.modules]
+        unloaded = [m for m in self.modules if m not in modules]
+        self.modules = modules
+        self.signature = signature
+        self.time = now
+
+        if loaded or unloaded:
+            if self.callback is not None:
+                # May be called from worker thread, so pass to main loop
+                GLib.idle_add(self.callback, loaded, unloaded)
+
+        return modules.copy()
+
+    @staticmethod
+    def _read():
+        modules = []
+        try:
+            with open(MODULES_PATH, encoding='utf-8') as file:
+                for line in file:
+                    parts = line.split(' ')
+                    if len(parts) > 0:
+                        if line.startswith('nvidia'):
+                            modules.append(parts[0])
+                        elif line.startswith('nouveau'):
+                            raise NvidiaMonitorException(
+                                'Nouveau is not supported, '
+                                'please install NVIDIA proprietary driver.'
+                            )
+        except OSError as err:
+            raise NvidiaMonitorException(err) from err
+        return modules
+
+
+class _PollingInterval():
+    """Polling interval growing while sampled GPU information stays the same."""
+
+    def __init__(self, timeout: float, max_timeout: float, backoff: float) -> None:
+        self.timeout = timeout
+        self.max_timeout = max_timeout
+        self.backoff = backoff
+        self.interval = timeout
+        self.signature: Optional[Tuple[Any, ...]] = None
+        self.immediate = False  # Take the next sample right after the current one
+
+    def reset(self) -> None:
+        """Poll fast again."""
+        self.interval = self.timeout
+        self.signature = None
+
+    def update(self, gpus_info: Optional[Dict[str, NVidiaGpuInfo]]) -> float:
+        """Account a new sample.
+
+        :param gpus_info: Sampled GPU information, `None` if not available
+        :return: Interval until the next sample, in seconds
+        """
+        if gpus_info is None:
+            # Keep polling fast while driver is loading or failing
+            signature = None
+        else:
+            signature = tuple((bus_id, gpu_info['gpu_util'], gpu_info['mem_used'],
+                               tuple(sorted(p['pid'] for p in gpu_info['processes'])))
+                              for bus_id, gpu_info in sorted(gpus_info.items()))
+
+        if signature is None or signature != self.signature:
+            self.interval = self.timeout
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_timeout)
+        self.signature = signature
+        return self.interval
+
+
+class _GpuSampler():
+    """Reader of GPU information sharing NVML session and process scan between GPUs."""
+
+    def __init__(self, sweep_interval: float, modules_interval: float) -> None:
+        self.fd_tracker = FileUsageTracker([], sweep_interval)
+        self.process_cache = ProcessCache()
+        self.modules = _KernelModules(modules_interval)
+        # Sampling may be run from worker thread and main loop at the same time
+        self.lock = threading.RLock()
+        self.rescan = False  # Rescan all processes on next sample
+        self._nvml_initialized = False
+        self._devices: Optional[Dict[str, Tuple[Any, str]]] = None
+
+    def sample(self, bus_ids: Optional[List[str]],
+               keep_session: bool) -> Optional[Dict[str, NVidiaGpuInfo]]:
+        """Return information of NVIDIA GPUs, see :meth:`NvidiaMonitor.gpus_info`.
+
+        :param bus_ids: PCI bus IDs of NVIDIA GPUs, `None` means all GPUs
+        :param keep_session: Keep NVML session open for the next sample
+        :raises: :class:`NvidiaMonitorException` on failure
+        """
+        if self.rescan:
+            self.rescan = False
+            self.fd_tracker.reset()
+
+        # Currently loaded NVIDIA kernel modules
+        with Profiler.span('gpu_info.modules'):
+            modules = self.modules.get()
+
+        if 'nvidia' not in modules:
+            # Driver has been unloaded, NVML session is not valid anymore
+            self.nvml_shutdown()
+            return None
+
+        try:
+            return self._sample(bus_ids, modules)
+        except pynvml.NVMLError as err:
+            # Session could be broken (driver unloaded, GPU lost), start over next time
+            self.nvml_shutdown()
+
+            if err.value == pynvml.NVML_ERROR_DRIVER_NOT_LOADED:  # type: ignore
+                # If driver is not loaded, just ignore this and return None
+                return None
+
+            raise NvidiaMonitorException(f'NVMLError: {err}') from err
+        except (PSUtilException, OSError) as err:
+            raise NvidiaMonitorException(err) from err
+        finally:
+            # Don't keep resources if called outside of monitor
+            if not keep_session:
+                self.nvml_shutdown()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Lock sampler for exclusive use, to be released with ``lock.release()``.
+
+        :param timeout: How long to wait for other thread, in seconds,
+                        `None` to wait forever, `0` to not wait at all
+        :return: `True` if sampler has been locked
+        """
+        # Waiting must be bounded, so lock can't be used as context manager
+        # pylint: disable=consider-using-with
+        if timeout == 0:
+            return self.lock.acquire(blocking=False)
+        return self.lock.acquire(timeout=-1 if timeout is None else timeout)
+
+    def close(self) -> None:
+        """Close NVML session and forget scanned processes."""
+        self.nvml_shutdown()
+        self.fd_tracker.reset()
+
+    def nvml_shutdown(self) -> None:
+        """Close NVML session if it is open."""
+        if self._nvml_initialized:
+            self._nvml_initialized = False
+            # Device handles are valid only within a session
+            self._devices = None
+            try:
+                pynvml.nvmlShutdown()
+            except pynvml.NVMLError as err:
+                logger.debug('Failed to shutdown NVML: %s', err)
+            logger.debug('NVML session closed')
+
+    def _nvml_init(self):
+        if not self._nvml_initialized:
+            pynvml.nvmlInit()
+            self._nvml_initialized = True
+            logger.debug('NVML session started')
+
+    def _sample(self, bus_ids, modules):
+        res: Dict[str, NVidiaGpuInfo] = {}
+        nvml_processes = {}
+        with Profiler.span('gpu_info.nvml'):
+            # NVML session is kept open while monitor is running
+            self._nvml_init()
+
+            devices = self._get_devices()
+            if bus_ids is None:
+                bus_ids = list(devices)
+            else:
+                bus_ids = [_normalize_bus_id(bus_id) for bus_id in bus_ids]
+
+            for bus_id in bus_ids:
+                if bus_id not in devices:
+                    raise NvidiaMonitorException(f'GPU {bus_id} not found in nvidia-smi')
+                handle, _ = devices[bus_id]
+                res[bus_id] = self._read_device(handle, modules)
+                nvml_processes[bus_id] = \
+                    pynvml.nvmlDeviceGetComputeRunningProcesses(handle) \
+                    + pynvml.nvmlDeviceGetGraphicsRunningProcesses(handle)
+
+        # Get all pids using devices, they may be not visible through NVML
+        with Profiler.span('gpu_info.fuser'):
+            fuser_pids = self.fd_tracker.update()
+
+        with Profiler.span('gpu_info.proc'):
+            used_pids = set()
+            for bus_id in bus_ids:
+                processes = self._merge_processes(nvml_processes[bus_id],
+                                                  fuser_pids.get(devices[bus_id][1], []))
+                res[bus_id]['processes'] = processes
+                used_pids.update(process['pid'] for process in processes)
+
+            # Forget processes which are not using GPUs anymore
+            self.process_cache.retain(used_pids)
+
+        return res
+
+    def _get_devices(self):
+        # Set of devices doesn't change within NVML session, so enumerate them only once
+        if self._devices is None:
+            devices = {}
+            for i in range(0, pynvml.nvmlDeviceGetCount()):
+                handle = pynvml.nvmlDeviceGetHandleByIndex(i)
+                bus_id = _get_bus_id(pynvml.nvmlDeviceGetPciInfo(handle))
+                minor = pynvml.nvmlDeviceGetMinorNumber(handle)
+                devices[bus_id] = (handle, NVIDIA_DEV.format(minor=minor))
+            self._devices = devices
+            self.fd_tracker.fnames = [fname for _, fname in devices.values()]
+        return self._devices
+
+    @staticmethod
+    def _read_device(handle, modules):
+        mem_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
+        util_rates = pynvml.nvmlDeviceGetUtilizationRates(handle)
+        return {
+            'gpu_temp': pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU),
+            'power_draw': pynvml.nvmlDeviceGetPowerUsage(handle) / 1000.0,
+            'mem_used': round(int(mem_info.used) / 1024 / 1024),
+            'mem_total': round(int(mem_info.total) / 1024 / 1024),
+            'gpu_util': int(util_rates.gpu),
+            'processes': [],
+            'modules': modules.copy()
+        }
+
+    def _merge_processes(self, nvml_processes, fuser_pids):
+        processes: Dict[int, NVidiaGpuProcessInfo] = {}
+        # Get everything available from NVML, gather memory usage
+        for proc in nvml_processes:
+            # If process was already added (like in case of C+G type)
+            if proc.pid in processes:
+                continue
+            self._add_process(processes, proc.pid, round(proc.usedGpuMemory / 1024 / 1024))
+
+        # Add all fuser PIDs that were not present in NVML
+        for pid in fuser_pids:
+            if pid not in processes:
+                self._add_process(processes, pid, -1)
+        return list(processes.values())
 
     def _add_process(self, processes, pid, mem_used):
         try:
-            processes.append({
+            processes[pid] = {
                 'pid': pid,
                 'mem_used': mem_used,
-                'cmdline': PSUtil.get_cmdline(pid)
-            })
+                'cmdline': self.process_cache.get_cmdline(pid, self.fd_tracker.get_start_time(pid))
+            }
         except PSUtilException as err:
             logger.warning(err)
             return False
         return True
 
-    def _check_bus_id(self, pci_info, bus_id):
-        if hasattr(pci_info, 'busIdLegacy'):
-            if pci_info.busIdLegacy != bus_id:
-                return False
-        elif pci_info.busId != bus_id.encode():
-            return False
-        return True
+
+def _get_bus_id(pci_info):
+    bus_id = pci_info.busIdLegacy if hasattr(pci_info, 'busIdLegacy') else pci_info.busId
+    if isinstance(bus_id, bytes):
+        bus_id = bus_id.decode()
+    return _normalize_bus_id(bus_id)
+
+
+def _normalize_bus_id(bus_id):
+    # NVML may report 8-digit PCI domain (e.g. `00000000:01:00.0`), sysfs uses 4 digits
+    domain, _, rest = bus_id.lower().partition(':')
+    return f'{domain[-4:]}:{rest}'
+
+
+class NvidiaMonitor():
+    """Wrapper for executing nvidia-smi and parsing output."""
+
+    def __init__(self, timeout: float = REFRESH_TIMEOUT, max_timeout: float = REFRESH_TIMEOUT_MAX,
+                 backoff: float = REFRESH_BACKOFF, sweep_interval: float = 10,
+                 modules_interval: float = 10) -> None:
+        """Initialize monitoring for `nvidia-smi` output.
+
+        Polling interval starts from ``timeout`` and grows by ``backoff`` factor
+        up to ``max_timeout`` while GPU utilization and processes stay the same.
+
+        :param timeout: How often to check for GPU information when it changes, in seconds
+        :param max_timeout: How often to check for GPU information when it is stable,
+                            in seconds
+        :param backoff: Factor to increase polling interval by on each stable sample
+        :param sweep_interval: How often to rescan all processes for using GPU, in seconds
+        :param modules_interval: How often to reread the full list of kernel modules,
+                                 in seconds
+        """
+        self.timer: Optional[int] = None
+        self.running = False
+        self.callback: Optional[Callable] = None
+        self.callback_args: Tuple[Any, ...] = ()
+        self._sampler = _GpuSampler(sweep_interval, modules_interval)
+        self._sampler.modules.callback = self._modules_changed
+        self._polling = _PollingInterval(timeout, max_timeout, backoff)
+        self._sampling = False
+        # One-shot callbacks of refresh(), waiting for the next sample and for the one in progress
+        self._refresh_callbacks: List[Tuple[Callable, Tuple[Any, ...]]] = []
+        self._sample_callbacks: List[Tuple[Callable, Tuple[Any, ...]]] = []
+        self._worker: Optional[threading.Thread] = None
+        self._requests: 'queue.SimpleQueue[bool]' = queue.SimpleQueue()
 
     def gpu_info(self, bus_id: str) -> Optional[NVidiaGpuInfo]:
         """Return NVIDIA GPU information.
@@ -99,81 +403,39 @@ class NvidiaMonitor():
         :param bus_id: PCI bus ID of NVIDIA GPU
         :raises: :class:`NvidiaMonitorException` on failure
         """
-        res: NVidiaGpuInfo = {
-            'gpu_temp': 0,
-            'power_draw': 0.0,
-            'mem_used': 0,
-            'mem_total': 0,
-            'gpu_util': 0,
-            'processes': [],
-            'modules': []
-        }
+        gpus_info = self.gpus_info([bus_id])
+        return gpus_info[_normalize_bus_id(bus_id)] if gpus_info is not None else None
 
-        # Currently loaded NVIDIA kernel modules
-        res['modules'] = self._get_modules()
+    def gpus_info(self, bus_ids: Optional[List[str]] = None,
+                  timeout: Optional[float] = None) -> Optional[Dict[str, NVidiaGpuInfo]]:
+        """Return information of several NVIDIA GPUs sampled in one pass.
 
-        device_count = -1
-        try:
-            pynvml.nvmlInit()
-
-            device_count = pynvml.nvmlDeviceGetCount()
-            for i in range(0, device_count):
-                handle = pynvml.nvmlDeviceGetHandleByIndex(i)
-                pci_info = pynvml.nvmlDeviceGetPciInfo(handle)
-
-                if not self._check_bus_id(pci_info, bus_id):
-                    continue
-
-                mem_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
-                res['mem_total'] = round(int(mem_info.total) / 1024 / 1024)
-                res['mem_used'] = round(int(mem_info.used) / 1024 / 1024)
-
-                util_rates = pynvml.nvmlDeviceGetUtilizationRates(handle)
-                res['gpu_util'] = int(util_rates.gpu)
-
-                gpu_temp = pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU)
-                res['gpu_temp'] = gpu_temp
-
-                power_usage = pynvml.nvmlDeviceGetPowerUsage(handle)
-                res['power_draw'] = power_usage / 1000.0
-
-                # Get all pids from fuser, they may be not visible through NVML
-                fuser_pids = PSUtil.get_fuser_pids(NVIDIA_DEV)
-                # Get everything available from NVML, gather memory usage
-                for proc in pynvml.nvmlDeviceGetComputeRunningProcesses(handle) \
-                        + pynvml.nvmlDeviceGetGraphicsRunningProcesses(handle):
-                    # If process was listed by fuser, remove it, we will add more info
-                    if proc.pid in fuser_pids:
-                        fuser_pids.remove(proc.pid)
-                    # If process was already added (like in case of C+G type)
-                    if next((p for p in res['processes'] if p['pid'] == proc.pid), None):
-                        continue
-                    self._add_process(res['processes'],
-                                      proc.pid,
-                                      round(proc.usedGpuMemory / 1024 / 1024))
-
-                # Add all fuser PIDs that were not present in NVML
-                for pid in fuser_pids:
-                    self._add_process(res['processes'], pid, -1)
-
-                return res
-        except pynvml.NVMLError as err:
-            if err.value == pynvml.NVML_ERROR_DRIVER_NOT_LOADED:  # type: ignore
-                # If driver is not loaded, just ignore this and return None
-                return None
+        NVML session, list of kernel modules and scan of processes
+        are shared between GPUs, so cost grows linearly with number of GPUs.
 
-            raise NvidiaMonitorException(f'NVMLError: {err}') from err
+        :param bus_ids: PCI bus IDs of NVIDIA GPUs, `None` means all GPUs
+        :param timeout: How long to wait for sample in progress on monitor thread,
+                        in seconds, `None` to wait until it's finished
+        :raises: :class:`NvidiaMonitorException` on failure
+        :return: Dictionary with GPU information by PCI bus ID,
+                 `None` if NVIDIA kernel modules are not loaded
+        """
+        if not self._sampler.acquire(timeout):
+            raise NvidiaMonitorException('Timed out waiting for GPU sample in progress')
+        try:
+            with Profiler.span('gpu_info'):
+                return self._sampler.sample(bus_ids, keep_session=self.running)
         finally:
-            # Don't forget to release resources
-            if device_count != -1:
-                pynvml.nvmlShutdown()
-
-        raise NvidiaMonitorException(f'GPU {bus_id} not found in nvidia-smi')
+            self._sampler.lock.release()
 
     def monitor_start(self, on_change: Callable, *on_change_args) -> None:
         """Start monitoring changes of nvidia-smi info.
 
-        Calls the callback with optional arguments every several seconds.
+        Samples information of all GPUs on worker thread every several seconds
+        (see :meth:`__init__` for polling interval) and calls the callback
+        on main loop with the result of :meth:`gpus_info` (or `None`) and
+        :class:`NvidiaMonitorException` (or `None`) as first positional arguments,
+        followed by optional arguments.
         If monitor was already started, only callback with arguments will be updated.
 
         :param on_change: Callback to be called on GPU state change
@@ -181,36 +443,142 @@ class NvidiaMonitor():
         """
         self.callback = on_change
         self.callback_args = on_change_args
-        if self.timer is None and self.callback is not None:
-            self.timer = GObject.timeout_add_seconds(self.timeout, self._timer_callback)
+        if not self.running and self.callback is not None:
+            # Poll fast right after start
+            self.running = True
+            self._polling.reset()
             self._timer_callback()
 
-    def monitor_stop(self) -> None:
-        """Stop monitoring changes of GPU states."""
+    def monitor_stop(self, timeout: float = 0) -> bool:
+        """Stop monitoring changes of GPU states.
+
+        Also closes NVML session, so kernel modules could be unloaded.
+        If sample is in progress, session is closed on monitor thread
+        once it's finished, unless ``timeout`` is given to wait for it.
+
+        :param timeout: How long to wait for sample in progress, in seconds
+        :return: `True` if session has been closed, `False` if sample is still in progress
+        """
+        self.running = False
+        self._refresh_callbacks.clear()
+        self._sample_callbacks.clear()
         if self.timer is not None:
-            GObject.source_remove(self.timer)
+            GLib.source_remove(self.timer)
             self.timer = None
 
-    def _get_modules(self):
-        modules = []
+        if not self._sampler.acquire(timeout):
+            return False
         try:
-            with open('/proc/modules', encoding='utf-8') as file:
-                for line in file:
-                    parts = line.split(' ')
-                    if len(parts) > 0:
-                        if line.startswith('nvidia'):
-                            modules.append(parts[0])
-                        elif line.startswith('nouveau'):
-                            raise NvidiaMonitorException(
-                                'Nouveau is not supported, '
-                                'please install NVIDIA proprietary driver.'
-                            )
-        except OSError as err:
-            raise NvidiaMonitorException(err) from err
-        return modules
+            self._sampler.close()
+        finally:
+            self._sampler.lock.release()
+        return True
+
+    def reset_processes(self) -> None:
+        """Rescan all processes for using GPU on next sample."""
+        self._sampler.rescan = True
+
+    def refresh(self, on_sample: Optional[Callable] = None, *on_sample_args) -> None:
+        """Sample GPU information as soon as possible if monitor is running.
+
+        Polling becomes fast again. If sample is in progress,
+        the next one is taken right after it.
+
+        :param on_sample: Optional callback to be called once on main loop, after
+                          monitor callback, with result of the first sample started
+                          after this call, like monitor callback. If monitor is not
+                          running, it waits for :meth:`monitor_start`. Not called
+                          if monitor is stopped before sample is finished
+        :param on_sample_args: Optional arguments to on_sample()
+        """
+        if on_sample is not None:
+            self._refresh_callbacks.append((on_sample, on_sample_args))
+        if not self.running:
+            return
+
+        self._polling.reset()
+        if self.timer is not None:
+            GLib.source_remove(self.timer)
+            self._timer_callback()
+        else:
+            self._polling.immediate = True
+
+    def _modules_changed(self, loaded, unloaded):
+        if loaded:
+            logger.info('NVIDIA kernel modules loaded: %s', ', '.join(loaded))
+        if unloaded:
+            logger.info('NVIDIA kernel modules unloaded: %s', ', '.join(unloaded))
+        if 'nvidia' in loaded:
+            # Driver is ready, don't wait for the next poll to show GPU information
+            self.refresh()
+        return GLib.SOURCE_REMOVE
 
     def _timer_callback(self):
-        # Do not call a callback if timer has been stopped
-        if self.timer is not None and self.callback is not None:
-            self.callback(*self.callback_args)
-        return GLib.SOURCE_CONTINUE
+        self.timer = None
+
+        # Do not start sampling if monitor has been stopped
+        # or previous sample is still in progress (next one is scheduled after it)
+        if not self.running or self.callback is None or self._sampling:
+            return GLib.SOURCE_REMOVE
+
+        self._sampling = True
+        self._sample_callbacks, self._refresh_callbacks = self._refresh_callbacks, []
+        if self._worker is None:
+            # Single thread lives as long as the process, waiting for next sample
+            self._worker = threading.Thread(target=self._work, name='nvidia-monitor',
+                                            daemon=True)
+            self._worker.start()
+        self._requests.put(True)
+        return GLib.SOURCE_REMOVE
+
+    def _work(self):
+        while self._requests.get():
+            self._sample()
+
+    def _sample(self):
+        gpus_info, error = None, None
+        try:
+            gpus_info = self.gpus_info()
+        except NvidiaMonitorException as err:
+            error = err
+        except Exception as err:  # pylint: disable=broad-except
+            # Report unexpected failure as well, otherwise monitor would stop silently
+            logger.debug('GPU sample failed', exc_info=True)
+            error = NvidiaMonitorException(f'Failed to sample GPU information: {err}')
+        finally:
+            # Monitor could have been stopped during sample, without waiting for it
+            if not self.running:
+                with self._sampler.lock:
+                    self._sampler.close()
+            GLib.idle_add(self._sample_finished, gpus_info, error)
+
+    def _sample_finished(self, gpus_info, error):
+        self._sampling = False
+        if not self.running:
+            return GLib.SOURCE_REMOVE
+
+        interval = self._polling.update(gpus_info)
+        # Monitor callback could stop monitor, which drops callbacks of refresh()
+        callbacks, self._sample_callbacks = self._sample_callbacks, []
+        try:
+            if self.callback is not None:
+                self.callback(gpus_info, error, *self.callback_args)
+            for on_sample, on_sample_args in callbacks:
+                on_sample(gpus_info, error, *on_sample_args)
+        finally:
+            # Callback could stop or restart monitor, or fail without stopping it
+            if self.running and self.timer is None and not self._sampling:
+                if self._polling.immediate:
+                    self._polling.immediate = False
+                    interval = 0
+                self.timer = self._timeout_add(interval, self._timer_callback)
+        return GLib.SOURCE_REMOVE
+
+    @staticmethod
+    def _timeout_add(interval, callback):
+        if interval == 0:
+            return GLib.idle_add(callback)
+        # Whole seconds let GLib coalesce wakeups with other timers of the process
+        if interval == int(interval):
+            return GLib.timeout_add_seconds(int(interval), callback)
+        return GLib.timeout_add(int(interval * 1000), callback)
@@ -1,16 +1,103 @@
 """Module containing utilities for PCI subsystem."""
 
-from typing import cast
-from typing import Tuple, Dict, Union
+import os
+import re
+import json
+import logging
+
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, TypedDict
+
+PCI_DEVICES_PATH = '/sys/bus/pci/devices'  # Path to PCI devices in sysfs
+PCI_IDS_PATH = '/usr/share/hwdata/pci.ids'  # Path to PCI IDs database
+
+# Where to store index of PCI IDs database, `None` disables it
+PCI_IDS_CACHE_DIR: Optional[str] = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'bbswitch-gui')
+
+# Line starting block of vendor devices in PCI IDs database
+VENDOR_LINE_RE = re.compile(rb'([0-9a-f]{4})  ')
+
+logger = logging.getLogger(__name__)
 
 
 class PCIUtilException(Exception):
     """Exception thrown by :class:`PCIUtil` class methods."""
 
 
+class PCIDeviceInfo(TypedDict):
+    """Class for storing PCI device identity."""
+
+    vendor_id: str
+    """Vendor ID (e.g. `10de`)"""
+
+    device_id: str
+    """Device ID (e.g. `1c20`)"""
+
+    subsystem_vendor_id: str
+    """Subsystem vendor ID (e.g. `1043`)"""
+
+    subsystem_device_id: str
+    """Subsystem device ID (e.g. `1a3e`)"""
+
+    vendor: Optional[str]
+    """Vendor name (or `None` if not available)"""
+
+    device: Optional[str]
+    """Device name (or `None` if not available)"""
+
+
 class PCIUtil:
     """Wrapper for retrieving information about PCI devices."""
 
+    _devices: Dict[str, PCIDeviceInfo] = {}
+    _names: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    _index: Dict[str, Any] = {}
+
+    @staticmethod
+    def get_device(bus_id: str) -> PCIDeviceInfo:
+        """Retrieve identity of PCI device by PCI bus ID.
+
+        Identity does not change while device is present, so it is read
+        from sysfs only once and kept until :meth:`invalidate` is called.
+        Names which were not found are looked up again on the next call.
+
+        :param bus_id: PCI bus ID
+        :return: PCI device information (see :class:`PCIDeviceInfo`)
+        :raises: :class:`PCIUtilException` on failure
+        """
+        device = PCIUtil._devices.get(bus_id)
+        if device is None:
+            device = {
+                'vendor_id': PCIUtil._read_id(bus_id, 'vendor'),
+                'device_id': PCIUtil._read_id(bus_id, 'device'),
+                'subsystem_vendor_id': PCIUtil._read_id(bus_id, 'subsystem_vendor'),
+                'subsystem_device_id': PCIUtil._read_id(bus_id, 'subsystem_device'),
+                'vendor': None,
+                'device': None
+            }
+            PCIUtil._devices[bus_id] = device
+
+        # PCI IDs database could be installed or updated meanwhile
+        if device['vendor'] is None:
+            try:
+                device['vendor'], device['device'] = PCIUtil.get_device_info(
+                    device['vendor_id'], device['device_id'])
+            except PCIUtilException as err:
+                logger.warning(err)
+
+        return device
+
+    @staticmethod
+    def invalidate(bus_id: Optional[str] = None) -> None:
+        """Forget cached identity of PCI device, e.g. after it was hotplugged.
+
+        :param bus_id: PCI bus ID, or `None` to forget all devices
+        """
+        if bus_id is None:
+            PCIUtil._devices.clear()
+        else:
+            PCIUtil._devices.pop(bus_id, None)
+
     @staticmethod
     def get_vendor_id(bus_id: str) -> str:
         """Retrieve vendor ID by BCI bus ID.
@@ -19,14 +106,7 @@ class PCIUtil:
         :return: PCI vendor ID (e.g. `10de`)
         :raises: :class:`PCIUtilException` on failure
         """
-        vendor = None
-        try:
-            with open(f'/sys/bus/pci/devices/{bus_id}/vendor', encoding='utf-8') as file:
-                vendor = file.read().removeprefix('0x').rstrip()
-        except OSError as err:
-            raise PCIUtilException(err) from err
-
-        return vendor
+        return PCIUtil.get_device(bus_id)['vendor_id']
 
     @staticmethod
     def get_device_id(bus_id) -> str:
@@ -36,49 +116,124 @@ class PCIUtil:
         :return: PCI device ID (e.g. `1c20`)
         :raises: :class:`PCIUtilException` on failure
         """
-        device = None
+        return PCIUtil.get_device(bus_id)['device_id']
+
+    @staticmethod
+    def _read_id(bus_id: str, attr: str) -> str:
         try:
-            with open(f'/sys/bus/pci/devices/{bus_id}/device', encoding='utf-8') as file:
-                device = file.read().removeprefix('0x').rstrip()
+            with open(f'{PCI_DEVICES_PATH}/{bus_id}/{attr}', encoding='utf-8') as file:
+                return file.read().removeprefix('0x').rstrip()
         except OSError as err:
             raise PCIUtilException(err) from err
 
-        return device
-
     @staticmethod
     def get_device_info(vendor, device) -> Tuple[str, str]:
         """Retrieve vendor and device names by PCI vendor and device IDs.
 
+        Only the block of requested vendor is parsed, results are memoized.
+        Offsets of vendor blocks are indexed up to the requested vendor
+        and stored in user cache directory.
+
         :param vendor: Vendor ID (e.g. `10de`)
         :param device: Device ID (e.g. `1c20`)
         :return: Tuple of PCI vendor and device names,
                  e.g. `('NVIDIA Corporation', 'GP106M [GeForce GTX 1060 Mobile]')`
         :raises: :class:`PCIUtilException` on failure
         """
-        ids_lib: Dict[str, Dict[str, Union[Dict[str, str], str]]] = {}
-        temp_vendor = ''
+        names = PCIUtil._names.get((vendor, device))
+        if names is None:
+            names = PCIUtil._lookup_device_info(vendor, device)
+            PCIUtil._names[(vendor, device)] = names
+        return names
+
+    @staticmethod
+    def _lookup_device_info(vendor: str, device: str) -> Tuple[str, str]:
         try:
-            with open('/usr/share/hwdata/pci.ids', encoding='utf-8') as file:
-                for line in file:
-                    # If line is tabbed or contains an hashtag skips
-                    if line[:3] == '\t\t' or line[0] == '#':
-                        continue
-
-                    # If line isn't tabbed and isn't a newline create a :
-                    if not line[:1] in ['\t', '\n']:
-                        temp_vendor = line.split()[0]
-                        ids_lib[temp_vendor] = {'name': line[6:-1]}
-
-                    if line.startswith('\t\t') or line.startswith('\n'):
-                        continue
-                    if line.startswith('\t') and temp_vendor:
-                        ids_lib[temp_vendor][line.split()[0]] \
-                            = {'name': ' '.join(line.split()[1:])}
+            with open(PCI_IDS_PATH, 'rb') as file:
+                offset = PCIUtil._get_vendor_offset(file, vendor)
+                if offset is not None:
+                    file.seek(offset)
+                    vendor_name = file.readline()[6:].decode(errors='replace').strip()
+                    for line in file:
+                        # Skip subsystems, comments and empty lines
+                        if line[:2] == b'\t\t' or line[:1] in [b'#', b'\n']:
+                            continue
+                        # Next vendor block started
+                        if line[:1] != b'\t':
+                            break
+                        parts = line.decode(errors='replace').split()
+                        if parts[0] == device:
+                            return vendor_name, ' '.join(parts[1:])
         except OSError as err:
             raise PCIUtilException(err) from err
 
-        if vendor not in ids_lib or device not in ids_lib[vendor]:
-            raise PCIUtilException(f'Name not found for PCI device {vendor}:{device}')
+        raise PCIUtilException(f'Name not found for PCI device {vendor}:{device}')
+
+    @staticmethod
+    def _get_vendor_offset(file: BinaryIO, vendor: str) -> Optional[int]:
+        fstat = os.fstat(file.fileno())
+        key = [PCI_IDS_PATH, fstat.st_mtime_ns, fstat.st_size]
+
+        index_path = os.path.join(PCI_IDS_CACHE_DIR, 'pci.ids.index') \
+            if PCI_IDS_CACHE_DIR else None
+
+        if PCIUtil._index.get('key') != key:
+            # Try to load index from cache, it's valid until pci.ids is modified
+            index = PCIUtil._load_index(index_path, key) if index_path else None
+            PCIUtil._index = index or {'key': key, 'offsets': {}, 'end': 0}
+
+        offsets: Dict[str, int] = PCIUtil._index['offsets']
+        end: Optional[int] = PCIUtil._index['end']  # Where indexing stopped, `None` at EOF
+        if vendor in offsets or end is None:
+            return offsets.get(vendor)
+
+        # Vendors are indexed only up to the requested one, the rest of the file
+        # is read when another vendor is requested (most lookups are for one GPU)
+        file.seek(end)
+        for line in file:
+            offset = end
+            end += len(line)
+            # Only vendor lines are needed, skip devices, comments and empty lines
+            if line[:1] in [b'\t', b'#', b'\n']:
+                continue
+            match = VENDOR_LINE_RE.match(line)
+            if match is not None:
+                name = match.group(1).decode()
+                offsets[name] = offset
+                if name == vendor:
+                    break
+        else:
+            end = None
+        PCIUtil._index['end'] = end
+
+        if index_path:
+            try:
+                os.makedirs(os.path.dirname(index_path), exist_ok=True)
+                with open(index_path + '.tmp', 'w', encoding='utf-8') as index_file:
+                    json.dump(PCIUtil._index, index_file)
+                os.replace(index_path + '.tmp', index_path)
+            except OSError as err:
+                logger.debug('Failed to save PCI IDs index: %s', err)
+
+        return offsets.get(vendor)
 
-        return str(ids_lib[vendor]['name']), \
-            cast(Dict[str, str], ids_lib[vendor][device])['name']
+    @staticmethod
+    def _load_index(index_path: str, key: List[Any]) -> Optional[Dict[str, Any]]:
+        try:
+            with open(index_path, encoding='utf-8') as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError) as err:
+            logger.debug('Failed to load PCI IDs index: %s', err)
+            return None
+
+        # Index could be written by another version or damaged, rebuild it then
+        if not isinstance(index, dict) or index.get('key') != key:
+            return None
+        offsets = index.get('offsets')
+        end = index.get('end')
+        if not isinstance(offsets, dict) or 'end' not in index \
+                or not (end is None or isinstance(end, int)) \
+                or not all(isinstance(offset, int) for offset in offsets.values()):
+            logger.debug('Malformed PCI IDs index: %s', index_path)
+            return None
+        return index
@@ -0,0 +1,176 @@
+"""Module containing utilities for measuring time spent in application code."""
+
+import os
+import json
+import math
+import time
+import random
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+PERCENTILES = [50, 90, 99]  # Percentiles of span durations to display in summary
+SAMPLE_SIZE = 1024          # Durations of each span kept for estimating percentiles
+MAX_EVENTS = 100000         # Spans kept for trace export, the oldest ones are dropped
+
+
+class ProfilerException(Exception):
+    """Exception thrown by :class:`Profiler` class methods."""
+
+
+class _Span():
+    """Context manager measuring duration of a named code block."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> '_Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        Profiler.record(self.name, self.start, time.perf_counter())
+
+
+class _NullSpan():
+    """Context manager doing nothing, used when profiling is disabled."""
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _SpanStats():
+    """Durations of a named span, with memory usage not growing over time."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sample: List[float] = []
+
+    def add(self, duration: float) -> None:
+        """Account duration of a finished span."""
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        if len(self.sample) < SAMPLE_SIZE:
+            self.sample.append(duration)
+            return
+        # Reservoir sampling: each duration stays in sample with the same probability
+        index = random.randrange(self.count)
+        if index < SAMPLE_SIZE:
+            self.sample[index] = duration
+
+
+class Profiler:
+    """Collector of timings for application startup and periodic updates.
+
+    Spans are recorded from application start until :meth:`enable` or :meth:`disable`
+    is called when command line is parsed, so import phases and startup are covered too.
+    After :meth:`disable` all calls are no-op.
+
+    Memory usage is bounded for long profiling sessions: percentiles are estimated
+    from a random sample of :data:`SAMPLE_SIZE` durations of each span, and only
+    the last :data:`MAX_EVENTS` spans are exported to trace.
+    """
+
+    enabled: Optional[bool] = None  # None until command line has been parsed
+
+    _lock = threading.Lock()
+    _origin = time.perf_counter()
+    _durations: Dict[str, _SpanStats] = {}
+    _events: Deque[Dict[str, Any]] = deque(maxlen=MAX_EVENTS)
+
+    @staticmethod
+    def enable() -> None:
+        """Keep recording spans, including ones recorded before the call."""
+        Profiler.enabled = True
+
+    @staticmethod
+    def disable() -> None:
+        """Stop recording spans and drop everything recorded so far."""
+        Profiler.enabled = False
+        with Profiler._lock:
+            Profiler._durations.clear()
+            Profiler._events.clear()
+
+    @staticmethod
+    def span(name: str) -> Any:
+        """Measure duration of a code block, to be used with `with` statement.
+
+        :param name: Name of the span, nested spans should be prefixed with parent name
+        :return: Context manager
+        """
+        if Profiler.enabled is False:
+            return _NULL_SPAN
+        return _Span(name)
+
+    @staticmethod
+    def record(name: str, start: float, end: float) -> None:
+        """Record a span with known start and end time.
+
+        :param name: Name of the span
+        :param start: Start time returned by :func:`time.perf_counter`
+        :param end: End time returned by :func:`time.perf_counter`
+        """
+        if Profiler.enabled is False:
+            return
+        with Profiler._lock:
+            Profiler._durations.setdefault(name, _SpanStats()).add(end - start)
+            Profiler._events.append({
+                'name': name,
+                'ph': 'X',
+                'ts': (start - Profiler._origin) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+            })
+
+    @staticmethod
+    def summary() -> str:
+        """Format statistics of recorded spans.
+
+        :return: Table with count, total time and percentiles of each span, in milliseconds
+        """
+        header = ['span', 'count', 'total'] + [f'p{pct}' for pct in PERCENTILES] + ['max']
+        rows = [header]
+        with Profiler._lock:
+            for name, stats in sorted(Profiler._durations.items()):
+                values = sorted(stats.sample)
+                rows.append([name, str(stats.count), f'{stats.total * 1000:.3f}']
+                            + [f'{Profiler._percentile(values, pct) * 1000:.3f}'
+                               for pct in PERCENTILES]
+                            + [f'{stats.max * 1000:.3f}'])
+
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        return '\n'.join(
+            '  '.join(cell.ljust(widths[i]) if i == 0 else cell.rjust(widths[i])
+                      for i, cell in enumerate(row))
+            for row in rows)
+
+    @staticmethod
+    def export(fname: str) -> None:
+        """Write recorded spans in Chrome trace format (`chrome://tracing`, Perfetto).
+
+        :param fname: Path to output JSON file
+        :raises: :class:`ProfilerException` on failure
+        """
+        with Profiler._lock:
+            trace = {'traceEvents': list(Profiler._events), 'displayTimeUnit': 'ms'}
+        try:
+            with open(fname, 'w', encoding='utf-8') as file:
+                json.dump(trace, file)
+        except OSError as err:
+            raise ProfilerException(f'Failed to write trace to "{fname}": {err}') from err
+
+    @staticmethod
+    def _percentile(values, pct):
+        # Nearest-rank method, values should be sorted
+        return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
@@ -1,8 +1,14 @@
 """Module containing utilities for process management."""
 
 import os
-import subprocess  # nosec
-from typing import List
+import stat
+import time
+from collections import OrderedDict
+from typing import Container, Dict, Iterable, List, Optional, Set, Tuple
+
+PROC_PATH = '/proc'  # Path to procfs mount point
+
+FileKey = Tuple[int, int, int]  # Identity of file or device, see PSUtil.get_file_key()
 
 
 class PSUtilException(Exception):
@@ -23,28 +29,298 @@ class PSUtil:
         :raises: :class:`PSUtilException` on failure
         """
         try:
-            with open(f'/proc/{pid}/cmdline', 'rb') as file:
+            with open(f'{PROC_PATH}/{pid}/cmdline', 'rb') as file:
                 return file.read().replace(b'\x00', b' ').decode().rstrip()
         except OSError as err:
             raise PSUtilException(err) from err
 
+    @staticmethod
+    def get_start_time(pid: int, proc_fd: Optional[int] = None) -> int:
+        """Retrieve process start time, useful to detect PID reuse.
+
+        Uses `/proc/{pid}/stat` internally.
+
+        :param pid: Process PID
+        :param proc_fd: Optional directory file descriptor returned by :meth:`open_proc`
+        :return: Start time after system boot, in clock ticks
+        :raises: :class:`PSUtilException` on failure
+        """
+        try:
+            if proc_fd is None:
+                with open(f'{PROC_PATH}/{pid}/stat', 'rb') as file:
+                    data = file.read()
+            else:
+                stat_fd = os.open(f'{pid}/stat', os.O_RDONLY, dir_fd=proc_fd)
+                try:
+                    data = os.read(stat_fd, 4096)
+                finally:
+                    os.close(stat_fd)
+            # Process name may contain spaces and braces, so skip it first
+            return int(data[data.rindex(b')') + 2:].split()[19])
+        except (OSError, ValueError, IndexError) as err:
+            raise PSUtilException(f'Failed to get start time of process {pid}: {err}') from err
+
     @staticmethod
     def get_fuser_pids(fname: str) -> List[int]:
         """Retrieve PIDs using certain file or device.
 
-        Uses `fuser` utility internally.
+        Works like `fuser` utility, but scans `/proc/{pid}/fd` in-process.
+        Only open file descriptors are checked: unlike `fuser`, processes
+        which merely map the file (`/proc/{pid}/maps`) or use it as
+        current directory, root or executable are not reported.
+        That's enough for NVIDIA devices, as driver clients keep them open while in use.
+        Devices are matched by device number, regular files by inode.
+        Processes which are not accessible for current user are skipped.
+
+        :param fname: Path to file or device
+        :return: List with PIDs
+        :raises: :class:`PSUtilException` on failure
+        """
+        key = PSUtil.get_file_key(fname)
+        my_pid = os.getpid()  # Filter out our PID
+
+        proc_fd = PSUtil.open_proc()
+        try:
+            return [pid for pid in PSUtil.list_pids(proc_fd)
+                    if pid != my_pid and PSUtil.scan_fds(proc_fd, pid, {key})]
+        finally:
+            os.close(proc_fd)
+
+    @staticmethod
+    def get_file_key(fname: str) -> FileKey:
+        """Retrieve identity of a file to be compared with open file descriptors.
 
         :param fname: Path to file or device
+        :return: Tuple of file type, device and inode for regular files,
+                 for device files inode is replaced by device number
+        :raises: :class:`PSUtilException` on failure
+        """
+        try:
+            return PSUtil._stat_key(os.stat(fname))
+        except OSError as err:
+            raise PSUtilException(err) from err
+
+    @staticmethod
+    def open_proc() -> int:
+        """Open procfs directory to be reused by :meth:`list_pids` and :meth:`scan_fds`.
+
+        :return: Directory file descriptor, should be closed by caller
+        :raises: :class:`PSUtilException` on failure
+        """
+        try:
+            return os.open(PROC_PATH, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError as err:
+            raise PSUtilException(err) from err
+
+    @staticmethod
+    def list_pids(proc_fd: int) -> List[int]:
+        """Retrieve PIDs of all running processes.
+
+        :param proc_fd: Directory file descriptor returned by :meth:`open_proc`
         :return: List with PIDs
         :raises: :class:`PSUtilException` on failure
         """
         try:
-            proc = subprocess.run(['fuser', fname],  # nosec
-                                  capture_output=True,
-                                  check=True)
-        except subprocess.CalledProcessError as err:
+            return [int(name) for name in os.listdir(proc_fd) if name.isdigit()]
+        except OSError as err:
             raise PSUtilException(err) from err
 
-        my_pid = str(os.getpid())  # Filter out our PID
-        pids = [int(pid) for pid in proc.stdout.decode().split() if pid != my_pid]
-        return pids
+    @staticmethod
+    def scan_fds(proc_fd: int, pid: int, keys: Iterable[FileKey]) -> Set[FileKey]:
+        """Check which of given files are opened by process.
+
+        :param proc_fd: Directory file descriptor returned by :meth:`open_proc`
+        :param pid: Process PID
+        :param keys: Files to look for (see :meth:`get_file_key`)
+        :return: Set of files opened by process, empty if process is not accessible
+        """
+        keys = set(keys)
+        found: Set[FileKey] = set()
+        if not keys:
+            # Nothing to look for, don't stat descriptors
+            return found
+        try:
+            fd_dir = os.open(f'{pid}/fd', os.O_RDONLY | os.O_DIRECTORY, dir_fd=proc_fd)
+        except OSError:
+            # Process has exited or belongs to another user
+            return found
+
+        try:
+            for name in os.listdir(fd_dir):
+                try:
+                    key = PSUtil._stat_key(os.stat(name, dir_fd=fd_dir))
+                except OSError:
+                    # Descriptor has been closed meanwhile
+                    continue
+                if key in keys:
+                    found.add(key)
+                    if len(found) == len(keys):
+                        break
+        except OSError:
+            pass
+        finally:
+            os.close(fd_dir)
+        return found
+
+    @staticmethod
+    def _stat_key(st: os.stat_result) -> FileKey:
+        if stat.S_ISCHR(st.st_mode) or stat.S_ISBLK(st.st_mode):
+            return (stat.S_IFMT(st.st_mode), 0, st.st_rdev)
+        return (stat.S_IFMT(st.st_mode), st.st_dev, st.st_ino)
+
+
+class FileUsageTracker:
+    """Incrementally tracks processes using certain files or devices.
+
+    Unlike :meth:`PSUtil.get_fuser_pids`, descriptors are rescanned only for
+    processes which have not been seen before and for known users of the files
+    (including reused PIDs, detected by start time).
+    All processes are rescanned only once per ``sweep_interval`` seconds,
+    so a process that opens the file later, or reuses PID of a process
+    which did not use it, is detected no later than that.
+    """
+
+    def __init__(self, fnames: List[str], sweep_interval: float = 10) -> None:
+        """Initialize tracker.
+
+        :param fnames: Paths to files or devices to track
+        :param sweep_interval: How often to rescan all processes, in seconds
+        """
+        self.fnames = fnames
+        self.sweep_interval = sweep_interval
+        self._keys: Dict[FileKey, str] = {}
+        self._seen: Set[int] = set()  # Scanned processes
+        self._users: Dict[int, Set[str]] = {}
+        self._start_times: Dict[int, int] = {}
+        self._last_sweep: Optional[float] = None
+
+    def reset(self) -> None:
+        """Forget all processes, next update will rescan everything."""
+        self._seen.clear()
+        self._users.clear()
+        self._start_times.clear()
+        self._last_sweep = None
+
+    def get_start_time(self, pid: int) -> Optional[int]:
+        """Return start time of tracked process recorded during last update.
+
+        :param pid: Process PID
+        :return: Start time in clock ticks, `None` if process is not using tracked files
+        """
+        return self._start_times.get(pid)
+
+    def update(self) -> Dict[str, List[int]]:
+        """Update list of processes using tracked files.
+
+        :return: Dictionary with PIDs using each of tracked files
+        :raises: :class:`PSUtilException` on failure
+        """
+        keys = {PSUtil.get_file_key(fname): fname for fname in self.fnames}
+        if keys != self._keys:
+            # Files have been recreated or changed, start from scratch
+            self._keys = keys
+            self.reset()
+        if not keys:
+            # Nothing to track, don't touch procfs at all
+            return {}
+
+        now = time.monotonic()
+        if self._last_sweep is None or now - self._last_sweep >= self.sweep_interval:
+            self._seen.clear()
+            self._last_sweep = now
+
+        my_pid = os.getpid()  # Filter out our PID
+        proc_fd = PSUtil.open_proc()
+        try:
+            pids = PSUtil.list_pids(proc_fd)
+            seen: Set[int] = set()
+            for pid in pids:
+                if pid == my_pid:
+                    continue
+                seen.add(pid)
+                if pid in self._seen and pid not in self._users:
+                    # Known process not using files, checked again on next sweep
+                    continue
+                self._update_pid(proc_fd, pid)
+        finally:
+            os.close(proc_fd)
+
+        # Forget processes which have exited
+        self._seen = seen
+        for pid in [pid for pid in self._users if pid not in self._seen]:
+            del self._users[pid]
+            del self._start_times[pid]
+
+        res: Dict[str, List[int]] = {fname: [] for fname in self.fnames}
+        for pid, fnames in self._users.items():
+            for fname in fnames:
+                res[fname].append(pid)
+        return res
+
+    def _update_pid(self, proc_fd, pid):
+        keys: Set[FileKey] = set()
+        start_time = self._get_start_time(proc_fd, pid)
+        if start_time is not None:
+            keys = PSUtil.scan_fds(proc_fd, pid, self._keys)
+
+        if keys:
+            self._users[pid] = {self._keys[key] for key in keys}
+            self._start_times[pid] = start_time
+        elif pid in self._users:
+            del self._users[pid]
+            del self._start_times[pid]
+
+    @staticmethod
+    def _get_start_time(proc_fd, pid):
+        try:
+            return PSUtil.get_start_time(pid, proc_fd)
+        except PSUtilException:
+            # Process has exited meanwhile
+            return None
+
+
+class ProcessCache:
+    """Bounded cache of process information.
+
+    Entries are keyed by PID and process start time,
+    so information is read once per process lifetime even if PID gets reused.
+    """
+
+    def __init__(self, max_size: int = 256) -> None:
+        """Initialize cache.
+
+        :param max_size: Maximum number of processes to keep, least recently used are evicted
+        """
+        self.max_size = max_size
+        self._entries: OrderedDict[int, Tuple[int, str]] = OrderedDict()
+
+    def get_cmdline(self, pid: int, start_time: Optional[int] = None) -> str:
+        """Retrieve command line for running process.
+
+        :param pid: Process PID
+        :param start_time: Process start time if already known (see :meth:`PSUtil.get_start_time`)
+        :return: Process name with arguments
+        :raises: :class:`PSUtilException` on failure
+        """
+        if start_time is None:
+            start_time = PSUtil.get_start_time(pid)
+
+        entry = self._entries.get(pid)
+        if entry is not None and entry[0] == start_time:
+            self._entries.move_to_end(pid)
+            return entry[1]
+
+        cmdline = PSUtil.get_cmdline(pid)
+        self._entries[pid] = (start_time, cmdline)
+        self._entries.move_to_end(pid)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return cmdline
+
+    def retain(self, pids: Container[int]) -> None:
+        """Forget all processes except given ones, e.g. after they have exited.
+
+        :param pids: PIDs of processes to keep
+        """
+        for pid in [pid for pid in self._entries if pid not in pids]:
+            del self._entries[pid]
@@ -0,0 +1,74 @@
+"""Module containing utilities for loading UI resources."""
+
+import os
+import logging
+
+from typing import Optional
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib, Gio, Gtk  # pyright: ignore
+
+PACKAGE_PATH = os.path.dirname(__file__)  # Path to installed package
+
+# Bundle compiled by meson from bbswitch-gui.gresource.xml, missing for pip installations
+RESOURCE_BUNDLE = os.path.join(PACKAGE_PATH, 'bbswitch-gui.gresource')
+RESOURCE_PREFIX = '/io/github/polter-rnd/bbswitch-gui'  # Prefix of files inside the bundle
+
+UI_PATH = os.path.join(PACKAGE_PATH, 'ui')  # Fallback path to UI definitions and styles
+
+logger = logging.getLogger(__name__)
+
+
+class Resources:
+    """Wrapper for loading UI files from GResource bundle or from filesystem."""
+
+    _registered: Optional[bool] = None
+    _icons_added = False
+
+    @staticmethod
+    def register() -> bool:
+        """Register resource bundle once, also adding bundled icons to icon theme.
+
+        :return: `True` if bundle is available, `False` if files should be loaded from filesystem
+        """
+        if Resources._registered is None:
+            try:
+                Gio.resources_register(Gio.Resource.load(RESOURCE_BUNDLE))
+                Resources._registered = True
+            except GLib.Error as err:  # type: ignore
+                logger.debug('Resource bundle is not available: %s',
+                             err.message)  # type: ignore
+                Resources._registered = False
+
+        if Resources._registered and not Resources._icons_added:
+            # Icon theme is available only after display has been opened
+            icon_theme = Gtk.IconTheme.get_default()
+            if icon_theme is not None:
+                icon_theme.add_resource_path(f'{RESOURCE_PREFIX}/icons')
+                Resources._icons_added = True
+
+        return Resources._registered
+
+    @staticmethod
+    def template(name: str) -> Gtk.Template:
+        """Create template for a widget class.
+
+        :param name: File name relative to `ui` directory (e.g. `bbswitch-gui.glade`)
+        :return: Template to be used as class decorator
+        """
+        if Resources.register():
+            return Gtk.Template(resource_path=f'{RESOURCE_PREFIX}/ui/{name}')
+        return Gtk.Template(filename=os.path.join(UI_PATH, name))
+
+    @staticmethod
+    def load_css(provider: Gtk.CssProvider, name: str) -> None:
+        """Load styles to CSS provider.
+
+        :param provider: CSS provider to load styles to
+        :param name: File name relative to `ui` directory (e.g. `style.css`)
+        """
+        if Resources.register():
+            provider.load_from_resource(f'{RESOURCE_PREFIX}/ui/{name}')
+        else:
+            provider.load_from_path(os.path.join(UI_PATH, name))  # type: ignore
@@ -0,0 +1,72 @@
+"""Module containing utilities for Unix socket servers."""
+
+import os
+import stat
+import socket
+import logging
+from typing import Optional
+
+from gi.repository import GLib, Gio  # pyright: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class SockUtilException(Exception):
+    """Exception thrown by :class:`SockUtil` class methods."""
+
+
+class SockUtil:
+    """Helpers for listening on Unix sockets left behind by previous runs."""
+
+    @staticmethod
+    def bind_unix_socket(service: Gio.SocketService, path: str) -> None:
+        """Add Unix socket to socket service, replacing stale socket file.
+
+        :param service: Socket service to listen with
+        :param path: Path to socket file
+        :raises: :class:`SockUtilException` on failure
+        """
+        try:
+            if os.path.lexists(path):
+                # Never remove anything but a socket left by previous run
+                if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                    raise SockUtilException(f'Failed to listen on "{path}": not a socket')
+                if SockUtil._is_listening(path):
+                    raise SockUtilException(f'Failed to listen on "{path}": already in use')
+                os.unlink(path)
+        except OSError as err:
+            raise SockUtilException(f'Failed to remove stale socket "{path}": {err}') from err
+
+        try:
+            service.add_address(Gio.UnixSocketAddress.new(path), Gio.SocketType.STREAM,
+                                Gio.SocketProtocol.DEFAULT, None)
+        except GLib.GError as err:  # type: ignore
+            raise SockUtilException(
+                f'Failed to listen on "{path}": {err.message}') from err  # type: ignore
+
+    @staticmethod
+    def _is_listening(path: str) -> bool:
+        # Socket file is stale unless someone accepts connections on it
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(path)
+            except ConnectionRefusedError:
+                return False
+        return True
+
+    @staticmethod
+    def close_unix_socket(service: Gio.SocketService, path: Optional[str]) -> None:
+        """Stop socket service and remove socket file.
+
+        :param service: Socket service to close
+        :param path: Path to socket file, `None` if service has no Unix socket
+        """
+        service.stop()
+        service.close()
+        if path is None:
+            return
+        try:
+            if stat.S_ISSOCK(os.lstat(path).st_mode):
+                os.unlink(path)
+        except OSError as err:
+            logger.debug('Failed to remove socket "%s": %s', path, err)
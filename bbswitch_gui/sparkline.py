@@ -0,0 +1,207 @@
+"""Module containing widget drawing recent history of a metric."""
+
+import math
+from typing import Optional, Tuple
+
+import cairo
+import gi
+gi.require_version('Gtk', '3.0')
+gi.require_version('Gdk', '3.0')
+gi.require_foreign('cairo')
+from gi.repository import Gtk, Gdk  # pyright: ignore
+
+from .history import RingBuffer
+
+POINT_WIDTH = 2     # Horizontal distance between points, in pixels
+LINE_WIDTH = 1.0    # Width of graph line, in pixels
+
+
+class Sparkline(Gtk.DrawingArea):
+    """Small line graph of the latest values in :class:`RingBuffer`.
+
+    Graph is kept on an offscreen surface. When values are appended to the buffer,
+    the surface is scrolled left and only new segments are drawn on it, so cost
+    of a redraw does not depend on the number of visible points. The whole graph
+    is drawn again only when its size, style, buffer or vertical scale changes.
+    Redraw is not scheduled at all if the buffer has not changed, and is limited
+    to the right edge if only the last value has been updated.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        """Initialize widget.
+
+        :param width: Requested width, in pixels
+        :param height: Requested height, in pixels
+        """
+        super().__init__()
+        self.set_size_request(width, height)
+        self.add_events(Gdk.EventMask.BUTTON_PRESS_MASK)
+
+        self._buffer: Optional[RingBuffer] = None
+        self._revision = 0                      # Buffer revision already queued for drawing
+        # Values at the bottom and top edges, None means top follows the values
+        self._limits: Tuple[float, Optional[float]] = (0.0, None)
+        self._top = 1.0                         # Value drawn at the top edge
+
+        self._surface: Optional[cairo.Surface] = None
+        self._back: Optional[cairo.Surface] = None  # Spare surface to scroll into
+        self._drawn = 0                             # Buffer appends already drawn
+        self._size = (0, 0)                         # Width and height of surfaces
+
+        self.connect('draw', self._on_draw)
+        self.connect('size-allocate', self._on_size_allocate)
+        self.connect('style-updated', self._on_changed)
+
+    @property
+    def points(self) -> int:
+        """Number of points fitting into the widget."""
+        return self.get_allocated_width() // POINT_WIDTH + 1
+
+    def set_data(self, buffer: Optional[RingBuffer],
+                 minimum: float = 0.0, maximum: Optional[float] = None) -> None:
+        """Set values to draw and schedule redraw of new ones.
+
+        :param buffer: Buffer with values, `None` to draw nothing
+        :param minimum: Value at the bottom edge
+        :param maximum: Value at the top edge, `None` to scale to the largest visible value
+        """
+        revision = buffer.revision if buffer is not None else 0
+        if buffer is not self._buffer or (minimum, maximum) != self._limits:
+            self._buffer = buffer
+            self._limits = (minimum, maximum)
+            self._surface = None
+        elif revision == self._revision:
+            # Nothing to draw
+            return
+        elif buffer is not None and buffer.appended == self._drawn and self._surface is not None \
+                and (maximum is not None or buffer.last() <= self._top):
+            # Only the last point has been updated, graph is neither scrolled nor rescaled
+            self._revision = revision
+            width = self.get_allocated_width()
+            left = width - 1 - 2 * POINT_WIDTH
+            self.queue_draw_area(left, 0, width - left, self.get_allocated_height())
+            return
+
+        self._revision = revision
+        self.queue_draw()
+
+    def _on_size_allocate(self, widget, allocation):
+        del widget  # unused argument
+        # Allocation is repeated on each relayout of the window, mostly with the same size
+        if (allocation.width, allocation.height) != self._size:
+            self._surface = None
+
+    def _on_changed(self, *args):
+        del args  # unused argument
+        self._surface = None
+
+    def _on_draw(self, widget, cr):
+        del widget  # unused argument
+        self._update_surface()
+        if self._surface is not None:
+            cr.set_source_surface(self._surface, 0, 0)
+            cr.paint()
+        return False
+
+    def _update_surface(self):
+        gdk_window = self.get_window()
+        if gdk_window is None:
+            return
+        width = self.get_allocated_width()
+        height = self.get_allocated_height()
+        appended = self._buffer.appended if self._buffer is not None else 0
+
+        new = appended - self._drawn
+        if self._surface is None or new >= self.points:
+            self._surface = gdk_window.create_similar_surface(
+                cairo.CONTENT_COLOR_ALPHA, width, height)
+            self._back = gdk_window.create_similar_surface(
+                cairo.CONTENT_COLOR_ALPHA, width, height)
+            self._size = (width, height)
+            self._drawn = appended
+            self._draw_points(self._surface, self.points + 1, 0, rescale=True)
+            return
+
+        if new > 0:
+            # Scroll the graph, leaving empty space for new points on the right
+            cr = cairo.Context(self._back)
+            cr.set_operator(cairo.OPERATOR_SOURCE)
+            cr.set_source_surface(self._surface, -new * POINT_WIDTH, 0)
+            cr.paint()
+            self._surface, self._back = self._back, self._surface
+            self._drawn = appended
+
+        # The last point could have been updated too (see `RingBuffer.set_last`),
+        # so redraw area from the point before it, continuing line from one more point
+        if not self._draw_points(self._surface, new + 3, new + 1, rescale=False):
+            self._surface = None
+            self._update_surface()
+
+    def _draw_points(self, surface, count, clip, rescale):
+        # Draw `count` latest points, clearing the area right of point with index `clip`
+        # (counting from the latest one); returns False if values do not fit the scale
+        values = self._buffer.values(count) if self._buffer is not None else []
+        if not self._update_top(values, rescale):
+            return False
+
+        width = self.get_allocated_width()
+        height = self.get_allocated_height()
+        cr = cairo.Context(surface)
+        left = width - 1 - clip * POINT_WIDTH if clip else 0
+        cr.rectangle(left, 0, width - left, height)
+        cr.clip()
+        cr.set_operator(cairo.OPERATOR_CLEAR)
+        cr.paint()
+        cr.set_operator(cairo.OPERATOR_OVER)
+        self._stroke(cr, values)
+        return True
+
+    def _update_top(self, values, rescale):
+        # Without rescaling the top edge stays, so returns False if values are above it
+        minimum, maximum = self._limits
+        if maximum is not None:
+            self._top = maximum
+        elif rescale:
+            self._top = self._nice_ceil(max((v for v in values if not math.isnan(v)),
+                                            default=minimum))
+        elif any(v > self._top for v in values):
+            return False
+        return True
+
+    def _stroke(self, cr, values):
+        width = self.get_allocated_width()
+        height = self.get_allocated_height()
+        minimum, _ = self._limits
+        scale = (height - LINE_WIDTH) / max(self._top - minimum, 1e-9)
+
+        color = self.get_style_context().get_color(self.get_state_flags())
+        cr.set_source_rgba(color.red, color.green, color.blue, color.alpha)
+        cr.set_line_width(LINE_WIDTH)
+        cr.set_line_join(cairo.LINE_JOIN_ROUND)
+
+        drawing = False
+        for i, value in enumerate(values):
+            if math.isnan(value):
+                # No samples for this point, break the line
+                drawing = False
+                continue
+            x = width - 1 - (len(values) - 1 - i) * POINT_WIDTH + 0.5
+            value = min(max(value, minimum), self._top)
+            y = height - LINE_WIDTH / 2 - (value - minimum) * scale
+            if drawing:
+                cr.line_to(x, y)
+            else:
+                cr.move_to(x, y)
+                drawing = True
+        cr.stroke()
+
+    @staticmethod
+    def _nice_ceil(value):
+        # Round value up to 1, 2 or 5 multiplied by power of 10
+        if value <= 0:
+            return 1.0
+        magnitude = 10 ** math.floor(math.log10(value))
+        for step in [1, 2, 5, 10]:
+            if value <= step * magnitude:
+                return float(step * magnitude)
+        return float(10 * magnitude)
@@ -4,20 +4,68 @@ import os
 import signal
 import logging
 
-from typing import cast
-from pkg_resources import resource_filename
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, cast
 
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('Gdk', '3.0')
 from gi.repository import GObject, Gtk, Gdk  # pyright: ignore
 
-from .nvidia import NVidiaGpuInfo
+from .resources import Resources
+from .sparkline import Sparkline, POINT_WIDTH
+from .history import HistoryStore
+
+if TYPE_CHECKING:
+    from .nvidia import NVidiaGpuInfo
+
+SPARKLINE_WIDTH = 60    # Width of metric history graphs, in pixels
+SPARKLINE_HEIGHT = 16   # Height of metric history graphs, in pixels
 
 logger = logging.getLogger(__name__)
 
 
-@Gtk.Template(filename=resource_filename(__name__, 'ui/bbswitch-gui.glade'))
+class _HistoryGraphs():
+    """Graphs of GPU metrics history, all showing the same history tier."""
+
+    def __init__(self, history: HistoryStore) -> None:
+        self.history = history
+        self.sparklines: Dict[str, Sparkline] = {}
+        self.tier = 0
+
+    def add(self, metric: str) -> Sparkline:
+        """Create graph of a metric, to be packed by caller."""
+        sparkline = Sparkline(SPARKLINE_WIDTH, SPARKLINE_HEIGHT)
+        self.sparklines[metric] = sparkline
+        return sparkline
+
+    def update(self, bus_id: Optional[str], gpu_info: 'NVidiaGpuInfo') -> None:
+        """Redraw graphs from history of GPU."""
+        history = self.history.get(bus_id) if bus_id is not None else None
+        limits = {
+            'gpu_temp': 100.0,
+            'power_draw': None,
+            'mem_used': float(gpu_info['mem_total']) if gpu_info['mem_total'] > 0 else None,
+            'gpu_util': 100.0,
+        }
+        for metric, sparkline in self.sparklines.items():
+            buffer = history.get(metric, self.tier) if history is not None else None
+            sparkline.set_data(buffer, 0.0, limits[metric])
+
+    def next_tier(self) -> None:
+        """Switch to the next history tier, from the shortest period again after last."""
+        self.tier = (self.tier + 1) % len(self.history.tiers)
+        self.update_tooltips()
+
+    def update_tooltips(self) -> None:
+        """Describe displayed period in tooltips."""
+        resolution, _ = self.history.tiers[self.tier]
+        seconds = int(resolution * (SPARKLINE_WIDTH // POINT_WIDTH))
+        period = f'{seconds // 60} minutes' if seconds >= 60 else f'{seconds} seconds'
+        for sparkline in self.sparklines.values():
+            sparkline.set_tooltip_text(f'Last {period}, click to change')
+
+
+@Resources.template('bbswitch-gui.glade')
 class MainWindow(Gtk.ApplicationWindow):
     """Main application window."""
 
@@ -41,25 +89,42 @@ class MainWindow(Gtk.ApplicationWindow):
     error_label = cast(Gtk.Label, Gtk.Template.Child())
     warning_label = cast(Gtk.Label, Gtk.Template.Child())
     header_bar = cast(Gtk.HeaderBar, Gtk.Template.Child())
+    gpu_combo = cast(Gtk.ComboBoxText, Gtk.Template.Child())
 
     processes_store = cast(Gtk.ListStore, Gtk.Template.Child())
     processes_view = cast(Gtk.TreeView, Gtk.Template.Child())
     pid_column = cast(Gtk.TreeViewColumn, Gtk.Template.Child())
     memory_column = cast(Gtk.TreeViewColumn, Gtk.Template.Child())
+    gpu_column = cast(Gtk.TreeViewColumn, Gtk.Template.Child())
     name_column = cast(Gtk.TreeViewColumn, Gtk.Template.Child())
     check_column = cast(Gtk.TreeViewColumn, Gtk.Template.Child())
 
     kill_button = cast(Gtk.Button, Gtk.Template.Child())
     toggle_button = cast(Gtk.Button, Gtk.Template.Child())
 
-    def __init__(self, app, **kwargs) -> None:
-        """Initialize GUI widgets."""
+    def __init__(self, app, history: Optional[HistoryStore] = None, **kwargs) -> None:
+        """Initialize GUI widgets.
+
+        :param app: Application the window belongs to
+        :param history: History of GPU metrics to draw graphs from
+        """
         super().__init__(**kwargs)
         self.set_application(app)
 
+        # Rows of processes store by GPU and PID
+        self._process_rows: Dict[Tuple[str, int], Gtk.TreeRowReference] = {}
+        # GPUs as of last update and the one whose parameters are displayed
+        self._gpus_info: Dict[str, 'NVidiaGpuInfo'] = {}
+        self._gpu_ids: List[str] = []
+        self._header_gpu: Optional[str] = None
+        self._selected_gpu: Optional[str] = None
+        # Texts of GPU parameter labels as of last update
+        self._view_model: Dict[Gtk.Label, str] = {}
+        # Graphs of GPU parameters
+        self._graphs = _HistoryGraphs(history) if history is not None else None
+
         provider = Gtk.CssProvider()
-        provider.load_from_path(resource_filename(
-            __name__, 'ui/style.css'))  # type: ignore
+        Resources.load_css(provider, 'style.css')
 
         screen = Gdk.Screen.get_default()
         if screen:
@@ -76,11 +141,24 @@ class MainWindow(Gtk.ApplicationWindow):
         text_renderer = Gtk.CellRendererText()
         self.name_column.pack_start(text_renderer, True)
         self.name_column.add_attribute(text_renderer, 'text', 2)
+        self.gpu_column.pack_start(text_renderer, True)
+        self.gpu_column.add_attribute(text_renderer, 'text', 4)
 
         check_renderer = Gtk.CellRendererToggle()
         self.check_column.pack_start(check_renderer, False)
         self.check_column.add_attribute(check_renderer, 'active', 3)
 
+        if self._graphs is not None:
+            for metric, label in [('gpu_temp', self.temperature_label),
+                                  ('power_draw', self.power_label),
+                                  ('mem_used', self.memory_label),
+                                  ('gpu_util', self.utilization_label)]:
+                sparkline = self._graphs.add(metric)
+                sparkline.connect('button-press-event', self._on_sparkline_pressed)
+                cast(Gtk.Box, label.get_parent()).pack_start(sparkline, False, True, 0)
+                sparkline.show()
+            self._graphs.update_tooltips()
+
     def reset(self) -> None:
         """Reset window to default state."""
         self.state_switch.set_state(False)
@@ -88,9 +166,13 @@ class MainWindow(Gtk.ApplicationWindow):
         self.kill_button.set_sensitive(False)
         self.toggle_button.set_sensitive(False)
         self.processes_store.clear()
+        self._process_rows.clear()
+        self._gpus_info = {}
+        self._set_gpu_ids([])
         self.bar_stack.hide()
 
-    def update_header(self, bus_id: str, enabled: bool, vendor: str, device: str) -> None:
+    def update_header(self, bus_id: str, enabled: bool,
+                      vendor: Optional[str], device: Optional[str]) -> None:
         """Update headerbar for selected GPU.
 
         :param bus_id: PCI bus ID
@@ -105,6 +187,7 @@ class MainWindow(Gtk.ApplicationWindow):
 
         self.state_switch.set_state(enabled)
         self.state_switch.set_sensitive(True)
+        self._header_gpu = bus_id
 
         if device is None:
             self.header_bar.set_title(f'NVIDIA GPU on {bus_id}')
@@ -115,51 +198,96 @@ class MainWindow(Gtk.ApplicationWindow):
         if vendor is not None:
             self.header_bar.set_subtitle(vendor)
 
-    def update_monitor(self, gpu_info: NVidiaGpuInfo) -> None:
-        """Update UI for selected GPU.
+    def update_monitor(self, gpus_info: Dict[str, 'NVidiaGpuInfo']) -> None:
+        """Update UI with information of all GPUs.
 
-        :param gpu_info: Dictionary of additional GPU information
+        Parameters are displayed for GPU selected in headerbar (by default
+        the one passed to :meth:`update_header`), processes are listed for all GPUs.
+
+        :param gpus_info: Dictionaries of additional GPU information by PCI bus ID
         """
         self._set_bar_stack_page('monitor')
 
-        # Helper to convert memory in megabytes to string
-        def format_mem(mem: int) -> str:
-            return f'{mem} MiB' if mem != -1 else 'N/A'
-
-        # Update GPU parameters
-        self.temperature_label.set_text(str(gpu_info['gpu_temp']) + ' °C')
-        self.power_label.set_text(f"{gpu_info['power_draw']:.2f} W")
-        self.memory_label.set_text(str(gpu_info['mem_used']) + ' / '
-                                   + format_mem(gpu_info['mem_total']))
-        self.utilization_label.set_text(str(gpu_info['gpu_util']) + ' %')
-
-        # Update existing PIDs
-        processes = gpu_info['processes'].copy()
-        i = self.processes_store.get_iter_first()
-        while i is not None:
-            i_next = self.processes_store.iter_next(i)
-            pid = self.processes_store.get_value(i, 0)
-            cmdline = self.processes_store.get_value(i, 2)
-            process = next((p for p in processes if p['pid'] == pid), None)
-            if process is not None and process['cmdline'] == cmdline:
-                self.processes_store.set_value(i, 1, format_mem(process['mem_used']))
-                processes.remove(process)
-            else:
-                self.processes_store.remove(i)
-            i = i_next
+        self._gpus_info = gpus_info
+        self._set_gpu_ids(sorted(gpus_info))
+        if self._selected_gpu not in gpus_info:
+            self._selected_gpu = self._header_gpu if self._header_gpu in gpus_info \
+                else next(iter(self._gpu_ids), None)
+        if self._selected_gpu is not None:
+            self.gpu_combo.set_active_id(self._selected_gpu)
+            self._update_parameters(gpus_info[self._selected_gpu])
+
+        self._update_processes(gpus_info)
+
+    def _set_gpu_ids(self, gpu_ids):
+        if gpu_ids == self._gpu_ids:
+            return
+        self._gpu_ids = gpu_ids
+        self.gpu_combo.remove_all()
+        for bus_id in gpu_ids:
+            self.gpu_combo.append(bus_id, bus_id)
+        # Choosing and distinguishing GPUs makes sense only if there are several of them
+        self.gpu_combo.set_visible(len(gpu_ids) > 1)
+        self.gpu_column.set_visible(len(gpu_ids) > 1)
+
+    def _update_parameters(self, gpu_info):
+        mem_total = self._format_mem(gpu_info['mem_total'])
+
+        # Update only GPU parameters which look different
+        view_model = {
+            self.temperature_label: str(gpu_info['gpu_temp']) + ' °C',
+            self.power_label: f"{gpu_info['power_draw']:.2f} W",
+            self.memory_label: f"{gpu_info['mem_used']} / {mem_total}",
+            self.utilization_label: str(gpu_info['gpu_util']) + ' %',
+            self.modules_label: '\n'.join(['• ' + m for m in gpu_info['modules']])
+        }
+        for label, text in view_model.items():
+            if self._view_model.get(label) != text:
+                label.set_text(text)
+        self._view_model = view_model
+        if self._graphs is not None:
+            self._graphs.update(self._selected_gpu, gpu_info)
+
+    def _update_processes(self, gpus_info):
+        # Update existing PIDs, remove finished ones
+        processes = {(bus_id, process['pid']): process
+                     for bus_id, gpu_info in gpus_info.items()
+                     for process in gpu_info['processes']}
+        for key, row in list(self._process_rows.items()):
+            i = self.processes_store.get_iter(row.get_path()) if row.valid() else None
+            process = processes.get(key)
+            if i is None or process is None \
+                    or process['cmdline'] != self.processes_store.get_value(i, 2):
+                # Process has finished or its PID has been reused
+                del self._process_rows[key]
+                if i is not None:
+                    self.processes_store.remove(i)
+                continue
+
+            del processes[key]
+            mem_used = self._format_mem(process['mem_used'])
+            if self.processes_store.get_value(i, 1) != mem_used:
+                self.processes_store.set_value(i, 1, mem_used)
 
         # Add new PIDs
-        for process in processes:
-            self.processes_store.append([
-                process['pid'],
-                format_mem(process['mem_used']),
+        for (bus_id, pid), process in processes.items():
+            i = self.processes_store.append([
+                pid,
+                self._format_mem(process['mem_used']),
                 process['cmdline'],
-                False
+                False,
+                bus_id
             ])
+            self._process_rows[(bus_id, pid)] = Gtk.TreeRowReference.new(
+                self.processes_store, self.processes_store.get_path(i))
 
-        # Update modules
-        self.modules_label.set_text(
-            '\n'.join(['• ' + m for m in gpu_info['modules']]))
+        # Once for all changed rows, as it takes a pass over the store
+        self._update_process_buttons()
+
+    @staticmethod
+    def _format_mem(mem: int) -> str:
+        # Convert memory in megabytes to string
+        return f'{mem} MiB' if mem != -1 else 'N/A'
 
     def show_info(self, message) -> None:
         """Show information bar with informational message.
@@ -215,6 +343,8 @@ class MainWindow(Gtk.ApplicationWindow):
             gdk_window.set_cursor(arrow)
 
     def _set_bar_stack_page(self, name: str):
+        if self.bar_stack.get_visible() and self.bar_stack.get_visible_child_name() == name:
+            return
         page = self.bar_stack.get_child_by_name(name)
         if page:
             self.bar_stack.show()
@@ -235,16 +365,15 @@ class MainWindow(Gtk.ApplicationWindow):
         self.processes_store[path][3] = not self.processes_store[path][3]
         self.kill_button.set_sensitive(len(self._get_selected_pids()) > 0)
 
-    @Gtk.Template.Callback()
-    def _on_process_added_or_removed(self, store, path=None, iterator=None):
-        del store, path, iterator  # unused argument
+    def _update_process_buttons(self):
         self.kill_button.set_sensitive(len(self._get_selected_pids()) > 0)
         self.toggle_button.set_sensitive(self.processes_store.iter_n_children(None) > 0)
 
     @Gtk.Template.Callback()
     def _on_kill_button_clicked(self, button):
         del button  # unused argument
-        for pid in self._get_selected_pids():
+        # Process may be listed for several GPUs
+        for pid in set(self._get_selected_pids()):
             os.kill(pid, signal.SIGKILL)
 
     @Gtk.Template.Callback()
@@ -265,6 +394,25 @@ class MainWindow(Gtk.ApplicationWindow):
                 lambda store, path, iter: store.set_value(iter, 3, False))
             self.kill_button.set_sensitive(False)
 
+    @Gtk.Template.Callback()
+    def _on_gpu_combo_changed(self, combo):
+        bus_id = combo.get_active_id()
+        if bus_id is None or bus_id == self._selected_gpu:
+            return
+        self._selected_gpu = bus_id
+        if bus_id in self._gpus_info:
+            self._update_parameters(self._gpus_info[bus_id])
+
+    def _on_sparkline_pressed(self, widget, event):
+        del widget  # unused argument
+        if event.button != Gdk.BUTTON_PRIMARY or self._graphs is None:
+            return False
+        # Switch all graphs at once
+        self._graphs.next_tier()
+        if self._selected_gpu in self._gpus_info:
+            self._graphs.update(self._selected_gpu, self._gpus_info[self._selected_gpu])
+        return True
+
     @Gtk.Template.Callback()
     def _on_switch_released(self, switch: Gtk.Switch, gdata):
         del gdata  # unused argument
@@ -0,0 +1,163 @@
+"""Stand-in for `pynvml` module, emulating NVIDIA GPUs without hardware.
+
+Only functions used by :mod:`bbswitch_gui.nvidia` are implemented.
+Devices and processes are set up with :func:`configure`.
+"""
+
+from typing import Dict, List, NamedTuple
+
+NVML_ERROR_UNINITIALIZED = 1
+NVML_ERROR_INVALID_ARGUMENT = 2
+NVML_ERROR_NOT_FOUND = 6
+NVML_ERROR_DRIVER_NOT_LOADED = 9
+
+NVML_TEMPERATURE_GPU = 0
+
+
+class NVMLError(Exception):
+    """Exception thrown by NVML functions, like in the real module."""
+
+    def __init__(self, value: int) -> None:
+        super().__init__(value)
+        self.value = value
+
+    def __str__(self) -> str:
+        return f'NVML error {self.value}'
+
+
+class _Memory(NamedTuple):
+    total: int
+    free: int
+    used: int
+
+
+class _Utilization(NamedTuple):
+    gpu: int
+    memory: int
+
+
+class _PciInfo(NamedTuple):
+    busId: bytes
+
+
+class _Process(NamedTuple):
+    pid: int
+    usedGpuMemory: int
+
+
+class _Device():
+    def __init__(self, index: int, bus_id: str) -> None:
+        self.index = index
+        self.bus_id = bus_id
+        self.compute: List[_Process] = []
+        self.graphics: List[_Process] = []
+        self.samples = 0
+
+
+_devices: List[_Device] = []
+_by_bus_id: Dict[bytes, _Device] = {}
+_initialized = 0
+
+
+def configure(bus_ids: List[str], pids: List[int]) -> None:
+    """Set up emulated devices.
+
+    :param bus_ids: PCI bus IDs of devices (e.g. `['0000:01:00.0']`)
+    :param pids: PIDs of processes using GPUs, distributed between devices;
+                 every fourth process is reported as both compute and graphics one
+    """
+    _devices.clear()
+    _by_bus_id.clear()
+    for index, bus_id in enumerate(bus_ids):
+        device = _Device(index, bus_id)
+        _devices.append(device)
+        _by_bus_id[bus_id.encode()] = device
+
+    for i, pid in enumerate(pids):
+        device = _devices[i % len(_devices)]
+        process = _Process(pid, (i % 64 + 1) * 1024 * 1024 * 16)
+        device.graphics.append(process)
+        if i % 4 == 0:
+            device.compute.append(process)
+
+
+def _check_initialized() -> None:
+    if not _initialized:
+        raise NVMLError(NVML_ERROR_UNINITIALIZED)
+
+
+def nvmlInit() -> None:
+    global _initialized  # pylint: disable=global-statement
+    _initialized += 1
+
+
+def nvmlShutdown() -> None:
+    global _initialized  # pylint: disable=global-statement
+    _check_initialized()
+    _initialized -= 1
+
+
+def nvmlDeviceGetCount() -> int:
+    _check_initialized()
+    return len(_devices)
+
+
+def nvmlDeviceGetHandleByIndex(index: int) -> _Device:
+    _check_initialized()
+    if not 0 <= index < len(_devices):
+        raise NVMLError(NVML_ERROR_INVALID_ARGUMENT)
+    return _devices[index]
+
+
+def nvmlDeviceGetHandleByPciBusId(bus_id: bytes) -> _Device:
+    _check_initialized()
+    device = _by_bus_id.get(bus_id)
+    if device is None:
+        raise NVMLError(NVML_ERROR_NOT_FOUND)
+    return device
+
+
+def nvmlDeviceGetPciInfo(handle: _Device) -> _PciInfo:
+    _check_initialized()
+    # Like real NVML, report 8-digit PCI domain in upper case
+    return _PciInfo(('0000' + handle.bus_id).upper().encode())
+
+
+def nvmlDeviceGetMinorNumber(handle: _Device) -> int:
+    _check_initialized()
+    return handle.index
+
+
+def nvmlDeviceGetMemoryInfo(handle: _Device) -> _Memory:
+    _check_initialized()
+    total = 6 * 1024 * 1024 * 1024
+    used = sum(proc.usedGpuMemory for proc in handle.graphics)
+    return _Memory(total, max(0, total - used), min(total, used))
+
+
+def nvmlDeviceGetUtilizationRates(handle: _Device) -> _Utilization:
+    _check_initialized()
+    # Vary utilization a bit, like real GPU does
+    handle.samples += 1
+    return _Utilization(handle.samples % 100, handle.samples % 50)
+
+
+def nvmlDeviceGetTemperature(handle: _Device, sensor: int) -> int:
+    del sensor  # unused argument
+    _check_initialized()
+    return 40 + handle.index
+
+
+def nvmlDeviceGetPowerUsage(handle: _Device) -> int:
+    _check_initialized()
+    return 15000 + handle.index * 1000
+
+
+def nvmlDeviceGetComputeRunningProcesses(handle: _Device) -> List[_Process]:
+    _check_initialized()
+    return list(handle.compute)
+
+
+def nvmlDeviceGetGraphicsRunningProcesses(handle: _Device) -> List[_Process]:
+    _check_initialized()
+    return list(handle.graphics)
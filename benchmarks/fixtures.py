@@ -0,0 +1,154 @@
+"""Synthetic filesystem trees standing in for procfs, sysfs and system databases."""
+
+import os
+from typing import List
+
+NVIDIA_VENDOR_ID = '10de'
+NVIDIA_DEVICE_ID = '1c20'
+NVIDIA_VENDOR_NAME = 'NVIDIA Corporation'
+NVIDIA_DEVICE_NAME = 'GP106M [GeForce GTX 1060 Mobile]'
+
+SHARED_FILES = 64  # Number of regular files opened by synthetic processes
+
+
+class Fixture:
+    """Tree of synthetic system files in a given directory.
+
+    Layout mirrors paths used by :mod:`bbswitch_gui` modules,
+    which are redirected to it by overriding their path constants.
+    """
+
+    def __init__(self, root: str) -> None:
+        """Initialize paths inside fixture tree.
+
+        :param root: Directory to create files in
+        """
+        self.root = root
+        self.proc_path = os.path.join(root, 'proc')
+        self.modules_path = os.path.join(root, 'proc', 'modules')
+        self.sysfs_module_path = os.path.join(root, 'sys', 'module')
+        self.pci_devices_path = os.path.join(root, 'sys', 'bus', 'pci', 'devices')
+        self.pci_ids_path = os.path.join(root, 'pci.ids')
+        self.cache_dir = os.path.join(root, 'cache')
+        self.nvidia_devs: List[str] = []
+        self.bbswitch_path = os.path.join(root, 'bbswitch')
+        self.bus_ids: List[str] = []
+        self.pids: List[int] = []
+        self.gpu_pids: List[int] = []
+
+    def create_proc(self, pids: int, fds: int, gpu_users: int, gpus: int = 1) -> None:
+        """Create `/proc` stand-in with processes holding open files.
+
+        Descriptors are symlinks to regular files, GPU device nodes are regular files too,
+        since creating character devices requires root privileges.
+
+        :param pids: Number of processes
+        :param fds: Number of descriptors per process
+        :param gpu_users: Number of processes having one of GPU devices open
+        :param gpus: Number of GPU device nodes
+        """
+        files_path = os.path.join(self.root, 'files')
+        os.makedirs(files_path, exist_ok=True)
+        shared = []
+        for i in range(SHARED_FILES):
+            shared.append(os.path.join(files_path, f'file{i}'))
+            with open(shared[-1], 'wb'):
+                pass
+
+        dev_path = os.path.join(self.root, 'dev')
+        os.makedirs(dev_path, exist_ok=True)
+        self.nvidia_devs = []
+        for minor in range(gpus):
+            self.nvidia_devs.append(os.path.join(dev_path, f'nvidia{minor}'))
+            with open(self.nvidia_devs[-1], 'wb'):
+                pass
+
+        my_pid = os.getpid()
+        self.pids = [pid for pid in range(1, pids + 2) if pid != my_pid][:pids]
+        self.gpu_pids = self.pids[-gpu_users:] if gpu_users else []
+        gpu_pids = set(self.gpu_pids)
+
+        for pid in self.pids:
+            fd_path = os.path.join(self.proc_path, str(pid), 'fd')
+            os.makedirs(fd_path)
+            with open(os.path.join(self.proc_path, str(pid), 'stat'), 'w',
+                      encoding='utf-8') as file:
+                # Process name contains space and braces to exercise parsing
+                file.write(f'{pid} (proc ({pid})) S 1 {pid} {pid} 0 -1 4194560'
+                           + ' 0' * 12 + f' {1000 + pid} 0 0\n')
+            with open(os.path.join(self.proc_path, str(pid), 'cmdline'), 'wb') as file:
+                file.write(f'/usr/bin/proc{pid}\0--option\0value{pid}\0'.encode())
+
+            for fd in range(fds):
+                if fd == fds - 1 and pid in gpu_pids:
+                    target = self.nvidia_devs[pid % gpus]
+                else:
+                    target = shared[(pid + fd) % SHARED_FILES]
+                os.symlink(target, os.path.join(fd_path, str(fd)))
+
+    def create_modules(self, modules: List[str]) -> None:
+        """Create `/proc/modules` and `/sys/module` stand-ins.
+
+        :param modules: Names of loaded kernel modules
+        """
+        os.makedirs(self.proc_path, exist_ok=True)
+        with open(self.modules_path, 'w', encoding='utf-8') as file:
+            for module in ['snd', 'i915'] + modules + ['ext4', 'usbcore']:
+                file.write(f'{module} 16384 0 - Live 0x0000000000000000\n')
+        for module in modules:
+            os.makedirs(os.path.join(self.sysfs_module_path, module), exist_ok=True)
+
+    def create_pci_devices(self, gpus: int = 1) -> None:
+        """Create `/sys/bus/pci/devices` stand-in with NVIDIA GPUs and some other devices.
+
+        :param gpus: Number of NVIDIA GPUs
+        """
+        self.bus_ids = [f'0000:{bus + 1:02x}:00.0' for bus in range(gpus)]
+        devices = [(bus_id, NVIDIA_VENDOR_ID, NVIDIA_DEVICE_ID) for bus_id in self.bus_ids]
+        devices += [(f'0000:00:{slot:02x}.0', '8086', f'{0x9b00 + slot:04x}')
+                    for slot in range(16)]
+        for bus_id, vendor, device in devices:
+            path = os.path.join(self.pci_devices_path, bus_id)
+            os.makedirs(path)
+            for attr, value in [('vendor', vendor), ('device', device),
+                                ('subsystem_vendor', '1043'), ('subsystem_device', '1a3e')]:
+                with open(os.path.join(path, attr), 'w', encoding='utf-8') as file:
+                    file.write(f'0x{value}\n')
+
+    def create_pci_ids(self, vendors: int, devices: int) -> None:
+        """Create PCI IDs database resembling `pci.ids` from hwdata.
+
+        NVIDIA block is placed in its sorted position with requested device at its end.
+
+        :param vendors: Number of vendors
+        :param devices: Number of devices per vendor
+        """
+        vendor_ids = sorted({f'{0x1000 + i * 7:04x}' for i in range(vendors)}
+                            | {NVIDIA_VENDOR_ID})
+        with open(self.pci_ids_path, 'w', encoding='utf-8') as file:
+            file.write('#\n#\tList of PCI ID\'s (synthetic)\n#\n\n# Vendors, devices and '
+                       'subsystems. Please keep sorted.\n\n')
+            for vendor_id in vendor_ids:
+                if vendor_id == NVIDIA_VENDOR_ID:
+                    file.write(f'{vendor_id}  {NVIDIA_VENDOR_NAME}\n')
+                else:
+                    file.write(f'{vendor_id}  Vendor {vendor_id} Inc.\n')
+                for device in range(devices):
+                    file.write(f'\t{device:04x}  Device {device:04x} of {vendor_id}\n')
+                    if device % 3 == 0:
+                        file.write(f'\t\t1043 {device:04x}  Subsystem {device:04x}\n')
+                if vendor_id == NVIDIA_VENDOR_ID:
+                    file.write(f'\t{NVIDIA_DEVICE_ID}  {NVIDIA_DEVICE_NAME}\n')
+
+            file.write('\n# List of known device classes, subclasses and programming interfaces\n'
+                       '\nC 00  Unclassified device\n\t00  Non-VGA unclassified device\n'
+                       'C 03  Display controller\n\t00  VGA compatible controller\n')
+
+    def create_bbswitch(self, bus_id: str, enabled: bool) -> None:
+        """Create `/proc/acpi/bbswitch` stand-in.
+
+        :param bus_id: PCI bus ID of GPU
+        :param enabled: GPU power state
+        """
+        with open(self.bbswitch_path, 'w', encoding='utf-8') as file:
+            file.write(f'{bus_id} {"ON" if enabled else "OFF"}\n')
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# pylint: disable=import-outside-toplevel
+
+"""Benchmarks of bbswitch-gui hot paths, runnable without NVIDIA hardware.
+
+NVML is replaced by a stand-in module from `fake_pynvml` directory,
+procfs, sysfs, PCI IDs database and bbswitch control file are replaced by
+synthetic trees (see :mod:`fixtures`) by overriding module path constants.
+
+Benchmarks requiring PyGObject are skipped if it is not installed,
+the window benchmark also needs a display, e.g. run it with `xvfb-run`:
+
+    xvfb-run python3 benchmarks/run.py --output results.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import statistics
+import tempfile
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_PATH, 'fake_pynvml'))
+sys.path.insert(1, os.path.dirname(BENCH_PATH))
+
+import pynvml  # noqa: E402 pylint: disable=wrong-import-position
+
+import bbswitch_gui  # noqa: E402 pylint: disable=wrong-import-position
+from bbswitch_gui import pciutil, psutil  # noqa: E402 pylint: disable=wrong-import-position
+from bbswitch_gui.profiler import Profiler  # noqa: E402 pylint: disable=wrong-import-position
+
+from fixtures import Fixture, NVIDIA_VENDOR_ID, NVIDIA_DEVICE_ID  # noqa: E402
+
+
+class SkipBenchmark(Exception):
+    """Raised by benchmark when its requirements are not met."""
+
+
+def measure(func: Callable[[], Any], repeat: int,
+            setup: Optional[Callable[[], Any]] = None) -> List[float]:
+    """Call function several times measuring each call.
+
+    :param func: Function to measure
+    :param repeat: Number of measured calls, one more warm-up call is made before them
+    :param setup: Function to call before each call, not measured
+    :return: Durations of calls, in seconds
+    """
+    if setup:
+        setup()
+    func()
+
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Calculate statistics of measured durations.
+
+    :param samples: Durations, in seconds
+    :return: Dictionary with count and durations in seconds
+    """
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'min': ordered[0],
+        'mean': statistics.fmean(ordered),
+        'median': statistics.median(ordered),
+        'p90': ordered[max(0, -(-len(ordered) * 9 // 10) - 1)],
+        'max': ordered[-1],
+    }
+
+
+def require_gi(*namespaces: str) -> None:
+    """Check that PyGObject and typelibs are available.
+
+    :param namespaces: Names of required GObject introspection namespaces with versions,
+                       e.g. `Gtk-3.0`
+    :raises: :class:`SkipBenchmark` if something is missing
+    """
+    try:
+        import gi
+        for namespace in namespaces:
+            name, version = namespace.split('-')
+            gi.require_version(name, version)
+    except (ImportError, ValueError) as err:
+        raise SkipBenchmark(f'PyGObject is not available: {err}') from err
+
+
+def bench_psutil(fixture: Fixture, args: argparse.Namespace) -> Dict[str, List[float]]:
+    """Benchmark process scanning utilities."""
+    results = {}
+    results['psutil.get_fuser_pids'] = measure(
+        lambda: psutil.PSUtil.get_fuser_pids(fixture.nvidia_devs[0]), args.repeat)
+
+    sample = fixture.pids[::max(1, len(fixture.pids) // 100)]
+    results['psutil.get_cmdline'] = measure(
+        lambda: [psutil.PSUtil.get_cmdline(pid) for pid in sample], args.repeat)
+    results['psutil.get_cmdline'] = [t / len(sample) for t in results['psutil.get_cmdline']]
+
+    tracker = psutil.FileUsageTracker(fixture.nvidia_devs, sweep_interval=3600)
+    results['psutil.file_usage_tracker.full'] = measure(
+        tracker.update, args.repeat, setup=tracker.reset)
+    results['psutil.file_usage_tracker.incremental'] = measure(tracker.update, args.repeat)
+    return results
+
+
+def bench_pciutil(fixture: Fixture, args: argparse.Namespace) -> Dict[str, List[float]]:
+    """Benchmark PCI device identification."""
+    index_path = os.path.join(fixture.cache_dir, 'pci.ids.index')
+
+    def reset_all():
+        reset_memory()
+        if os.path.exists(index_path):
+            os.unlink(index_path)
+
+    def reset_memory():
+        pciutil.PCIUtil._names.clear()  # pylint: disable=protected-access
+        pciutil.PCIUtil._index.clear()  # pylint: disable=protected-access
+        pciutil.PCIUtil.invalidate()
+
+    def lookup():
+        return pciutil.PCIUtil.get_device_info(NVIDIA_VENDOR_ID, NVIDIA_DEVICE_ID)
+
+    results = {}
+    results['pciutil.get_device_info.cold'] = measure(lookup, args.repeat, setup=reset_all)
+    results['pciutil.get_device_info.indexed'] = measure(lookup, args.repeat,
+                                                         setup=reset_memory)
+    results['pciutil.get_device_info.memoized'] = measure(lookup, args.repeat)
+    results['pciutil.get_device.cold'] = measure(
+        lambda: pciutil.PCIUtil.get_device(fixture.bus_ids[0]), args.repeat,
+        setup=pciutil.PCIUtil.invalidate)
+    return results
+
+
+def bench_nvidia(fixture: Fixture, args: argparse.Namespace) -> Dict[str, List[float]]:
+    """Benchmark GPU information sampling."""
+    require_gi('GLib-2.0')
+    from bbswitch_gui import nvidia
+    nvidia.NVIDIA_DEV = os.path.join(fixture.root, 'dev', 'nvidia{minor}')
+    nvidia.MODULES_PATH = fixture.modules_path
+    nvidia.SYSFS_MODULE_PATH = fixture.sysfs_module_path
+
+    monitor = nvidia.NvidiaMonitor(sweep_interval=3600)
+
+    def new_monitor():
+        nonlocal monitor
+        monitor = nvidia.NvidiaMonitor(sweep_interval=3600)
+
+    results = {}
+    results['nvidia.gpus_info.cold'] = measure(lambda: monitor.gpus_info(), args.repeat,
+                                               setup=new_monitor)
+    new_monitor()
+    monitor.running = True  # Keep NVML session between calls, like monitor does
+    results['nvidia.gpus_info.steady'] = measure(lambda: monitor.gpus_info(), args.repeat)
+    results['nvidia.gpu_info.steady'] = measure(
+        lambda: monitor.gpu_info(fixture.bus_ids[0]), args.repeat)
+    monitor.running = False
+    monitor.gpus_info()  # Releases NVML session
+    return results
+
+
+def bench_bbswitch(fixture: Fixture, args: argparse.Namespace) -> Dict[str, List[float]]:
+    """Benchmark reading of bbswitch state."""
+    require_gi('GLib-2.0', 'Gio-2.0')
+    from bbswitch_gui import bbswitch
+    bbswitch.BBSWITCH_PATH = fixture.bbswitch_path
+
+    monitor = bbswitch.BBswitchMonitor(subscribe=False)
+    return {'bbswitch.get_gpu_state': measure(monitor.get_gpu_state, args.repeat)}
+
+
+def bench_window(fixture: Fixture, args: argparse.Namespace) -> Dict[str, List[float]]:
+    """Benchmark updating of GPU information in main window."""
+    require_gi('Gtk-3.0', 'Gdk-3.0')
+    from gi.repository import Gtk  # pyright: ignore
+    if not Gtk.init_check(sys.argv)[0]:
+        raise SkipBenchmark('Display is not available, try running with xvfb-run')
+
+    from bbswitch_gui.history import HistoryStore
+    from bbswitch_gui.window import MainWindow
+    history = HistoryStore()
+    window = MainWindow(None, history)
+
+    def gpu_info(index, shift):
+        pids = fixture.gpu_pids[index::len(fixture.bus_ids)]
+        pids = pids[shift:] + pids[:shift]
+        return {
+            'gpu_temp': 40 + shift % 2,
+            'power_draw': 15.0 + shift,
+            'mem_used': 1000 + shift,
+            'mem_total': 6144,
+            'gpu_util': shift % 100,
+            'processes': [{'pid': pid, 'mem_used': 16 * (i + 1),
+                           'cmdline': f'/usr/bin/proc{pid} --option value{pid}'}
+                          for i, pid in enumerate(pids[:len(pids) - shift % 2])],
+            'modules': ['nvidia', 'nvidia_modeset', 'nvidia_drm'],
+        }
+
+    infos = [{bus_id: gpu_info(index, shift) for index, bus_id in enumerate(fixture.bus_ids)}
+             for shift in range(2)]
+    step = 0
+
+    def update():
+        history.add(infos[step % 2])
+        window.update_monitor(infos[step % 2])
+
+    def flip():
+        nonlocal step
+        step += 1
+        while Gtk.events_pending():
+            Gtk.main_iteration()
+
+    results = {}
+    results['window.update_monitor.changed'] = measure(update, args.repeat, setup=flip)
+    results['window.update_monitor.unchanged'] = measure(update, args.repeat)
+    window.destroy()
+    return results
+
+
+BENCHMARKS = [bench_psutil, bench_pciutil, bench_nvidia, bench_bbswitch, bench_window]
+
+
+def create_fixture(root: str, args: argparse.Namespace) -> Fixture:
+    """Create synthetic system files and redirect modules to them."""
+    fixture = Fixture(root)
+    fixture.create_proc(args.pids, args.fds, args.gpu_users, args.gpus)
+    fixture.create_modules(['nvidia_drm', 'nvidia_modeset', 'nvidia'])
+    fixture.create_pci_devices(args.gpus)
+    fixture.create_pci_ids(args.vendors, args.devices)
+    fixture.create_bbswitch(fixture.bus_ids[0], True)
+
+    psutil.PROC_PATH = fixture.proc_path
+    pciutil.PCI_DEVICES_PATH = fixture.pci_devices_path
+    pciutil.PCI_IDS_PATH = fixture.pci_ids_path
+    pciutil.PCI_IDS_CACHE_DIR = fixture.cache_dir
+
+    pynvml.configure(fixture.bus_ids, fixture.gpu_pids)
+    return fixture
+
+
+def main() -> int:
+    """Run benchmarks and write results.
+
+    :return: Exit status
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', maxsplit=1)[0])
+    parser.add_argument('--gpus', type=int, default=1, help='number of NVIDIA GPUs')
+    parser.add_argument('--pids', type=int, default=2000, help='number of processes')
+    parser.add_argument('--fds', type=int, default=16, help='open files per process')
+    parser.add_argument('--gpu-users', type=int, default=32,
+                        help='number of processes using GPU')
+    parser.add_argument('--vendors', type=int, default=2500,
+                        help='number of vendors in PCI IDs database')
+    parser.add_argument('--devices', type=int, default=40,
+                        help='number of devices per vendor in PCI IDs database')
+    parser.add_argument('--repeat', type=int, default=20, help='measured calls per benchmark')
+    parser.add_argument('--only', help='run only benchmarks with names containing this string')
+    parser.add_argument('--output', help='write JSON results to file instead of stdout')
+    args = parser.parse_args()
+
+    # Measure code as it runs without --profile
+    Profiler.disable()
+
+    report: Dict[str, Any] = {
+        'version': bbswitch_gui.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'parameters': {key: value for key, value in vars(args).items()
+                       if key not in ['only', 'output']},
+        'benchmarks': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix='bbswitch-gui-bench-') as root:
+        start = time.perf_counter()
+        fixture = create_fixture(root, args)
+        report['fixture_seconds'] = time.perf_counter() - start
+
+        for bench in BENCHMARKS:
+            if args.only and args.only not in bench.__name__:
+                continue
+            try:
+                for name, samples in bench(fixture, args).items():
+                    report['benchmarks'][name] = summarize(samples)
+                    print(f'{name:45} median {statistics.median(samples) * 1000:10.3f} ms',
+                          file=sys.stderr)
+            except SkipBenchmark as err:
+                report['benchmarks'][bench.__name__] = {'skipped': str(err)}
+                print(f'{bench.__name__:45} skipped: {err}', file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+            file.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
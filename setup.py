@@ -19,6 +19,7 @@ if __name__ == '__main__':
     setup(
         install_requires=[
             'PyGObject>=3.34.0',
+            'pycairo>=1.16.0',
             'py3nvml>=0.2.7' if py3nvml_found else 'pynvml>=7.352.0'
         ]
     )
@@ -0,0 +1,122 @@
+"""Stand-in for bbswitchd daemon serving a Unix datagram socket."""
+
+import os
+import socket
+import threading
+from typing import Callable, List, Optional, Tuple
+
+
+class FakeBBswitchd:
+    """Datagram server speaking bbswitchd protocol, running on a thread.
+
+    Commands are NUL-terminated strings, responses are sent back to the client
+    address: `status` returns GPU state (e.g. `0000:01:00.0 ON`), `on` and `off`
+    change it and return empty string, `subscribe` returns empty string and then
+    the new state is pushed to subscriber on each change.
+    """
+
+    def __init__(self, path: str, bus_id: str = '0000:01:00.0', enabled: bool = False) -> None:
+        """Initialize server, call :meth:`start` to listen.
+
+        :param path: Path to socket file
+        :param bus_id: PCI bus ID of emulated GPU
+        :param enabled: Initial GPU state
+        """
+        self.path = path
+        self.bus_id = bus_id
+        self.enabled = enabled
+        self.replies = True                 # Respond to commands, or hold responses
+        self.requests: List[str] = []       # Commands received so far
+        self.subscribers: List[bytes] = []
+        self.held: List[Tuple[bytes, bytes]] = []
+        self.handler: Optional[Callable[[str], Optional[bytes]]] = None
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """State line as reported by bbswitch."""
+        return f'{self.bus_id} {"ON" if self.enabled else "OFF"}'
+
+    def start(self) -> None:
+        """Start listening on socket."""
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._thread = threading.Thread(target=self._serve, args=(self._sock,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop listening and remove socket file, like terminated daemon does."""
+        if self._sock is not None:
+            sock, self._sock = self._sock, None
+            sock.shutdown(socket.SHUT_RDWR)
+            sock.close()
+            if self._thread is not None:
+                self._thread.join()
+            os.unlink(self.path)
+        self.subscribers.clear()
+
+    def set_state(self, enabled: bool) -> None:
+        """Change GPU state, notifying subscribers.
+
+        :param enabled: New GPU state
+        """
+        self.enabled = enabled
+        self.push(self.state.encode() + b'\0')
+
+    def push(self, data: bytes) -> None:
+        """Send datagram to all subscribers.
+
+        :param data: Data to send
+        """
+        with self._lock:
+            for address in list(self.subscribers):
+                try:
+                    if self._sock is not None:
+                        self._sock.sendto(data, address)
+                except OSError:
+                    self.subscribers.remove(address)
+
+    def release(self) -> None:
+        """Send held responses, like a daemon which has been busy."""
+        held, self.held = self.held, []
+        for response, address in held:
+            if self._sock is not None:
+                self._sock.sendto(response, address)
+
+    def _serve(self, sock):
+        while True:
+            try:
+                data, address = sock.recvfrom(1024)
+            except OSError:
+                return
+            if not data:
+                # Socket has been shut down
+                return
+
+            command = data.rstrip(b'\0').decode()
+            self.requests.append(command)
+            if self.handler is not None:
+                response = self.handler(command)
+            elif command == 'status':
+                response = self.state.encode() + b'\0'
+            elif command in ['on', 'off']:
+                response = b'\0'
+                self.set_state(command == 'on')
+            elif command == 'subscribe':
+                response = b'\0'
+                with self._lock:
+                    self.subscribers.append(address)
+            else:
+                response = f'Unknown command "{command}"'.encode() + b'\0'
+
+            if response is None:
+                continue
+            if not self.replies:
+                self.held.append((response, address))
+                continue
+            try:
+                sock.sendto(response, address)
+            except OSError:
+                pass
@@ -0,0 +1,365 @@
+"""Tests of bbswitchd client and bbswitch monitor against a fake bbswitchd."""
+
+import os
+import time
+import logging
+
+import pytest
+
+from fake_bbswitchd import FakeBBswitchd
+
+pytest.importorskip('gi')
+
+from gi.repository import GLib  # pyright: ignore
+
+from bbswitch_gui import bbswitch
+from bbswitch_gui.bbswitch import (BBswitchClient, BBswitchClientException, BBswitchMonitor,
+                                   BBswitchMonitorException)
+
+
+def wait_for(condition, timeout=5.0):
+    """Run default main context until condition is met."""
+    context = GLib.MainContext.default()
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out waiting for condition')
+        if not context.iteration(False):
+            time.sleep(0.001)
+
+
+def run_for(seconds):
+    """Run default main context for some time."""
+    deadline = time.monotonic() + seconds
+    wait_for(lambda: time.monotonic() > deadline, seconds + 1)
+
+
+@pytest.fixture(name='bbswitchd')
+def fixture_bbswitchd(tmp_path, monkeypatch):
+    """Fake bbswitchd listening on a temporary socket used instead of `BBSWITCHD_SOCK`."""
+    path = os.path.join(str(tmp_path), 'bbswitchd.sock')
+    monkeypatch.setattr(bbswitch, 'BBSWITCHD_SOCK', path)
+    server = FakeBBswitchd(path)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(name='no_bbswitchd')
+def fixture_no_bbswitchd(tmp_path, monkeypatch):
+    """Missing socket used instead of `BBSWITCHD_SOCK`, like bbswitchd is not running."""
+    monkeypatch.setattr(bbswitch, 'BBSWITCHD_SOCK', os.path.join(str(tmp_path), 'missing.sock'))
+
+
+@pytest.fixture(name='client')
+def fixture_client():
+    """Client for bbswitchd, closed after test."""
+    client = BBswitchClient()
+    yield client
+    client.close()
+
+
+def test_client_matches_responses_in_order(bbswitchd, client):
+    bbswitchd.handler = lambda command: f'response to {command}'.encode() + b'\0'
+    responses = []
+    for i in range(5):
+        client.request(f'cmd{i}', lambda data, error, i=i: responses.append((i, data, error)))
+    # Nothing is written until main loop runs
+    assert not bbswitchd.requests
+
+    wait_for(lambda: len(responses) == 5)
+    assert responses == [(i, f'response to cmd{i}'.encode() + b'\0', None) for i in range(5)]
+    assert bbswitchd.requests == [f'cmd{i}' for i in range(5)]
+
+
+def test_client_send_command_async(bbswitchd, client):
+    bbswitchd.enabled = True
+    results = []
+    client.send_command_async('status', lambda *args: results.append(args))
+    wait_for(lambda: results)
+    assert results == [('0000:01:00.0 ON\0', None)]
+
+    results.clear()
+    client.set_gpu_state(False, results.append)
+    wait_for(lambda: results)
+    assert results == [None]
+    assert not bbswitchd.enabled
+
+
+def test_client_limits_pending_requests(bbswitchd, client):
+    bbswitchd.replies = False
+    client.max_pending = 2
+    errors = []
+    client.request('status', lambda data, error: errors.append(error))
+    client.request('status', lambda data, error: errors.append(error))
+    with pytest.raises(BBswitchClientException, match='Too many pending requests'):
+        client.request('status', lambda data, error: errors.append(error))
+
+    # Asynchronous calls report the error to callback
+    results = []
+    client.send_command_async('status', lambda *args: results.append(args))
+    wait_for(lambda: results)
+    assert results[0][0] is None
+    assert 'Too many pending requests' in str(results[0][1])
+    assert not errors
+
+
+def test_client_cancels_switch(bbswitchd, client):
+    bbswitchd.replies = False
+    errors = []
+    client.set_gpu_state(True, errors.append)
+    assert client.in_progress()
+    wait_for(lambda: bbswitchd.requests)
+    client.cancel()
+    wait_for(lambda: errors)
+    assert 'cancelled' in str(errors[0])
+    assert not client.in_progress()
+
+    # Late response is still matched to the cancelled request
+    results = []
+    client.send_command_async('status', lambda *args: results.append(args))
+    wait_for(lambda: len(bbswitchd.held) == 2)
+    bbswitchd.release()
+    wait_for(lambda: results)
+    assert results == [('0000:01:00.0 ON\0', None)]
+    assert len(errors) == 1
+
+
+def test_client_drops_switch_cancelled_before_writing(bbswitchd, client):
+    errors = []
+    client.set_gpu_state(True, errors.append)
+    client.cancel()
+    wait_for(lambda: errors)
+    assert 'cancelled' in str(errors[0])
+
+    results = []
+    client.send_command_async('status', lambda *args: results.append(args))
+    wait_for(lambda: results)
+    assert results == [('0000:01:00.0 OFF\0', None)]
+    assert bbswitchd.requests == ['status']
+
+
+def test_client_times_out_and_reconnects(bbswitchd, client):
+    bbswitchd.replies = False
+    errors = []
+    client.request('status', lambda data, error: errors.append(error), timeout=0.1)
+    client.request('status', lambda data, error: errors.append(error), timeout=5)
+    wait_for(lambda: len(errors) == 2)
+    # All pending requests fail, as following responses could not be matched
+    assert all('Timed out' in str(error) for error in errors)
+
+    bbswitchd.replies = True
+    results = []
+    client.send_command_async('status', lambda *args: results.append(args))
+    wait_for(lambda: results)
+    assert results == [('0000:01:00.0 OFF\0', None)]
+
+
+def test_client_reconnects_after_server_restart(bbswitchd, client):
+    results = []
+    client.send_command_async('status', lambda *args: results.append(args))
+    wait_for(lambda: results)
+    assert results == [('0000:01:00.0 OFF\0', None)]
+
+    bbswitchd.stop()
+    bbswitchd.enabled = True
+    bbswitchd.start()
+
+    results.clear()
+    client.send_command_async('status', lambda *args: results.append(args))
+    wait_for(lambda: results)
+    assert results == [('0000:01:00.0 ON\0', None)]
+
+
+def test_client_backs_off_when_server_is_down(bbswitchd, monkeypatch):
+    monkeypatch.setattr(bbswitch, 'RECONNECT_TIMEOUT_MIN', 0.2)
+    monkeypatch.setattr(bbswitch, 'RECONNECT_TIMEOUT_MAX', 0.8)
+    client = BBswitchClient()
+    bbswitchd.stop()
+
+    def request():
+        errors = []
+        client.request('status', lambda data, error: errors.append(error))
+        # Connection is established asynchronously, failure is reported to callback
+        wait_for(lambda: errors)
+        assert errors[0] is not None
+        return errors[0]
+
+    assert 'next connection attempt' not in str(request())
+    # Server is not contacted again until the delay passes
+    with pytest.raises(BBswitchClientException, match='next connection attempt allowed in'):
+        request()
+
+    time.sleep(0.25)
+    assert 'next connection attempt' not in str(request())
+
+    # Delay has doubled after another failure
+    bbswitchd.start()
+    time.sleep(0.25)
+    with pytest.raises(BBswitchClientException, match='next connection attempt allowed in'):
+        request()
+
+    time.sleep(0.2)
+    results = []
+    client.request('status', lambda *args: results.append(args))
+    wait_for(lambda: results)
+    assert results == [(b'0000:01:00.0 OFF\0', None)]
+    client.close()
+
+
+@pytest.fixture(name='bbswitch_file')
+def fixture_bbswitch_file(tmp_path, monkeypatch):
+    """Temporary file used instead of `BBSWITCH_PATH`."""
+    path = tmp_path / 'bbswitch'
+    path.write_text('0000:01:00.0 OFF\n')
+    monkeypatch.setattr(bbswitch, 'BBSWITCH_PATH', str(path))
+    return path
+
+
+@pytest.fixture(name='monitor')
+def fixture_monitor(bbswitch_file):
+    """Monitor of bbswitch states, stopped after test."""
+    del bbswitch_file  # only needs to exist
+    monitor = BBswitchMonitor(debounce=0.01)
+    yield monitor
+    monitor.monitor_stop()
+
+
+def start_monitor(monitor):
+    """Start monitor collecting GPU states on each callback."""
+    states = []
+    monitor.monitor_start(lambda: states.append(monitor.get_gpu_states()))
+    return states
+
+
+def test_monitor_subscribes(bbswitchd, monitor):
+    states = start_monitor(monitor)
+    # Initial state is reported right away
+    assert states == [[('0000:01:00.0', False)]]
+
+    # File is not monitored after subscription is confirmed
+    wait_for(lambda: monitor.connection is None)
+    assert bbswitchd.requests == ['subscribe']
+
+
+def test_monitor_parses_pushed_state(bbswitchd, monitor):
+    states = start_monitor(monitor)
+    wait_for(lambda: monitor.connection is None)
+
+    bbswitchd.set_state(True)
+    wait_for(lambda: len(states) == 2)
+    assert states[1] == [('0000:01:00.0', True)]
+    # Pushed state is used without reading file
+    assert monitor.get_gpu_states() == [('0000:01:00.0', True)]
+
+    bbswitchd.push(b'0000:01:00.0 OFF\n0000:02:00.0 ON\0')
+    wait_for(lambda: len(states) == 3)
+    assert states[2] == [('0000:01:00.0', False), ('0000:02:00.0', True)]
+
+    # Unexpected data is ignored, falling back to reading file
+    bbswitchd.push(b'0000:01:00.0 UNKNOWN\0')
+    wait_for(lambda: len(states) == 4)
+    assert states[3] == [('0000:01:00.0', False)]
+
+
+def test_monitor_falls_back_to_file(bbswitchd, bbswitch_file, monitor):
+    # bbswitchd which does not support subscription
+    bbswitchd.handler = lambda command: f'Unknown command "{command}"'.encode() + b'\0'
+    states = start_monitor(monitor)
+    wait_for(lambda: bbswitchd.requests)
+    run_for(0.1)
+    assert monitor.connection is not None
+
+    bbswitch_file.write_text('0000:01:00.0 ON\n')
+    wait_for(lambda: len(states) == 2)
+    assert states[1] == [('0000:01:00.0', True)]
+
+
+@pytest.mark.usefixtures('no_bbswitchd')
+def test_monitor_falls_back_to_file_without_bbswitchd(bbswitch_file, monitor):
+    states = start_monitor(monitor)
+    run_for(0.1)
+    assert monitor.connection is not None
+
+    bbswitch_file.write_text('0000:01:00.0 ON\n')
+    wait_for(lambda: len(states) == 2)
+    assert states[1] == [('0000:01:00.0', True)]
+
+
+def lose_subscription(monitor):
+    """Break connection of subscribed monitor, like an I/O error does."""
+    # pylint: disable=protected-access
+    monitor._subscription.client._disconnect(BBswitchClientException('Connection reset'))
+
+
+def test_monitor_resubscribes(bbswitchd, bbswitch_file, monitor):
+    states = start_monitor(monitor)
+    wait_for(lambda: monitor.connection is None)
+
+    lose_subscription(monitor)
+    # File is monitored meanwhile
+    assert monitor.connection is not None
+    bbswitch_file.write_text('0000:01:00.0 ON\n')
+    wait_for(lambda: len(states) == 2)
+    assert states[1] == [('0000:01:00.0', True)]
+
+    wait_for(lambda: monitor.connection is None)
+    assert bbswitchd.requests == ['subscribe', 'subscribe']
+    bbswitchd.set_state(False)
+    wait_for(lambda: len(states) == 3)
+    assert states[2] == [('0000:01:00.0', False)]
+
+
+def test_monitor_resubscribes_with_backoff(bbswitchd, monitor, caplog):
+    caplog.set_level(logging.DEBUG, logger=bbswitch.__name__)
+    start_monitor(monitor)
+    wait_for(lambda: monitor.connection is None)
+
+    # bbswitchd has been replaced by one which does not support subscription
+    bbswitchd.handler = lambda command: b'Not supported\0'
+    lose_subscription(monitor)
+    wait_for(lambda: 'again in 2 s' in caplog.text)
+    assert 'again in 1 s' in caplog.text
+    assert bbswitchd.requests == ['subscribe', 'subscribe']
+    assert monitor.connection is not None
+
+
+def test_monitor_coalesces_events(bbswitchd, monitor):
+    monitor.debounce = 0.2
+    states = start_monitor(monitor)
+    wait_for(lambda: monitor.connection is None)
+
+    for enabled in [True, False, True]:
+        bbswitchd.set_state(enabled)
+    run_for(0.5)
+    # Only the last state is reported
+    assert states == [[('0000:01:00.0', False)], [('0000:01:00.0', True)]]
+
+
+@pytest.mark.usefixtures('no_bbswitchd')
+def test_monitor_reports_only_changes(bbswitch_file, monitor):
+    results = []
+
+    def on_change():
+        try:
+            results.append(monitor.get_gpu_states())
+        except BBswitchMonitorException as err:
+            results.append(str(err))
+
+    monitor.monitor_start(on_change)
+    assert results == [[('0000:01:00.0', False)]]
+
+    # File is rewritten with the same state
+    bbswitch_file.write_text('0000:01:00.0 OFF\n')
+    run_for(0.2)
+    assert len(results) == 1
+
+    # Errors are reported once as well
+    for _ in range(2):
+        bbswitch_file.write_text('0000:01:00.0 BROKEN\n')
+        run_for(0.2)
+    assert results[1:] == ['Unknown bbswitch state "BROKEN"']
+
+    bbswitch_file.write_text('0000:01:00.0 ON\n')
+    wait_for(lambda: len(results) == 3)
+    assert results[2] == [('0000:01:00.0', True)]
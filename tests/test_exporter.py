@@ -0,0 +1,131 @@
+"""Tests of OpenMetrics exporter served on a temporary Unix socket."""
+
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('gi')
+
+from gi.repository import GLib  # pyright: ignore
+
+from bbswitch_gui.exporter import MetricsExporter, MetricsExporterException
+
+
+def scrape(path, request=b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n', timeout=5.0):
+    """Send request to exporter, running default main context until response is read."""
+    response = []
+
+    def run():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(request)
+            data = b''
+            while chunk := sock.recv(65536):
+                data += chunk
+            response.append(data)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    context = GLib.MainContext.default()
+    deadline = time.monotonic() + timeout
+    while thread.is_alive():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out waiting for response')
+        if not context.iteration(False):
+            time.sleep(0.001)
+    headers, _, body = response[0].partition(b'\r\n\r\n')
+    return headers.split(b'\r\n', 1)[0], body.decode()
+
+
+@pytest.fixture(name='exporter')
+def fixture_exporter(tmp_path):
+    """Exporter listening on a temporary socket, closed after test."""
+    exporter = MetricsExporter('unix:' + os.path.join(str(tmp_path), 'metrics.sock'))
+    yield exporter
+    exporter.close()
+
+
+def test_renders_gpu_metrics(exporter, tmp_path):
+    exporter.update_states([('0000:01:00.0', True)])
+    exporter.record_switch(True, 1.5, True)
+    exporter.update_gpus({'0000:01:00.0': {
+        'gpu_temp': 45, 'power_draw': 12.5, 'mem_used': 2, 'mem_total': 4096, 'gpu_util': 30,
+        'modules': ['nvidia'],
+        'processes': [
+            {'pid': 42, 'mem_used': 1, 'cmdline': '/opt/we"ird\\app --flag'},
+            {'pid': 43, 'mem_used': -1, 'cmdline': 'unknown'},
+        ],
+    }})
+
+    status, body = scrape(os.path.join(str(tmp_path), 'metrics.sock'))
+    assert status == b'HTTP/1.1 200 OK'
+    lines = body.split('\n')
+    assert body.endswith('# EOF\n')
+    assert lines.count('# EOF') == 1
+
+    # Each family is described before its samples
+    assert lines.index('# TYPE nvidia_gpu_temperature_celsius gauge') \
+        < lines.index('# UNIT nvidia_gpu_temperature_celsius celsius') \
+        < lines.index('# HELP nvidia_gpu_temperature_celsius GPU temperature.') \
+        < lines.index('nvidia_gpu_temperature_celsius{bus_id="0000:01:00.0"} 45')
+    assert '# TYPE bbswitch_switch_duration_seconds histogram' in lines
+    assert 'bbswitch_switch_duration_seconds_bucket{state="on",le="2.0"} 1' in lines
+    assert 'bbswitch_gpu_enabled{bus_id="0000:01:00.0"} 1' in lines
+    assert 'nvidia_gpu_utilization_ratio{bus_id="0000:01:00.0"} 0.3' in lines
+    assert 'nvidia_gpu_memory_used_bytes{bus_id="0000:01:00.0"} 2097152' in lines
+
+    # Quotes and backslashes in command label are escaped, unknown usage is skipped
+    assert ('nvidia_gpu_process_memory_used_bytes'
+            '{bus_id="0000:01:00.0",pid="42",command="we\\"ird\\\\app"} 1048576') in lines
+    assert 'pid="43"' not in body
+
+
+def test_gpu_metrics_cleared(exporter, tmp_path):
+    exporter.update_gpus({'0000:01:00.0': {
+        'gpu_temp': 45, 'power_draw': -1, 'mem_used': 2, 'mem_total': 4096, 'gpu_util': 30,
+        'modules': ['nvidia'], 'processes': []}})
+    exporter.update_gpus(None)
+
+    _, body = scrape(os.path.join(str(tmp_path), 'metrics.sock'))
+    assert '# TYPE nvidia_gpu_temperature_celsius gauge' in body
+    assert 'bus_id="0000:01:00.0"' not in body
+    assert not any(line.startswith('nvidia_gpu_sample_timestamp_seconds ')
+                   for line in body.split('\n'))
+
+
+def test_rejects_other_paths_and_methods(exporter, tmp_path):
+    path = os.path.join(str(tmp_path), 'metrics.sock')
+    assert scrape(path, b'GET /other HTTP/1.1\r\n\r\n')[0] == b'HTTP/1.1 404 Not Found'
+    assert scrape(path, b'POST /metrics HTTP/1.1\r\n\r\n')[0] == \
+        b'HTTP/1.1 405 Method Not Allowed'
+    status, body = scrape(path, b'HEAD /metrics HTTP/1.1\r\n\r\n')
+    assert status == b'HTTP/1.1 200 OK'
+    assert body == ''
+
+
+def test_socket_replaced_and_removed(tmp_path):
+    path = os.path.join(str(tmp_path), 'metrics.sock')
+    MetricsExporter('unix:' + path).close()
+    assert not os.path.exists(path)
+
+    # Stale socket is replaced, anything else is kept
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(path)
+    exporter = MetricsExporter('unix:' + path)
+    assert scrape(path)[0] == b'HTTP/1.1 200 OK'
+
+    # Socket of running instance is not taken over
+    with pytest.raises(MetricsExporterException, match='already in use'):
+        MetricsExporter('unix:' + path)
+    assert scrape(path)[0] == b'HTTP/1.1 200 OK'
+    exporter.close()
+
+    with open(path, 'wb'):
+        pass
+    with pytest.raises(MetricsExporterException):
+        MetricsExporter('unix:' + path)
+    assert os.path.isfile(path)
@@ -0,0 +1,120 @@
+"""Tests of GPU metrics history and its ring buffers."""
+
+import math
+
+import pytest
+
+from bbswitch_gui.history import HISTORY_METRICS, MAX_GAP, HistoryStore, MetricsHistory, RingBuffer
+
+
+def sample(value):
+    return dict.fromkeys(HISTORY_METRICS, value)
+
+
+def same(values, expected):
+    return len(values) == len(expected) and all(
+        (math.isnan(a) and math.isnan(b)) or a == b for a, b in zip(values, expected))
+
+
+def test_ring_buffer_order_after_overflow():
+    buffer = RingBuffer(4)
+    for value in range(3):
+        buffer.append(value)
+    assert len(buffer) == 3
+    assert buffer.values() == [0, 1, 2]
+    assert same(buffer.values(5), [math.nan, math.nan, 0, 1, 2])
+
+    # Oldest values are overwritten, wrapping around the end of storage
+    for value in range(3, 10):
+        buffer.append(value)
+    assert len(buffer) == 4
+    assert buffer.appended == 10
+    assert buffer.values() == [6, 7, 8, 9]
+    assert buffer.values(2) == [8, 9]
+    assert same(buffer.values(6), [math.nan, math.nan, 6, 7, 8, 9])
+    assert buffer.last() == 9
+
+
+def test_ring_buffer_revision():
+    buffer = RingBuffer(2)
+    buffer.set_last(1.0)
+    assert buffer.revision == 0
+    assert math.isnan(buffer.last())
+
+    buffer.append(1.0)
+    buffer.set_last(2.0)
+    assert buffer.appended == 1
+    assert buffer.revision == 2
+    assert buffer.values() == [2.0]
+
+
+def test_history_aggregates_tiers():
+    history = MetricsHistory(((1, 5), (10, 5)))
+    for second in range(20):
+        history.add(sample(second), timestamp=100 + second)
+
+    assert history.get('gpu_temp', 0).values() == [15, 16, 17, 18, 19]
+    # Mean of samples within each 10 seconds, the last point is still being filled
+    assert history.get('gpu_util', 1).values() == [4.5, 14.5]
+
+    # Sample in the same second updates mean of the last point
+    history.add(sample(20), timestamp=119.5)
+    assert history.get('gpu_temp', 0).values() == [15, 16, 17, 18, 19.5]
+    assert history.get('gpu_temp', 1).values() == [4.5, 15.0]
+
+
+def test_history_fills_gaps():
+    history = MetricsHistory(((1, 10),))
+    history.add(sample(1), timestamp=100)
+    history.add(sample(2), timestamp=103)
+    assert history.get('power_draw').values() == [1, 1, 1, 2]
+
+    # Too long gap is not filled with stale values
+    history.add(sample(3), timestamp=105 + MAX_GAP)
+    assert same(history.get('power_draw').values(), [math.nan] * 9 + [3])
+
+    history.clear()
+    assert len(history.get('power_draw')) == 0
+
+
+def import_window():
+    """Import window module, skipping test if GTK 3 is not available."""
+    gi = pytest.importorskip('gi')
+    try:
+        gi.require_version('Gtk', '3.0')
+    except ValueError:
+        pytest.skip('GTK 3 is not available')
+    from bbswitch_gui import window  # pylint: disable=import-outside-toplevel
+    return window
+
+
+class RecordingSparkline:
+    """Stand-in for sparkline widget remembering the buffer it's given."""
+
+    def __init__(self):
+        self.buffer = None
+
+    def set_data(self, buffer, minimum=0.0, maximum=None):
+        del minimum, maximum  # unused argument
+        self.buffer = buffer
+
+
+def test_history_tiers_sized_to_graphs():
+    window = import_window()
+    history = HistoryStore()
+    graphs = window._HistoryGraphs(history)  # pylint: disable=protected-access
+    graphs.sparklines = {metric: RecordingSparkline() for metric in HISTORY_METRICS}
+
+    # Enough samples to fill the longest tier and overflow it
+    resolution, capacity = history.tiers[-1]
+    for second in range(int(resolution * (capacity + 1))):
+        history.add({'0000:01:00.0': sample(second)}, timestamp=100 + second)
+
+    # Graph gets exactly one value for each point it draws, including both edges
+    points = window.SPARKLINE_WIDTH // window.POINT_WIDTH + 1
+    for tier in range(len(history.tiers)):
+        graphs.tier = tier
+        graphs.update('0000:01:00.0', {**sample(0), 'mem_total': 4096})
+        for sparkline in graphs.sparklines.values():
+            assert len(sparkline.buffer) == points
+            assert not any(math.isnan(value) for value in sparkline.buffer.values())
@@ -0,0 +1,121 @@
+"""Tests of PCI IDs database lookups and their caches."""
+
+import json
+import os
+
+import pytest
+
+from bbswitch_gui import pciutil
+from bbswitch_gui.pciutil import PCIUtil, PCIUtilException
+
+PCI_IDS = '''# List of PCI ID's (synthetic)
+
+1000  Vendor 1000 Inc.
+\t0001  Device 0001 of 1000
+\t\t1043 0001  Subsystem 0001
+10de  NVIDIA Corporation
+\t1c20  GP106M [GeForce GTX 1060 Mobile]
+8086  Intel Corporation
+\t9b41  UHD Graphics
+
+C 03  Display controller
+\t00  VGA compatible controller
+'''
+
+
+@pytest.fixture(name='pci_ids')
+def fixture_pci_ids(tmp_path, monkeypatch):
+    """PCI IDs database with empty cache directory, used instead of system ones."""
+    path = os.path.join(str(tmp_path), 'pci.ids')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(PCI_IDS)
+    monkeypatch.setattr(pciutil, 'PCI_IDS_PATH', path)
+    monkeypatch.setattr(pciutil, 'PCI_IDS_CACHE_DIR', os.path.join(str(tmp_path), 'cache'))
+    # pylint: disable=protected-access
+    monkeypatch.setattr(PCIUtil, '_names', {})
+    monkeypatch.setattr(PCIUtil, '_index', {})
+    monkeypatch.setattr(PCIUtil, '_devices', {})
+    return path
+
+
+def index_path():
+    return os.path.join(pciutil.PCI_IDS_CACHE_DIR, 'pci.ids.index')
+
+
+def forget_index():
+    PCIUtil._index.clear()  # pylint: disable=protected-access
+    PCIUtil._names.clear()  # pylint: disable=protected-access
+
+
+@pytest.mark.usefixtures('pci_ids')
+def test_get_device_info():
+    assert PCIUtil.get_device_info('10de', '1c20') == \
+        ('NVIDIA Corporation', 'GP106M [GeForce GTX 1060 Mobile]')
+    assert PCIUtil.get_device_info('8086', '9b41') == ('Intel Corporation', 'UHD Graphics')
+    with pytest.raises(PCIUtilException):
+        PCIUtil.get_device_info('10de', 'ffff')
+    with pytest.raises(PCIUtilException):
+        PCIUtil.get_device_info('ffff', '0001')
+
+    # Index is stored and used after restart
+    assert os.path.exists(index_path())
+    forget_index()
+    assert PCIUtil.get_device_info('1000', '0001') == ('Vendor 1000 Inc.', 'Device 0001 of 1000')
+
+
+@pytest.mark.usefixtures('pci_ids')
+def test_index_stops_at_requested_vendor():
+    PCIUtil.get_device_info('10de', '1c20')
+    with open(index_path(), encoding='utf-8') as file:
+        index = json.load(file)
+    assert sorted(index['offsets']) == ['1000', '10de']
+    assert index['end'] == PCI_IDS.index('\t1c20')
+
+    # Indexing is resumed from where it stopped, after restart too
+    forget_index()
+    assert PCIUtil.get_device_info('8086', '9b41') == ('Intel Corporation', 'UHD Graphics')
+    with pytest.raises(PCIUtilException):
+        PCIUtil.get_device_info('ffff', '0001')
+    with open(index_path(), encoding='utf-8') as file:
+        index = json.load(file)
+    assert sorted(index['offsets']) == ['1000', '10de', '8086']
+    assert index['end'] is None
+
+
+@pytest.mark.usefixtures('pci_ids')
+def test_malformed_index_is_rebuilt():
+    PCIUtil.get_device_info('10de', '1c20')
+    with open(index_path(), encoding='utf-8') as file:
+        key = json.load(file)['key']
+
+    for index in ['', '[]', '{"offsets": {}}', json.dumps({'key': key}),
+                  json.dumps({'key': key, 'offsets': []}),
+                  json.dumps({'key': key, 'offsets': {}}),
+                  json.dumps({'key': key, 'offsets': {'10de': 'x'}, 'end': None})]:
+        with open(index_path(), 'w', encoding='utf-8') as file:
+            file.write(index)
+        forget_index()
+        assert PCIUtil.get_device_info('10de', '1c20')[0] == 'NVIDIA Corporation'
+
+
+def test_get_device_retries_missing_names(pci_ids, tmp_path, monkeypatch):
+    devices_path = os.path.join(str(tmp_path), 'devices')
+    monkeypatch.setattr(pciutil, 'PCI_DEVICES_PATH', devices_path)
+    os.makedirs(os.path.join(devices_path, '0000:01:00.0'))
+    for attr, value in [('vendor', '10de'), ('device', '1f91'),
+                        ('subsystem_vendor', '1043'), ('subsystem_device', '1a3e')]:
+        with open(os.path.join(devices_path, '0000:01:00.0', attr), 'w',
+                  encoding='utf-8') as file:
+            file.write(f'0x{value}\n')
+
+    device = PCIUtil.get_device('0000:01:00.0')
+    assert (device['vendor_id'], device['device_id']) == ('10de', '1f91')
+    assert device['vendor'] is None and device['device'] is None
+
+    # Device is added to updated database, while identity is still read from cache
+    with open(pci_ids, 'w', encoding='utf-8') as file:
+        file.write(PCI_IDS.replace('\t1c20', '\t1f91  TU117M [GeForce GTX 1650 Mobile]\n\t1c20'))
+    os.unlink(os.path.join(devices_path, '0000:01:00.0', 'vendor'))
+    device = PCIUtil.get_device('0000:01:00.0')
+    assert (device['vendor'], device['device']) == \
+        ('NVIDIA Corporation', 'TU117M [GeForce GTX 1650 Mobile]')
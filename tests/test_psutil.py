@@ -0,0 +1,194 @@
+"""Tests of process scanning utilities on a synthetic procfs tree."""
+
+import os
+
+import pytest
+
+from bbswitch_gui import psutil
+from bbswitch_gui.psutil import FileUsageTracker, PSUtil
+
+
+class FakeProc:
+    """Directory standing in for `/proc` with processes holding open files.
+
+    Descriptors are symlinks to regular files, so files are matched by inode
+    like device nodes are matched by device number on a real system.
+    """
+
+    def __init__(self, root):
+        self.path = os.path.join(root, 'proc')
+        self.files = os.path.join(root, 'files')
+        os.makedirs(self.path)
+        os.makedirs(self.files)
+
+    def create_file(self, name):
+        path = os.path.join(self.files, name)
+        with open(path, 'wb'):
+            pass
+        return path
+
+    def add_process(self, pid, targets, start_time=1000):
+        fd_path = os.path.join(self.path, str(pid), 'fd')
+        os.makedirs(fd_path, exist_ok=True)
+        self.set_start_time(pid, start_time)
+        self.set_fds(pid, targets)
+
+    def set_start_time(self, pid, start_time):
+        with open(os.path.join(self.path, str(pid), 'stat'), 'w', encoding='utf-8') as file:
+            # Process name contains space and braces to exercise parsing
+            file.write(f'{pid} (proc ({pid})) S 1 {pid} {pid} 0 -1 4194560'
+                       + ' 0' * 12 + f' {start_time} 0 0\n')
+
+    def set_fds(self, pid, targets):
+        fd_path = os.path.join(self.path, str(pid), 'fd')
+        for name in os.listdir(fd_path):
+            os.unlink(os.path.join(fd_path, name))
+        for fd, target in enumerate(targets):
+            os.symlink(target, os.path.join(fd_path, str(fd)))
+
+    def remove_process(self, pid):
+        pid_path = os.path.join(self.path, str(pid))
+        for name in os.listdir(os.path.join(pid_path, 'fd')):
+            os.unlink(os.path.join(pid_path, 'fd', name))
+        os.rmdir(os.path.join(pid_path, 'fd'))
+        os.unlink(os.path.join(pid_path, 'stat'))
+        os.rmdir(pid_path)
+
+
+@pytest.fixture(name='proc')
+def fixture_proc(tmp_path, monkeypatch):
+    """Synthetic procfs tree, used by :mod:`bbswitch_gui.psutil` instead of `/proc`."""
+    proc = FakeProc(str(tmp_path))
+    monkeypatch.setattr(psutil, 'PROC_PATH', proc.path)
+    return proc
+
+
+def test_get_fuser_pids(proc):
+    device = proc.create_file('nvidia0')
+    other = proc.create_file('other')
+    proc.add_process(100, [other, device])
+    proc.add_process(101, [other])
+    proc.add_process(102, [device, device])
+    # Our own process is never reported
+    proc.add_process(os.getpid(), [device])
+
+    assert sorted(PSUtil.get_fuser_pids(device)) == [100, 102]
+    assert sorted(PSUtil.get_fuser_pids(other)) == [100, 101]
+
+
+def test_get_fuser_pids_skips_inaccessible(proc):
+    device = proc.create_file('nvidia0')
+    proc.add_process(100, [device])
+
+    # Process without accessible descriptors, like one owned by another user
+    os.makedirs(os.path.join(proc.path, '101'))
+    # Descriptor closed meanwhile, pointing nowhere
+    proc.add_process(103, [os.path.join(proc.files, 'missing')])
+    # Entries which are not processes
+    os.makedirs(os.path.join(proc.path, 'self'))
+
+    assert PSUtil.get_fuser_pids(device) == [100]
+
+
+def test_get_fuser_pids_missing_file(proc):
+    with pytest.raises(psutil.PSUtilException):
+        PSUtil.get_fuser_pids(os.path.join(proc.files, 'missing'))
+
+
+def test_tracker_detects_new_holder(proc):
+    device = proc.create_file('nvidia0')
+    other = proc.create_file('other')
+    proc.add_process(100, [device])
+    proc.add_process(101, [other])
+    tracker = FileUsageTracker([device], sweep_interval=3600)
+    assert tracker.update() == {device: [100]}
+
+    # Process started after the previous update
+    proc.add_process(102, [other, device], start_time=2000)
+    assert sorted(tracker.update()[device]) == [100, 102]
+    assert tracker.get_start_time(102) == 2000
+
+
+def test_tracker_drops_exited_process(proc):
+    device = proc.create_file('nvidia0')
+    proc.add_process(100, [device])
+    proc.add_process(101, [device])
+    tracker = FileUsageTracker([device], sweep_interval=3600)
+    assert sorted(tracker.update()[device]) == [100, 101]
+
+    proc.remove_process(101)
+    assert tracker.update() == {device: [100]}
+    assert tracker.get_start_time(101) is None
+
+    # Process which vanished while being scanned: listed, but its files are gone
+    proc.add_process(102, [device])
+    os.unlink(os.path.join(proc.path, '102', 'stat'))
+    assert tracker.update() == {device: [100]}
+
+    # Known holder which closed the file
+    proc.set_fds(100, [])
+    assert tracker.update() == {device: []}
+    assert tracker.get_start_time(100) is None
+
+
+def test_tracker_handles_reused_pid(proc):
+    device = proc.create_file('nvidia0')
+    other = proc.create_file('other')
+    proc.add_process(100, [device], start_time=1000)
+    tracker = FileUsageTracker([device], sweep_interval=3600)
+    assert tracker.update() == {device: [100]}
+    assert tracker.get_start_time(100) == 1000
+
+    # PID is reused by another process which also holds the device
+    proc.set_start_time(100, 5000)
+    assert tracker.update() == {device: [100]}
+    assert tracker.get_start_time(100) == 5000
+
+    # And then by one which does not
+    proc.set_start_time(100, 6000)
+    proc.set_fds(100, [other])
+    assert tracker.update() == {device: []}
+    assert tracker.get_start_time(100) is None
+
+
+def test_tracker_rescans_reused_pid_of_other_process(proc):
+    device = proc.create_file('nvidia0')
+    other = proc.create_file('other')
+    proc.add_process(100, [other], start_time=1000)
+    tracker = FileUsageTracker([device], sweep_interval=3600)
+    assert tracker.update() == {device: []}
+
+    # PID is reused by a process holding the device: found only on the next sweep,
+    # as start times of processes not using the device are not checked each time
+    proc.set_start_time(100, 5000)
+    proc.set_fds(100, [device])
+    assert tracker.update() == {device: []}
+    tracker.sweep_interval = 0
+    assert tracker.update() == {device: [100]}
+    assert tracker.get_start_time(100) == 5000
+
+
+def test_tracker_sweep_finds_late_opener(proc):
+    device = proc.create_file('nvidia0')
+    other = proc.create_file('other')
+    proc.add_process(100, [other])
+    tracker = FileUsageTracker([device], sweep_interval=3600)
+    assert tracker.update() == {device: []}
+
+    # Already seen process opens the file: found only on the next sweep
+    proc.set_fds(100, [other, device])
+    assert tracker.update() == {device: []}
+    tracker.sweep_interval = 0
+    assert tracker.update() == {device: [100]}
+
+
+def test_tracker_without_files_skips_procfs(proc, monkeypatch):
+    proc.add_process(100, [proc.create_file('nvidia0')])
+    tracker = FileUsageTracker([], sweep_interval=3600)
+
+    def open_proc():
+        raise AssertionError('procfs should not be scanned')
+
+    monkeypatch.setattr(PSUtil, 'open_proc', staticmethod(open_proc))
+    assert tracker.update() == {}
+    assert PSUtil.scan_fds(-1, 100, []) == set()